@@ -11,6 +11,7 @@ sys.path.append(os.getcwd())
 # Импорт моделей
 from database import Base
 import models 
+from services.product_search import is_search_table
 
 config = context.config
 
@@ -19,6 +20,13 @@ if config.config_file_name is not None:
 
 target_metadata = Base.metadata
 
+# FTS5-таблицы поиска продуктов создаются в коде (services/product_search.py),
+# autogenerate не должен предлагать их удалить
+def include_name(name, type_, parent_names):
+    if type_ == "table" and is_search_table(name):
+        return False
+    return True
+
 # --- ФУНКЦИЯ ДЛЯ ПРЕДОТВРАЩЕНИЯ ПУСТЫХ МИГРАЦИЙ ---
 def process_revision_directives(context, revision, directives):
     if config.cmd_opts and getattr(config.cmd_opts, 'autogenerate', False):
@@ -52,6 +60,7 @@ def run_migrations_online() -> None:
             target_metadata=target_metadata,
             # Добавляем хук здесь:
             process_revision_directives=process_revision_directives,
+            include_name=include_name,
             render_as_batch=True
         )
 
@@ -0,0 +1,54 @@
+"""weekly_plan and recipe_ingredients indexes
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+
+# revision identifiers, used by Alembic.
+revision: str = '002'
+down_revision: Union[str, None] = '001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (таблица, имя индекса, колонки) - те же, что в models.py
+INDEXES = [
+    ('weekly_plan', 'ix_weekly_plan_date_id', ['date', 'id']),
+    ('weekly_plan', 'ix_weekly_plan_slot', ['date', 'meal_type', 'family_member_id']),
+    ('weekly_plan', 'ix_weekly_plan_recipe_id', ['recipe_id']),
+    ('recipe_ingredients', 'ix_recipe_ingredients_recipe_id', ['recipe_id']),
+    ('recipe_ingredients', 'ix_recipe_ingredients_product_id', ['product_id']),
+]
+# Индексы recipe_ingredients (index=True) добавлены в models.py вместе с отслеживанием
+# зависимостей рецептов от продуктов; базам под alembic их дает эта ревизия
+
+def upgrade() -> None:
+    # Идемпотентно: базы, созданные create_all уже с этими индексами, пропускаются
+    conn = op.get_bind()
+    inspector = Inspector.from_engine(conn)
+    tables = inspector.get_table_names()
+
+    for table, name, columns in INDEXES:
+        if table not in tables:
+            continue
+        existing = inspector.get_indexes(table)
+        if any(ix['name'] == name or ix['column_names'] == columns for ix in existing):
+            continue
+        op.create_index(name, table, columns, unique=False)
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = Inspector.from_engine(conn)
+    tables = inspector.get_table_names()
+
+    # Схема 001 - без всех индексов ревизии, в том числе recipe_ingredients
+    for table, name, _ in INDEXES:
+        if table not in tables:
+            continue
+        if any(ix['name'] == name for ix in inspector.get_indexes(table)):
+            op.drop_index(name, table_name=table)
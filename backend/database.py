@@ -1,3 +1,4 @@
+import os
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -5,7 +6,12 @@ from sqlalchemy.orm import sessionmaker
 # Абсолютный путь внутри контейнера.
 # Docker свяжет эту папку с папкой 'foodplanner' на твоем сервере.
 # 4 слэша (sqlite:////) означают абсолютный путь в Unix системах.
-SQL_ALCHEMY_DATABASE_URL = "sqlite:////app/data/menu_planner.db"
+DATA_DIR = "/app/data"
+SQL_ALCHEMY_DATABASE_URL = f"sqlite:///{DATA_DIR}/menu_planner.db"
+
+# Потоков для синхронных эндпоинтов в каждом процессе (main.py). SQLite пишет
+# один процесс за раз, поэтому больше потоков - это больше ожидания блокировки, а не скорость.
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "16"))
 
 # connect_args={"check_same_thread": False} обязательно для SQLite при многопоточном доступе
 engine = create_engine(
@@ -13,7 +19,10 @@ engine = create_engine(
     connect_args={
         "check_same_thread": False,
         "timeout": 15  # Increase timeout to wait for lock release
-    }
+    },
+    # Соединение на каждый поток пула + фоновые задачи (диспетчер Telegram, синхронизация кэшей)
+    pool_size=THREADPOOL_SIZE,
+    max_overflow=4,
 )
 
 # Enable Write-Ahead Logging (WAL) for better concurrency
@@ -0,0 +1,32 @@
+# Продакшен-запуск: gunicorn с воркерами uvicorn (docker-compose.yml).
+# Настройки - из переменных окружения:
+#   WEB_CONCURRENCY  - число процессов (по умолчанию - по числу ядер)
+#   THREADPOOL_SIZE  - потоков для синхронных эндпоинтов в каждом процессе (database.py)
+#   GRACEFUL_TIMEOUT - сколько секунд ждать завершения запросов при остановке
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Приложению нужно знать число процессов: кэши синхронизируются между ними (services/cache_sync.py)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# Приложение импортируется один раз в мастере (создание таблиц, индексов) и наследуется воркерами
+preload_app = True
+# SIGTERM: воркеры дорабатывают текущие запросы, останавливают диспетчер Telegram и закрывают пулы
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Воркер, не отвечающий мастеру дольше (зависший цикл событий), перезапускается
+timeout = 60
+keepalive = 5
+# Перезапуск воркеров после стольких запросов (со случайным разбросом) - от утечек памяти
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = "-"
+errorlog = "-"
+
+def post_fork(server, worker):
+    # Соединения SQLite, открытые в мастере при импорте, нельзя использовать в дочернем процессе
+    from database import engine
+    engine.dispose(close=False)
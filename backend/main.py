@@ -1,18 +1,65 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+import anyio.to_thread
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 import models
-from database import engine
+from database import engine, SessionLocal, THREADPOOL_SIZE
+from utils import query_counter
 
 # Импортируем все роутеры из папки routers
-from routers import products, recipes, plan, shopping_list, admin
+from routers import products, recipes, plan, shopping_list, admin, stats, pantry
+
+from services.recipe_service import RecipeService
+from services.stats_service import StatsService
+from services.pantry_service import PantryService, consume_periodically
+from services import product_search
+from services.nutrition_matrix import nutrition_matrix
+from services.cache_sync import cache_sync
+from services.telegram import telegram_dispatcher
+from utils.http_client import outbound_http
 
 # Создаем таблицы в БД (если их нет)
 # Создаем таблицы в БД (если их нет)
 models.Base.metadata.create_all(bind=engine)
+# Поисковые FTS5-индексы продуктов (не описаны в models.py)
+product_search.ensure_search_index(engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Пул потоков для синхронных эндпоинтов (по умолчанию в AnyIO 40) - под размер пула соединений БД
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    # Несколько процессов: сбросы кэшей из других процессов (services/cache_sync.py)
+    cache_sync.start(SessionLocal)
+    # Заполняем кэш КБЖУ/стоимости для рецептов, созданных до его появления
+    db = SessionLocal()
+    try:
+        RecipeService.backfill_totals(db)
+        # Матрица КБЖУ рецептов для автоплана - из только что заполненного кэша
+        nutrition_matrix.preload(db)
+        # Свертка статистики для истории плана, накопленной до ее появления
+        StatsService.backfill(db)
+        # Списываем из запасов блюда, прошедшие пока сервис не работал
+        PantryService.consume_past_meals(db)
+    finally:
+        db.close()
+    # Пул исходящих HTTP-соединений (импорт продуктов, Telegram)
+    outbound_http.start()
+    # Фоновая отправка очереди сообщений Telegram
+    telegram_dispatcher.start(SessionLocal)
+    # Списание блюд, ставших прошедшими (после полуночи или правки плана задним числом).
+    # Чтения запасов и списка покупок ничего не пишут
+    pantry_task = asyncio.create_task(consume_periodically(SessionLocal))
+    yield
+    pantry_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await pantry_task
+    telegram_dispatcher.stop()
+    outbound_http.close()
+    cache_sync.stop()
 
-
-app = FastAPI(title="Menu Planner API")
+app = FastAPI(title="Menu Planner API", lifespan=lifespan)
 
 # Настройка CORS
 app.add_middleware(
@@ -21,14 +68,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Заголовки пагинации должны быть доступны из JS
+    expose_headers=["X-Total-Count", "X-Next-Cursor"],
 )
 
+# Считаем SQL-запросы на каждый HTTP-запрос (заголовок X-Query-Count).
+# Используется QA-тестами для ловли N+1 регрессий.
+query_counter.install(engine)
+
+@app.middleware("http")
+async def count_queries(request, call_next):
+    # Сначала - изменения кэшей, сделанные другими процессами (их запросы не в счет)
+    if cache_sync.changed():
+        await run_in_threadpool(cache_sync.poll)
+    counter, token = query_counter.start()
+    try:
+        response = await call_next(request)
+    finally:
+        query_counter.stop(token)
+    response.headers["X-Query-Count"] = str(counter.count)
+    return response
+
 # Подключаем модули (роутеры)
 app.include_router(products.router)
 app.include_router(recipes.router)
 app.include_router(plan.router)
 app.include_router(shopping_list.router)
 app.include_router(admin.router) # <-- Админка подключена
+app.include_router(stats.router)
+app.include_router(pantry.router)
 
 @app.get("/")
 def read_root():
@@ -1,5 +1,5 @@
 import datetime
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Date
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Date, Boolean, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -18,6 +18,8 @@ class Product(Base):
     carbs = Column(Float, nullable=True, default=None)
     # Новое поле: вес за штуку (если unit='шт')
     weight_per_piece = Column(Float, nullable=True)
+    # Время последнего изменения (для инкрементальной выгрузки GET /products/?since=)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
 
 class Recipe(Base):
     __tablename__ = "recipes"
@@ -32,73 +34,92 @@ class Recipe(Base):
 
     ingredients = relationship("RecipeIngredient", back_populates="recipe", cascade="all, delete-orphan")
 
-    @property
-    def total_cost(self):
-        total = 0.0
-        for item in self.ingredients:
-            if item.product:
-                pack_amount = item.product.amount if item.product.amount > 0 else 1.0
-                price_per_unit = item.product.price / pack_amount
-                total += item.quantity * price_per_unit
-        return round(total, 2)
-
-    def _calculate_nutrient(self, attr_name):
-        total = 0.0
+    # Кэш итогов по ингредиентам (сырые суммы без округления).
+    # Пересчитывается через recalculate_totals() при изменении ингредиентов
+    # или продуктов рецепта; NULL - еще не посчитано (старые записи).
+    cached_cost = Column(Float, nullable=True)
+    cached_calories = Column(Float, nullable=True)
+    cached_proteins = Column(Float, nullable=True)
+    cached_fats = Column(Float, nullable=True)
+    cached_carbs = Column(Float, nullable=True)
+    cached_weight = Column(Float, nullable=True)
+
+    def _compute_totals(self):
+        """Walks ingredients once and returns raw cost, nutrient and weight sums."""
+        totals = {"cost": 0.0, "calories": 0.0, "proteins": 0.0, "fats": 0.0, "carbs": 0.0, "weight": 0.0}
         for item in self.ingredients:
-            if item.product:
-                unit_lower = (item.product.unit or "").lower()
-                is_pieces = unit_lower in ["шт", "шт.", "pcs", "piece", "stk"]
-                qty = item.quantity
-                if unit_lower in ["kg", "кг", "l", "л"]:
-                    qty *= 1000
-                
-                value_per_unit = getattr(item.product, attr_name, 0.0) or 0.0
-
-                if is_pieces and item.product.weight_per_piece:
+            product = item.product
+            if not product:
+                continue
+
+            pack_amount = product.amount if product.amount > 0 else 1.0
+            totals["cost"] += item.quantity * (product.price / pack_amount)
+
+            unit_lower = (product.unit or "").lower()
+            is_pieces = unit_lower in ["шт", "шт.", "pcs", "piece", "stk"]
+            qty = item.quantity
+            if unit_lower in ["kg", "кг", "l", "л"]:
+                qty *= 1000
+
+            for attr_name in ("calories", "proteins", "fats", "carbs"):
+                value_per_unit = getattr(product, attr_name, 0.0) or 0.0
+                if is_pieces and product.weight_per_piece:
                     # Если штуки и есть вес -> считаем вес партии и берем нутриент на 100г
-                    total_weight = qty * item.product.weight_per_piece
-                    total += (value_per_unit / 100.0) * total_weight
+                    totals[attr_name] += (value_per_unit / 100.0) * (qty * product.weight_per_piece)
                 elif is_pieces:
                     # Если штуки без веса -> нутриент за штуку
-                    total += value_per_unit * qty
+                    totals[attr_name] += value_per_unit * qty
                 else:
-                    val_per_gram = value_per_unit / 100.0
-                    total += qty * val_per_gram
-        return total
+                    totals[attr_name] += qty * (value_per_unit / 100.0)
+
+            if unit_lower in ["kg", "кг", "l", "л"]:
+                totals["weight"] += item.quantity * 1000
+            elif unit_lower in ["g", "г", "ml", "мл"]:
+                totals["weight"] += item.quantity
+            elif is_pieces and product.weight_per_piece:
+                totals["weight"] += item.quantity * product.weight_per_piece
+        return totals
+
+    def recalculate_totals(self):
+        """Refreshes cached_* columns from the current ingredients and products."""
+        totals = self._compute_totals()
+        self.cached_cost = totals["cost"]
+        self.cached_calories = totals["calories"]
+        self.cached_proteins = totals["proteins"]
+        self.cached_fats = totals["fats"]
+        self.cached_carbs = totals["carbs"]
+        self.cached_weight = totals["weight"]
+
+    def _total(self, key):
+        value = getattr(self, f"cached_{key}")
+        if value is None:
+            # Кэш еще не заполнен - считаем по ингредиентам
+            return self._compute_totals()[key]
+        return value
+
+    @property
+    def total_cost(self):
+        return round(self._total("cost"), 2)
 
     @property
     def total_calories(self):
-        return round(self._calculate_nutrient("calories"))
+        return round(self._total("calories"))
 
     @property
     def total_proteins(self):
-        return round(self._calculate_nutrient("proteins"), 1)
+        return round(self._total("proteins"), 1)
 
     @property
     def total_fats(self):
-        return round(self._calculate_nutrient("fats"), 1)
+        return round(self._total("fats"), 1)
 
     @property
     def total_carbs(self):
-        return round(self._calculate_nutrient("carbs"), 1)
+        return round(self._total("carbs"), 1)
 
     @property
     def total_weight(self):
-        weight = 0.0
-        for item in self.ingredients:
-            if item.product:
-                unit_lower = (item.product.unit or "").lower()
-                qty = item.quantity
-                
-                is_pieces = unit_lower in ["шт", "шт.", "pcs", "piece", "stk"]
-
-                if unit_lower in ["kg", "кг", "l", "л"]:
-                    weight += qty * 1000
-                elif unit_lower in ["g", "г", "ml", "мл"]:
-                    weight += qty
-                elif is_pieces and item.product.weight_per_piece:
-                    weight += qty * item.product.weight_per_piece
-        return weight
+        return self._total("weight")
 
     @property
     def calories_per_100g(self):
@@ -147,8 +168,9 @@ class Recipe(Base):
 class RecipeIngredient(Base):
     __tablename__ = "recipe_ingredients"
     id = Column(Integer, primary_key=True, index=True)
-    recipe_id = Column(Integer, ForeignKey("recipes.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), index=True)
+    # Индекс - обратный поиск рецептов по продукту (services/invalidation.py)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     quantity = Column(Float)
     recipe = relationship("Recipe", back_populates="ingredients")
     product = relationship("Product")
@@ -165,6 +187,15 @@ class FamilyMember(Base):
 
 class WeeklyPlanEntry(Base):
     __tablename__ = "weekly_plan"
+    # Миграция 002 создает их и в базах, созданных раньше
+    __table_args__ = (
+        # Диапазон дат в порядке (date, id) - план, постраничный вывод, очистка, список покупок
+        Index("ix_weekly_plan_date_id", "date", "id"),
+        # Занятость слота (date, meal_type, участник) - автоплан
+        Index("ix_weekly_plan_slot", "date", "meal_type", "family_member_id"),
+        # Записи с рецептом - сброс кэшей при изменении рецепта
+        Index("ix_weekly_plan_recipe_id", "recipe_id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     day_of_week = Column(String)
     meal_type = Column(String)
@@ -174,10 +205,34 @@ class WeeklyPlanEntry(Base):
 
     # --- НОВОЕ ПОЛЕ ---
     date = Column(Date, nullable=True)
+    # Продукты блюда уже списаны из запасов (services/pantry_service.py)
+    pantry_consumed = Column(Boolean, default=False)
 
     recipe = relationship("Recipe")
     family_member = relationship("FamilyMember")
 
+class PlanDailyStats(Base):
+    """Свертка плана по дню и участнику (services/stats_service.py), обновляется при изменениях плана."""
+    __tablename__ = "plan_daily_stats"
+    date = Column(Date, primary_key=True)
+    # 0 - записи без участника (family_member_id IS NULL)
+    member_id = Column(Integer, primary_key=True)
+    calories = Column(Float, default=0)
+    proteins = Column(Float, default=0)
+    fats = Column(Float, default=0)
+    carbs = Column(Float, default=0)
+    cost = Column(Float, default=0)
+    items_count = Column(Integer, default=0)
+
+class PantryItem(Base):
+    """Запасы дома: количество продукта в его единицах (unit)."""
+    __tablename__ = "pantry_items"
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    quantity = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+    product = relationship("Product")
+
 class AppSetting(Base):
     __tablename__ = "app_settings"
     key = Column(String, primary_key=True, index=True)
@@ -187,4 +242,56 @@ class TelegramUser(Base):
     __tablename__ = "telegram_users"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
-    chat_id = Column(String, unique=True)
\ No newline at end of file
+    chat_id = Column(String, unique=True)
+
+class TelegramOutbox(Base):
+    """Исходящие сообщения Telegram (services/telegram.py): отправляет фоновый диспетчер."""
+    __tablename__ = "telegram_outbox"
+    __table_args__ = (
+        # Выборка диспетчера: сообщения в статусе, срок которых наступил
+        Index("ix_telegram_outbox_due", "status", "next_attempt_at"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    chat_id = Column(String)
+    text = Column(Text)
+    parse_mode = Column(String, nullable=True)
+    # Общий для сообщений одной рассылки
+    broadcast_id = Column(String, nullable=True, index=True)
+    # pending -> sending -> sent | pending (повтор) | dead
+    status = Column(String, default="pending")
+    attempts = Column(Integer, default=0)
+    # pending - когда отправлять, sending - когда считать попытку зависшей
+    next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+class ImportSource(Base):
+    """Состояние импорта продуктов по каждому источнику (URL фида)."""
+    __tablename__ = "import_sources"
+    url = Column(String, primary_key=True)
+    # Сколько строк фида уже закоммичено в текущем (незавершенном) импорте
+    checkpoint_row = Column(Integer, default=0)
+    # Версия фида (ETag / Last-Modified / хэш), к которой относится контрольная точка
+    checkpoint_validator = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    # Последний полностью импортированный ответ - для условных запросов
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    content_hash = Column(String, nullable=True)
+    # Источник умеет отдавать только изменения (?since=)
+    supports_since = Column(Boolean, default=False)
+    last_synced_at = Column(DateTime, nullable=True)
+
+class CacheEvent(Base):
+    """Сброс кэшей для других процессов сервера (services/cache_sync.py); старые строки удаляются."""
+    __tablename__ = "cache_events"
+    # AUTOINCREMENT: id не переиспользуются после удаления - по разрыву в них видно пропущенные события
+    __table_args__ = {"sqlite_autoincrement": True}
+    id = Column(Integer, primary_key=True)
+    channel = Column(String)
+    payload = Column(Text)
+    # pid процесса-источника: свои события он уже применил
+    origin = Column(Integer)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
@@ -1,35 +1,24 @@
 import json
 import os
 from typing import List
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 import models
 import schemas
 from dependencies import get_db
+from services import invalidation, telegram
+from services.product_service import EXTERNAL_API_URL
+from services.settings_cache import app_settings, config_file, load_config, set_app_setting
 
 router = APIRouter(prefix="/admin", tags=["Administration"])
 
-CONFIG_PATH = "/app/data/config.json"
 SETTINGS_BACKUP_PATH = "/app/data/settings.json"
 
 class LoginRequest(BaseModel):
     password: str
 
-def load_config():
-    default_config = {"admin_password": "123", "app_name": "FoodPlanner"}
-    if not os.path.exists(CONFIG_PATH):
-        try:
-            with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-                json.dump(default_config, f, indent=2)
-            return default_config
-        except Exception: return default_config
-    try:
-        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception: return default_config
-
 @router.post("/verify")
 def verify_password(body: LoginRequest):
     config = load_config()
@@ -40,19 +29,46 @@ def verify_password(body: LoginRequest):
 # Telegram Token
 @router.get("/telegram/token")
 def get_bot_token(db: Session = Depends(get_db)):
-    setting = db.query(models.AppSetting).filter(models.AppSetting.key == "bot_token").first()
-    return {"token": setting.value if setting else ""}
+    return {"token": app_settings.get(db, telegram.TOKEN_SETTING)}
 
 @router.post("/telegram/token")
 def set_bot_token(body: schemas.TokenUpdate, db: Session = Depends(get_db)):
-    setting = db.query(models.AppSetting).filter(models.AppSetting.key == "bot_token").first()
-    if not setting:
-        setting = models.AppSetting(key="bot_token", value=body.token)
-        db.add(setting)
-    else: setting.value = body.token
+    set_app_setting(db, telegram.TOKEN_SETTING, body.token)
     db.commit()
     return {"status": "ok", "message": "Токен сохранен"}
 
+# Адрес Bot API - только чтение, задается TELEGRAM_API_URL
+@router.get("/telegram/api-url")
+def get_bot_api_url():
+    return {"url": telegram.API_URL}
+
+# Фид продуктов для POST /products/import - только чтение, задается PRODUCT_FEED_URL
+@router.get("/products/feed-url")
+def get_product_feed_url():
+    return {"url": EXTERNAL_API_URL}
+
+# Telegram Outbox: очередь отправки и недоставленные сообщения
+@router.get("/telegram/outbox", response_model=List[schemas.TelegramOutboxResponse])
+def get_telegram_outbox(status: str = Query(None, pattern="^(pending|sending|sent|dead)$"),
+                        limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db)):
+    return telegram.list_outbox(db, status, limit)
+
+@router.get("/telegram/outbox/stats")
+def get_telegram_outbox_stats(db: Session = Depends(get_db)):
+    return telegram.outbox_stats(db)
+
+@router.post("/telegram/outbox/{message_id}/retry", response_model=schemas.TelegramOutboxResponse)
+def retry_telegram_message(message_id: int, db: Session = Depends(get_db)):
+    return telegram.retry_message(db, message_id)
+
+@router.post("/telegram/broadcast")
+def broadcast_telegram_message(body: schemas.BroadcastRequest, db: Session = Depends(get_db)):
+    return telegram.broadcast_message(db, body.text, body.chat_ids)
+
+@router.get("/telegram/broadcasts/{broadcast_id}")
+def get_telegram_broadcast(broadcast_id: str, db: Session = Depends(get_db)):
+    return telegram.broadcast_status(db, broadcast_id)
+
 # Telegram Users
 @router.get("/telegram/users", response_model=List[schemas.TelegramUserResponse])
 def get_telegram_users(db: Session = Depends(get_db)):
@@ -152,11 +168,13 @@ def import_settings(db: Session = Depends(get_db)):
     if not os.path.exists(SETTINGS_BACKUP_PATH): raise HTTPException(status_code=404, detail="Файл не найден")
     try:
         with open(SETTINGS_BACKUP_PATH, "r", encoding="utf-8") as f: data = json.load(f)
+        old_keys = {key for key, in db.query(models.AppSetting.key)}
         db.query(models.AppSetting).delete()
         db.query(models.TelegramUser).delete()
         db.query(models.FamilyMember).delete()
         
         for s in data.get("app_settings", []): db.add(models.AppSetting(key=s["key"], value=s["value"]))
+        invalidation.notify_settings_changed(db, old_keys | {s["key"] for s in data.get("app_settings", [])})
         for u in data.get("telegram_users", []): db.add(models.TelegramUser(name=u["name"], chat_id=u["chat_id"]))
         for f in data.get("family_members", []): 
             db.add(models.FamilyMember(
@@ -211,4 +229,27 @@ def run_migrations():
         fast_migrate.run_auto_migrations()
         return {"status": "ok", "message": "Миграции выполнены успешно"}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Migration failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Migration failed: {str(e)}")
+# Планы горячих запросов (EXPLAIN QUERY PLAN) - проверка индексов
+@router.get("/db/query-plans")
+def get_query_plans(db: Session = Depends(get_db)):
+    from utils import query_plans
+    return query_plans.report(db)
+
+# Исходящие HTTP-запросы: число, повторы, задержки по хостам
+@router.get("/http/metrics")
+def get_http_metrics():
+    from utils.http_client import outbound_http
+    return outbound_http.metrics()
+
+# Кэш настроек (app_settings, config.json)
+@router.get("/settings/cache")
+def get_settings_cache_stats():
+    return {"app_settings": app_settings.stats(), "config": config_file.stats()}
+
+# Процесс, ответивший на запрос, и синхронизация кэшей между процессами сервера
+@router.get("/server")
+def get_server_info():
+    from database import THREADPOOL_SIZE
+    from services.cache_sync import cache_sync
+    return {"pid": os.getpid(), "threadpool_size": THREADPOOL_SIZE, "cache_sync": cache_sync.stats()}
@@ -0,0 +1,25 @@
+from typing import List
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+import schemas
+from dependencies import get_db
+from services.pantry_service import PantryService
+
+router = APIRouter(prefix="/pantry", tags=["Pantry"])
+
+@router.get("/", response_model=List[schemas.PantryItemResponse])
+def get_pantry(db: Session = Depends(get_db)):
+    return PantryService.get_pantry(db)
+
+@router.post("/consume")
+def consume_past_meals(db: Session = Depends(get_db)):
+    """Takes meals dated before today out of the pantry now instead of waiting for the background check."""
+    return {"consumed": PantryService.consume_past_meals(db)}
+
+@router.put("/{product_id}", response_model=schemas.PantryItemResponse)
+def set_pantry_quantity(product_id: int, body: schemas.PantryItemUpdate, db: Session = Depends(get_db)):
+    return PantryService.set_quantity(db, product_id, body.quantity)
+
+@router.delete("/{product_id}")
+def remove_from_pantry(product_id: int, db: Session = Depends(get_db)):
+    return PantryService.remove(db, product_id)
@@ -1,20 +1,33 @@
 import datetime
-from typing import List
-from fastapi import APIRouter, Depends
+from typing import List, Union
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
 import schemas
 from dependencies import get_db
 from services.plan_service import PlanService
+from services import meal_optimizer
+from utils.pagination import MAX_PAGE_SIZE, set_page_headers
 
 router = APIRouter(prefix="/plan", tags=["Weekly Plan"])
 
-@router.get("/", response_model=List[schemas.PlanItemResponse])
+@router.get("/", response_model=Union[List[schemas.PlanItemResponse], schemas.PlanCompactResponse])
 def get_plan(
+    response: Response,
     start_date: datetime.date = None, 
     end_date: datetime.date = None, 
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    compact: bool = False,
     db: Session = Depends(get_db)
 ):
-    return PlanService.get_plan(db, start_date, end_date)
+    # compact=true: {entries, recipes} без повторения полного рецепта в каждой записи
+    if compact:
+        page, payload = PlanService.get_plan_compact(db, start_date, end_date, limit, cursor)
+        set_page_headers(response, page)
+        return payload
+    page = PlanService.get_plan_page(db, start_date, end_date, limit, cursor)
+    set_page_headers(response, page)
+    return page.items
 
 @router.post("/", response_model=schemas.PlanItemResponse)
 def add_to_plan(item: schemas.PlanItemCreate, db: Session = Depends(get_db)):
@@ -37,7 +50,7 @@ def clear_plan(
 ):
     return PlanService.clear_plan(db, start_date, end_date)
 
-@router.post("/batch", response_model=List[schemas.PlanItemResponse])
+@router.post("/batch", response_model=schemas.PlanDiffResponse)
 def update_plan_batch(items: List[schemas.PlanItemCreate], db: Session = Depends(get_db)):
     return PlanService.batch_update(db, items)
 
@@ -46,8 +59,18 @@ def autofill_one(req: schemas.AutoFillRequest = None, db: Session = Depends(get_
     return PlanService.autofill_one(db, req)
 
 @router.post("/autofill_week")
-def autofill_week(db: Session = Depends(get_db)):
-    return PlanService.autofill_week(db)
+def autofill_week(
+    seed: int = Query(None, ge=0),
+    time_budget: float = Query(meal_optimizer.DEFAULT_TIME_BUDGET, gt=0, le=meal_optimizer.MAX_TIME_BUDGET),
+    db: Session = Depends(get_db)
+):
+    # Одинаковые seed и данные дают одинаковый план (если поиск уложился в time_budget, секунд)
+    return PlanService.autofill_week(db, seed, time_budget)
+
+@router.post("/distribute", response_model=schemas.DistributeResponse)
+def distribute_week(req: schemas.DistributeRequest = None, db: Session = Depends(get_db)):
+    # Только разница с прежним планом следующей недели
+    return PlanService.distribute_week(db, req or schemas.DistributeRequest())
 
 @router.get("/export")
 def export_plan(db: Session = Depends(get_db)):
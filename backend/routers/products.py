@@ -1,9 +1,11 @@
+import datetime
 from typing import List
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
 import schemas
 from dependencies import get_db
 from services.product_service import ProductService
+from utils.pagination import MAX_PAGE_SIZE, set_page_headers
 
 router = APIRouter(
     prefix="/products",
@@ -11,27 +13,46 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[schemas.ProductResponse])
-def read_products(name: str = None, db: Session = Depends(get_db)):
-    return ProductService.get_products(db, name)
+def read_products(
+    response: Response,
+    name: str = None,
+    since: datetime.datetime = None,
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    db: Session = Depends(get_db)
+):
+    # Сообщаем импортерам, что можно запрашивать только изменения (?since=)
+    response.headers["X-Supports-Since"] = "true"
+    page = ProductService.get_products_page(db, name, since, limit, cursor)
+    set_page_headers(response, page)
+    return page.items
 
 @router.post("/", response_model=schemas.ProductResponse)
 def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
     return ProductService.create_product(db, product)
 
-# Export and import routes MUST come before /{product_id} routes
-# to prevent FastAPI from treating "export" and "import" as product IDs
+# Search, export and import routes MUST come before /{product_id} routes
+# to prevent FastAPI from treating "search", "export" and "import" as product IDs
+@router.get("/search", response_model=List[schemas.ProductResponse])
+def search_products(q: str, limit: int = 20, db: Session = Depends(get_db)):
+    return ProductService.search_products(db, q, limit)
+
 @router.get("/export")
 def export_products(db: Session = Depends(get_db)):
     return ProductService.export_products(db)
 
 @router.post("/import")
-def import_products(db: Session = Depends(get_db)):
-    return ProductService.import_products(db)
+def import_products(batch_size: int = None, db: Session = Depends(get_db)):
+    return ProductService.import_products(db, batch_size)
 
 @router.get("/{product_id}", response_model=schemas.ProductResponse)
 def read_product(product_id: int, db: Session = Depends(get_db)):
     return ProductService.get_product_by_id(db, product_id)
 
+@router.get("/{product_id}/recipes", response_model=List[int])
+def read_product_recipes(product_id: int, db: Session = Depends(get_db)):
+    return ProductService.get_product_recipe_ids(db, product_id)
+
 @router.put("/{product_id}", response_model=schemas.ProductResponse)
 def update_product(product_id: int, product: schemas.ProductCreate, db: Session = Depends(get_db)):
     return ProductService.update_product(db, product_id, product)
@@ -1,10 +1,12 @@
 from typing import List
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 import schemas
 from dependencies import get_db
 from services.recipe_service import RecipeService
+from services.nutrition_matrix import nutrition_matrix
+from utils.pagination import MAX_PAGE_SIZE, set_page_headers
 
 router = APIRouter(
     prefix="/recipes",
@@ -12,8 +14,15 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[schemas.RecipeResponse])
-def read_recipes(db: Session = Depends(get_db)):
-    return RecipeService.get_recipes(db)
+def read_recipes(
+    response: Response,
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    db: Session = Depends(get_db)
+):
+    page = RecipeService.get_recipes_page(db, limit, cursor)
+    set_page_headers(response, page)
+    return page.items
 
 @router.post("/", response_model=schemas.RecipeResponse)
 def create_recipe(recipe: schemas.RecipeCreate, db: Session = Depends(get_db)):
@@ -31,6 +40,10 @@ def delete_recipe(recipe_id: int, db: Session = Depends(get_db)):
 def export_recipes(db: Session = Depends(get_db)):
     return RecipeService.export_recipes(db)
 
+@router.get("/matrix")
+def get_nutrition_matrix_stats():
+    return nutrition_matrix.stats()
+
 @router.post("/import")
 def import_recipes(db: Session = Depends(get_db)):
     return RecipeService.import_recipes(db)
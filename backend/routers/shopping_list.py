@@ -1,10 +1,11 @@
 import requests
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 import models
+import schemas
 from dependencies import get_db
 
 router = APIRouter(
@@ -15,33 +16,63 @@ router = APIRouter(
 class TelegramSendRequest(BaseModel):
     chat_id: str
 
-from services.shopping_list import calculate_shopping_list
+from services.shopping_list import get_shopping_list, shopping_list_cache
+from services.pantry_service import PantryService
 
 @router.get("/")
-def get_shopping_list_api(start_date: str = None, end_date: str = None, db: Session = Depends(get_db)):
-    return calculate_shopping_list(db, start_date, end_date)
+def get_shopping_list_api(response: Response, start_date: str = None, end_date: str = None, db: Session = Depends(get_db)):
+    items, hit = get_shopping_list(db, start_date, end_date)
+    response.headers["X-Cache"] = "HIT" if hit else "MISS"
+    return items
 
-from services.telegram import send_telegram_message
+@router.post("/bought")
+def mark_shopping_list_bought(body: schemas.MarkBoughtRequest = None, start_date: str = None, end_date: str = None,
+                              db: Session = Depends(get_db)):
+    """Puts the packs to buy (all lines or body.line_ids) into the pantry."""
+    items, _ = get_shopping_list(db, start_date, end_date)
+    line_ids = set(body.line_ids) if body and body.line_ids is not None else None
+    added = PantryService.add_purchases(db, items, line_ids)
+    return {"ok": True, "added": [{"product_id": pid, "quantity": qty} for pid, qty in added.items()]}
 
-@router.post("/send")
-def send_shopping_list_telegram(body: TelegramSendRequest, start_date: str = None, end_date: str = None, db: Session = Depends(get_db)):
-    items = calculate_shopping_list(db, start_date, end_date)
+@router.get("/cache")
+def get_shopping_list_cache_stats():
+    return shopping_list_cache.stats()
+
+from services.telegram import send_telegram_message, broadcast_message
+
+def _shopping_list_message(db: Session, start_date: str, end_date: str):
+    items, _ = get_shopping_list(db, start_date, end_date)
     
     if not items:
         raise HTTPException(status_code=400, detail="Список покупок пуст")
 
     total_cost = sum(i["estimated_cost"] for i in items)
+    purchase_cost = sum(i["purchase_cost"] for i in items)
     
     message_lines = ["🛒 *Список покупок*", ""]
     for i, item in enumerate(items, 1):
         line = f"{i}. {item['name']} — *{item['total_quantity']} {item['unit']}* (~€{item['estimated_cost']:.2f})"
         message_lines.append(line)
+        packs = ", ".join(f"{p['packs']} × {p['pack_amount']} {p['unit']}" for p in item["purchases"])
+        if packs:
+            message_lines.append(f"    🛍 {packs}")
     
     message_lines.append("")
     message_lines.append(f"💰 *Примерно:* €{total_cost:.2f}")
+    message_lines.append(f"📦 *Целыми упаковками:* €{purchase_cost:.2f}")
     
-    message_text = "\n".join(message_lines)
-    
-    send_telegram_message(db, body.chat_id, message_text)
+    return "\n".join(message_lines)
+
+@router.post("/send")
+def send_shopping_list_telegram(body: TelegramSendRequest, start_date: str = None, end_date: str = None, db: Session = Depends(get_db)):
+    message_text = _shopping_list_message(db, start_date, end_date)
+    outbox_id = send_telegram_message(db, body.chat_id, message_text)
+
+    return {"status": "queued", "message": "Список поставлен в очередь отправки", "outbox_id": outbox_id}
 
-    return {"status": "ok", "message": "Список отправлен"}
\ No newline at end of file
+@router.post("/broadcast")
+def broadcast_shopping_list_telegram(body: schemas.BroadcastRecipients = None, start_date: str = None,
+                                     end_date: str = None, db: Session = Depends(get_db)):
+    # Всем пользователям Telegram (или body.chat_ids); статус - GET /admin/telegram/broadcasts/{broadcast_id}
+    message_text = _shopping_list_message(db, start_date, end_date)
+    return broadcast_message(db, message_text, body.chat_ids if body else None)
@@ -0,0 +1,16 @@
+import datetime
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+import schemas
+from dependencies import get_db
+from services.stats_service import StatsService
+
+router = APIRouter(prefix="/stats", tags=["Statistics"])
+
+@router.get("/", response_model=schemas.StatsResponse)
+def get_stats(
+    start_date: datetime.date = None,
+    end_date: datetime.date = None,
+    db: Session = Depends(get_db)
+):
+    return StatsService.get_stats(db, start_date, end_date)
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class ProductBase(BaseModel):
     name: str
@@ -40,9 +40,9 @@ class RecipeBase(BaseModel):
 
 class RecipeCreate(RecipeBase):
     ingredients: List[IngredientCreate] = []
-class RecipeResponse(RecipeBase):
+class RecipeSummary(RecipeBase):
+    # Рецепт без состава: итоги берутся из кэша на строке рецепта
     id: int
-    ingredients: List[IngredientResponse] = []
     total_cost: float
     total_calories: float
     total_proteins: float
@@ -55,6 +55,8 @@ class RecipeResponse(RecipeBase):
     calories_per_portion: float
     weight_per_portion: float
     class Config: from_attributes = True
+class RecipeResponse(RecipeSummary):
+    ingredients: List[IngredientResponse] = []
 
 class FamilyMemberBase(BaseModel):
     name: str
@@ -89,6 +91,74 @@ class PlanItemResponse(PlanItemBase):
     recipe: Optional[RecipeResponse]
     family_member: Optional[FamilyMemberResponse]
     class Config: from_attributes = True
+class PlanEntryCompact(PlanItemBase):
+    id: int
+    class Config: from_attributes = True
+class PlanCompactResponse(BaseModel):
+    # Каждый рецепт один раз, записи ссылаются на него по recipe_id
+    entries: List[PlanEntryCompact]
+    recipes: Dict[int, RecipeSummary]
+
+class DistributeRequest(BaseModel):
+    # Настройки страницы планирования (хранятся в браузере)
+    hidden_recipe_ids: List[int] = []
+    # recipe_id -> порций в котле; по умолчанию - порции рецепта
+    portions: Dict[int, float] = {}
+    # Едоков на котел; без участников семьи - еще и число безымянных едоков
+    eaters_count: Optional[int] = Field(None, ge=1)
+    seed: Optional[int] = Field(None, ge=0)
+class PlanDiffResponse(BaseModel):
+    # Изменения плана: новые и измененные записи целиком, от удаленных - только id
+    added: List[PlanEntryCompact]
+    updated: List[PlanEntryCompact] = []
+    removed: List[int]
+    unchanged: int
+class DistributeResponse(PlanDiffResponse):
+    seed: int
+
+class StatsTotals(BaseModel):
+    calories: float
+    proteins: float
+    fats: float
+    carbs: float
+    cost: float
+    items_count: int
+class StatsDay(StatsTotals):
+    date: datetime.date
+    day_of_week: str
+class StatsWeek(StatsTotals):
+    week_start: datetime.date
+class StatsLimits(BaseModel):
+    calories: float
+    proteins: float
+    fats: float
+    carbs: float
+class StatsGroup(BaseModel):
+    # member = None - вся семья (включая записи без участника)
+    member: Optional[FamilyMemberResponse] = None
+    # Дневные нормы (max_* участника, для всей семьи - сумма); None, если участников нет
+    limits: Optional[StatsLimits] = None
+    days: List[StatsDay]
+    weeks: List[StatsWeek]
+    total: StatsTotals
+class StatsResponse(BaseModel):
+    start_date: datetime.date
+    end_date: datetime.date
+    all: StatsGroup
+    members: List[StatsGroup]
+
+class PantryItemUpdate(BaseModel):
+    quantity: float = Field(ge=0)
+class PantryItemResponse(BaseModel):
+    product_id: int
+    # Количество в единицах продукта (product.unit)
+    quantity: float
+    updated_at: Optional[datetime.datetime] = None
+    product: ProductResponse
+    class Config: from_attributes = True
+class MarkBoughtRequest(BaseModel):
+    # id строк списка покупок; None - весь список
+    line_ids: Optional[List[int]] = None
 
 class TelegramUserBase(BaseModel):
     name: str
@@ -98,4 +168,20 @@ class TelegramUserResponse(TelegramUserBase):
     id: int
     class Config: from_attributes = True
 class TokenUpdate(BaseModel):
-    token: str
\ No newline at end of file
+    token: str
+class TelegramOutboxResponse(BaseModel):
+    id: int
+    chat_id: str
+    text: str
+    status: str
+    attempts: int
+    next_attempt_at: Optional[datetime.datetime] = None
+    last_error: Optional[str] = None
+    created_at: Optional[datetime.datetime] = None
+    sent_at: Optional[datetime.datetime] = None
+    class Config: from_attributes = True
+class BroadcastRecipients(BaseModel):
+    # None - все пользователи Telegram
+    chat_ids: Optional[List[str]] = None
+class BroadcastRequest(BroadcastRecipients):
+    text: str
@@ -0,0 +1,178 @@
+"""
+Cache invalidation between the worker processes of one server.
+
+Every process keeps its own in-memory caches (shopping lists, nutrition matrix,
+app settings, the daily pantry check). With several workers a cache publishes
+its invalidation here as well: the event is written to cache_events in the
+transaction that made the change, and after COMMIT the process bumps a shared
+counter (utils/process_shared.py). Before handling a request a process compares
+the counter with the last value it saw - a memory read, no SQL - and only when
+it moved reads the new events and hands them to the caches' subscribers. The
+change is therefore visible in every process for any request that starts after
+the writing request got its response.
+
+A process that missed events (they were pruned while it was idle) resets all
+registered caches. With a single process (the default) publish() and poll() do nothing.
+"""
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from sqlalchemy import delete, event, insert, text
+from sqlalchemy.orm import Session
+import models
+from utils import process_shared
+
+logger = logging.getLogger(__name__)
+
+EPOCH_FILE = ".cache_epoch"
+# Сколько хранить события: процесс, простоявший дольше, сбросит кэши целиком
+EVENT_TTL = datetime.timedelta(hours=1)
+PRUNE_INTERVAL = 300.0
+
+class CacheSync:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session_factory = None
+        self._epoch = None
+        self._seen_epoch = None
+        self._last_id = 0
+        self._pruned_at = 0.0
+        self._handlers = {}
+        self._resets = []
+        self.enabled = False
+        self.applied = 0
+        self.resets = 0
+
+    def subscribe(self, channel: str, handler, reset=None):
+        """handler(payload) applies a change published in another process; reset() drops the whole cache."""
+        self._handlers.setdefault(channel, []).append(handler)
+        if reset is not None and reset not in self._resets:
+            self._resets.append(reset)
+
+    def start(self, session_factory):
+        """Enables the sync in a multi-process server; call in each worker (after fork)."""
+        if self.enabled or not process_shared.is_multiprocess():
+            return
+        self._session_factory = session_factory
+        self._epoch = process_shared.SharedCounter(process_shared.data_path(EPOCH_FILE))
+        self._seen_epoch = self._epoch.value()
+        db = session_factory()
+        try:
+            # Кэши процесса еще пусты - прошлые события ему не нужны. Последний выданный
+            # id, а не max(id): таблица могла опустеть после очистки
+            self._last_id = db.execute(text(
+                "SELECT seq FROM sqlite_sequence WHERE name = :table"
+            ), {"table": models.CacheEvent.__tablename__}).scalar() or 0
+            self._prune(db)
+        finally:
+            db.close()
+        self.enabled = True
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._epoch.close()
+        self._epoch = None
+
+    def publish(self, db: Session, channel: str, payload=None):
+        """Queues an event; it is written by the caller's COMMIT (and dropped by rollback)."""
+        if self.enabled:
+            db.info.setdefault(_PENDING_KEY, []).append((channel, payload))
+
+    def changed(self) -> bool:
+        """True if other processes published since the last poll()."""
+        return self.enabled and self._epoch.value() != self._seen_epoch
+
+    def poll(self):
+        """Applies events published by other processes."""
+        if not self.changed():
+            return
+        with self._lock:
+            # Счетчик - до чтения: события, закоммиченные до его увеличения, уже видны
+            epoch = self._epoch.value()
+            if epoch == self._seen_epoch:
+                return
+            db = self._session_factory()
+            try:
+                rows = db.query(models.CacheEvent.id, models.CacheEvent.channel,
+                                models.CacheEvent.payload, models.CacheEvent.origin) \
+                    .filter(models.CacheEvent.id > self._last_id).order_by(models.CacheEvent.id).all()
+                if time.monotonic() - self._pruned_at > PRUNE_INTERVAL:
+                    self._prune(db)
+            finally:
+                db.close()
+
+            if rows and rows[0].id != self._last_id + 1:
+                logger.warning("Пропущены события сброса кэшей, кэши процесса очищены")
+                self._reset()
+            else:
+                pid = os.getpid()
+                for row in rows:
+                    if row.origin != pid:
+                        self._apply(row.channel, json.loads(row.payload))
+            if rows:
+                self._last_id = rows[-1].id
+            self._seen_epoch = epoch
+
+    def _apply(self, channel, payload):
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception(f"Ошибка применения события кэша {channel}")
+                self._reset()
+                return
+        self.applied += 1
+
+    def _reset(self):
+        for reset in self._resets:
+            reset()
+        self.resets += 1
+
+    def _prune(self, db: Session):
+        db.execute(delete(models.CacheEvent).where(
+            models.CacheEvent.created_at < datetime.datetime.utcnow() - EVENT_TTL
+        ))
+        db.commit()
+        self._pruned_at = time.monotonic()
+
+    def _bump(self):
+        if self._epoch is not None:
+            self._epoch.bump()
+
+    def stats(self):
+        return {"enabled": self.enabled, "workers": process_shared.worker_count(),
+                "last_event_id": self._last_id, "applied": self.applied, "resets": self.resets}
+
+cache_sync = CacheSync()
+
+# --- Запись событий ---
+
+_PENDING_KEY = "cache_sync_events"
+_WRITTEN_KEY = "cache_sync_written"
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    events = session.info.pop(_PENDING_KEY, None)
+    if not events:
+        return
+    now, pid = datetime.datetime.utcnow(), os.getpid()
+    session.execute(insert(models.CacheEvent), [
+        {"channel": channel, "payload": json.dumps(payload), "origin": pid, "created_at": now}
+        for channel, payload in events
+    ])
+    session.info[_WRITTEN_KEY] = True
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop(_WRITTEN_KEY, None):
+        cache_sync._bump()
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_WRITTEN_KEY, None)
@@ -0,0 +1,98 @@
+"""
+Dependency tracking for derived data (recipe totals, caches, rollups).
+
+Products are linked to recipes through recipe_ingredients; the reverse lookup
+product_id -> recipe_ids is served by the index on recipe_ingredients.product_id,
+so a change of one product only touches the recipes that actually use it.
+
+Services publish changes via notify_*; consumers register handlers with subscribe().
+Handlers run inside the caller's transaction and must not commit.
+"""
+import logging
+from sqlalchemy.orm import Session
+import models
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_CHANGED = "products_changed"
+RECIPES_CHANGED = "recipes_changed"
+PLAN_CHANGED = "plan_changed"
+PANTRY_CHANGED = "pantry_changed"
+SETTINGS_CHANGED = "settings_changed"
+
+_handlers = {
+    PRODUCTS_CHANGED: [],
+    RECIPES_CHANGED: [],
+    PLAN_CHANGED: [],
+    PANTRY_CHANGED: [],
+    SETTINGS_CHANGED: [],
+}
+
+def subscribe(event: str, handler):
+    """Registers handler for an event. Handler signatures:
+    products_changed: handler(db, product_ids, recipe_ids)
+    recipes_changed:  handler(db, recipe_ids)
+    plan_changed:     handler(db, keys) - keys are (date, family_member_id) of touched plan entries
+    pantry_changed:   handler(db, product_ids) - products whose stock changed
+    settings_changed: handler(db, keys) - changed app_settings keys
+    """
+    if handler not in _handlers[event]:
+        _handlers[event].append(handler)
+
+def recipes_using_products(db: Session, product_ids) -> set:
+    """Returns ids of recipes that have any of the given products as an ingredient."""
+    product_ids = list(set(product_ids))
+    if not product_ids:
+        return set()
+    rows = db.query(models.RecipeIngredient.recipe_id).filter(
+        models.RecipeIngredient.product_id.in_(product_ids)
+    ).distinct().all()
+    return {row.recipe_id for row in rows}
+
+def notify_products_changed(db: Session, product_ids):
+    """
+    Fans a product change (price, macros, deletion) out to dependents.
+    Recipe-level handlers run after product-level ones, so they see fresh recipe totals.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return set()
+    recipe_ids = recipes_using_products(db, product_ids)
+    logger.debug(f"Изменено продуктов: {len(product_ids)}, затронуто рецептов: {len(recipe_ids)}")
+    for handler in _handlers[PRODUCTS_CHANGED]:
+        handler(db, product_ids, recipe_ids)
+    notify_recipes_changed(db, recipe_ids)
+    return recipe_ids
+
+def notify_recipes_changed(db: Session, recipe_ids):
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    for handler in _handlers[RECIPES_CHANGED]:
+        handler(db, recipe_ids)
+
+def plan_keys(entries) -> set:
+    """(date, family_member_id) keys of plan entries, as passed to plan_changed handlers."""
+    return {(e.date, e.family_member_id) for e in entries}
+
+def notify_plan_changed(db: Session, keys):
+    """Publishes added/changed/removed plan entries; for updates pass both old and new keys."""
+    keys = set(keys)
+    if not keys:
+        return
+    for handler in _handlers[PLAN_CHANGED]:
+        handler(db, keys)
+
+def notify_pantry_changed(db: Session, product_ids):
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    for handler in _handlers[PANTRY_CHANGED]:
+        handler(db, product_ids)
+
+def notify_settings_changed(db: Session, keys):
+    keys = set(keys)
+    if not keys:
+        return
+    for handler in _handlers[SETTINGS_CHANGED]:
+        handler(db, keys)
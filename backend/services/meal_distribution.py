@@ -0,0 +1,102 @@
+"""
+Week distribution of the planning page ("Распределить"), ported from
+frontend/src/utils/planningLogic.js so the browser does not have to download
+the catalogue, the family and last week's plan to plan a week.
+
+Breakfasts: every eater first gets last week's breakfasts again (most frequent
+first), the remaining days get a random breakfast recipe that still has portions.
+Lunch and dinner: pots of soup/main recipes in shuffled order are served to all
+eaters; a new pot is cooked when the current one cannot feed everyone, never the
+same recipe twice in a row. Pure functions - no DB access.
+"""
+import random
+from typing import Dict, List, NamedTuple, Optional
+
+DAYS = 7
+BREAKFAST = "breakfast"
+LUNCH_DINNER = ("lunch", "dinner")
+POT_CATEGORIES = ("main", "soup")
+# Сколько раз пытаться заполнить завтраки из случайных рецептов
+_MAX_ATTEMPTS = 100
+
+class Recipe(NamedTuple):
+    id: int
+    category: str
+    portions: int
+
+class Meal(NamedTuple):
+    day: int  # 0 - понедельник
+    meal_type: str
+    recipe_id: int
+    eater: int  # индекс в списке едоков
+
+def distribute(recipes: List[Recipe], eaters: int, pot_portions: Dict[int, float],
+               breakfast_history: Dict[int, List[int]], eaters_per_pot: Optional[int] = None,
+               rng: random.Random = None) -> List[Meal]:
+    """
+    recipes - visible recipes; pot_portions - {recipe_id: portions cooked at once},
+    the recipe's portions by default; breakfast_history - {eater: recipe ids of
+    last week's breakfasts}; eaters_per_pot - portions taken from a pot per meal
+    (the eaters count of the planning page), `eaters` by default.
+    """
+    rng = rng or random.Random()
+    eaters_per_pot = eaters_per_pot or eaters
+
+    def pot_size(recipe):
+        return pot_portions.get(recipe.id) or recipe.portions or 1
+
+    meals = []
+    shuffled = [r for r in recipes if r.category != "side"]
+    rng.shuffle(shuffled)
+    breakfasts = [r for r in shuffled if r.category == BREAKFAST]
+    by_id = {r.id: r for r in breakfasts}
+    remaining = {r.id: round(pot_size(r)) for r in recipes}
+
+    # 1. Завтраки: сначала то, что ел на прошлой неделе, затем случайные с остатком порций
+    for eater in range(eaters):
+        counts = {}
+        for recipe_id in breakfast_history.get(eater, []):
+            counts[recipe_id] = counts.get(recipe_id, 0) + 1
+        day = 0
+        for recipe_id, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+            if recipe_id not in by_id:
+                continue
+            # Порций может не хватить - план все равно заполняется
+            for _ in range(count):
+                if day >= DAYS:
+                    break
+                meals.append(Meal(day, BREAKFAST, recipe_id, eater))
+                remaining[recipe_id] -= 1
+                day += 1
+
+        recipe_index = 0
+        for _ in range(_MAX_ATTEMPTS):
+            if day >= DAYS or not breakfasts:
+                break
+            options = list(breakfasts)
+            rng.shuffle(options)
+            recipe = next((r for r in options if remaining[r.id] > 0), None)
+            if recipe is None:
+                recipe = options[recipe_index % len(options)]
+                recipe_index += 1
+            meals.append(Meal(day, BREAKFAST, recipe.id, eater))
+            day += 1
+
+    # 2. Обед и ужин: котлы по очереди, всем едокам одно блюдо
+    pool = [r for r in recipes if r.category in POT_CATEGORIES]
+    rng.shuffle(pool)
+    current, left, index = None, 0, 0
+    for day in range(DAYS):
+        for meal_type in LUNCH_DINNER:
+            if not pool:
+                break
+            if current is None or left < eaters_per_pot:
+                following = pool[index % len(pool)]
+                if current is not None and following.id == current.id and len(pool) > 1:
+                    index += 1
+                    following = pool[index % len(pool)]
+                index += 1
+                current, left = following, pot_size(following)
+            meals.extend(Meal(day, meal_type, current.id, eater) for eater in range(eaters))
+            left -= eaters_per_pot
+    return meals
@@ -0,0 +1,216 @@
+"""
+Meal plan optimizer for autofill.
+
+Free places (slot, member) are filled with pots: a pot is one cooked recipe
+whose portions go to free places in slot order (members in order within a
+slot) until it is empty, then the next pot starts. A plan is the sequence
+of pots; two pots in a row never cook the same recipe. The sequence is searched
+with simulated annealing (replace / swap moves), minimizing the deviation of
+members' lunch + dinner from their daily targets, going over daily limits,
+cost and repeated recipes. Every step scores a batch of neighbouring plans
+at once with NumPy array operations. Pure functions - no DB access.
+"""
+import math
+import time
+from typing import Dict, List, NamedTuple
+import numpy as np
+
+NUTRIENTS = ("calories", "proteins", "fats", "carbs")
+NUTRIENT_WEIGHTS = {"calories": 1.0, "proteins": 0.5, "fats": 0.5, "carbs": 0.5}
+# Доля дневной нормы, которую должны закрыть обед и ужин
+MEAL_SHARE = 0.65
+# Превышение дневного лимита (с учетом уже запланированного) штрафуется сильнее недобора
+OVER_LIMIT_WEIGHT = 4.0
+# Стоимость порции относительно средней по кандидатам
+COST_WEIGHT = 0.3
+# Каждое повторное приготовление одного рецепта за неделю
+REPEAT_WEIGHT = 0.2
+
+DEFAULT_TIME_BUDGET = 2.0
+MAX_TIME_BUDGET = 10.0
+MAX_ITERATIONS = 1000
+# Соседних планов, оцениваемых за одну итерацию
+BATCH_SIZE = 16
+_START_TEMPERATURE = 0.5
+_END_TEMPERATURE = 0.005
+
+class Dish(NamedTuple):
+    recipe_id: int
+    portions: int
+    # На одну порцию
+    calories: float
+    proteins: float
+    fats: float
+    carbs: float
+    cost: float
+
+class Place(NamedTuple):
+    slot: int
+    day: int
+    member: int  # индекс в списке лимитов участников
+
+class Result(NamedTuple):
+    dishes: List[Dish]  # блюдо для каждого места, в порядке places
+    score: float
+    iterations: int
+    stopped_by: str  # "iterations" | "time"
+
+def _fill(pots: List[int], dishes: List[Dish], place_count: int):
+    """
+    Dish index per place, the cooked recipes in order and how many pots were read.
+    A pot repeating the previous recipe is skipped, so the no-repeat rule always holds.
+    """
+    filled, cooked = [], []
+    used = 0
+    left = 0
+    current = None
+    for _ in range(place_count):
+        if left <= 0:
+            following = None
+            while used < len(pots):
+                used += 1
+                if pots[used - 1] != current or len(dishes) == 1:
+                    following = pots[used - 1]
+                    break
+            if following is None:
+                # Последовательность кончилась - любой другой рецепт
+                following = 0 if current is None else (current + 1) % len(dishes)
+            current = following
+            cooked.append(current)
+            left = dishes[current].portions
+        filled.append(current)
+        left -= 1
+    return filled, cooked, used
+
+class _Problem:
+    """
+    Precomputed arrays for scoring: a batch of pot sequences is filled and
+    scored with a handful of NumPy operations instead of a Python loop per plan.
+    """
+
+    def __init__(self, dishes, places, limits, planned_meals, planned_day):
+        self.dishes = dishes
+        self.place_count = len(places)
+        member_days = sorted({(p.member, p.day) for p in places} | set(planned_meals))
+        index = {key: i for i, key in enumerate(member_days)}
+        # Место -> день участника как матрица 0/1: суммы по дням - одно матричное умножение
+        self.membership = np.zeros((len(member_days), len(places)))
+        self.membership[[index[(p.member, p.day)] for p in places], np.arange(len(places))] = 1.0
+        self.vectors = np.array([[getattr(d, n) for n in NUTRIENTS] for d in dishes], dtype=float)
+        self.portions = np.array([d.portions for d in dishes], dtype=np.int64)
+        costs = np.array([d.cost for d in dishes], dtype=float)
+        cost_scale = costs[costs > 0].mean() if (costs > 0).any() else 1.0
+        self.costs = COST_WEIGHT * costs / cost_scale
+
+        # По каждому дню участника и нутриенту: вес / лимит (0 - нормы нет), цель обеда и ужина
+        # за вычетом уже запланированного на обед и ужин, остаток дневного лимита
+        shape = (len(member_days), len(NUTRIENTS))
+        self.weights, self.targets, self.rooms = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        zero = [0.0] * len(NUTRIENTS)
+        for row, key in enumerate(member_days):
+            meals = planned_meals.get(key, zero)
+            day = planned_day.get(key, zero)
+            for i, n in enumerate(NUTRIENTS):
+                limit = limits[key[0]].get(n)
+                if limit:
+                    self.weights[row, i] = NUTRIENT_WEIGHTS[n] / limit
+                    self.targets[row, i] = MEAL_SHARE * limit - meals[i]
+                    self.rooms[row, i] = limit - day[i]
+
+    def fill(self, pots):
+        """
+        Vectorized _fill for a (batch, length) array of pot sequences:
+        (dish index per place, pots read, repeated cookings) per sequence.
+        """
+        batch, length = pots.shape
+        # Котел, повторяющий предыдущий, пропускается - как в _fill
+        cooked = np.ones(pots.shape, dtype=bool)
+        if len(self.dishes) > 1:
+            cooked[:, 1:] = pots[:, 1:] != pots[:, :-1]
+        ends = np.cumsum(np.where(cooked, self.portions[pots], 0), axis=1)
+        # Котел места - первый, где накопленных порций больше номера места. Строки
+        # сдвинуты на stride, чтобы искать по всему набору одним searchsorted.
+        stride = max(int(ends.max()), self.place_count) + 1
+        offsets = np.arange(batch)[:, None] * stride
+        pot_of_place = np.searchsorted(
+            (ends + offsets).ravel(), (np.arange(self.place_count) + offsets).ravel(), side="right"
+        ).reshape(batch, self.place_count) - np.arange(batch)[:, None] * length
+
+        # Последовательность кончилась раньше мест - редкий случай, по-старому
+        short = ends[:, -1] < self.place_count
+        pot_of_place[short] = 0
+        filled = np.take_along_axis(pots, pot_of_place, axis=1)
+        used = pot_of_place[:, -1] + 1
+        read = cooked & (np.arange(length) < used[:, None])
+        ordered = np.sort(np.where(read, pots, -1), axis=1)
+        distinct = (ordered[:, :1] >= 0).sum(axis=1) + \
+            ((ordered[:, 1:] != ordered[:, :-1]) & (ordered[:, 1:] >= 0)).sum(axis=1)
+        repeats = read.sum(axis=1) - distinct
+        for row in np.flatnonzero(short):
+            dishes, cooked_row, used[row] = _fill(pots[row].tolist(), self.dishes, self.place_count)
+            filled[row] = dishes
+            repeats[row] = len(cooked_row) - len(set(cooked_row))
+        return filled, used, repeats
+
+    def score(self, pots):
+        """Scores and pots read for a (batch, length) array of pot sequences."""
+        filled, used, repeats = self.fill(pots)
+        # (мест, batch * нутриентов) -> (дней участников, batch, нутриентов) одним умножением матриц
+        batch = len(filled)
+        added = (self.membership @ self.vectors[filled.T].reshape(self.place_count, -1)).reshape(-1, batch, len(NUTRIENTS))
+        over = np.maximum(added - self.rooms[:, None], 0.0)
+        total = (self.weights[:, None] * (np.abs(added - self.targets[:, None]) + OVER_LIMIT_WEIGHT * over)).sum(axis=(0, 2))
+        total += self.costs[filled].sum(axis=1) + REPEAT_WEIGHT * repeats
+        return total, used
+
+def optimize(dishes: List[Dish], places: List[Place], limits: List[Dict[str, float]],
+             planned_meals: Dict = None, planned_day: Dict = None, seed: int = 0,
+             time_budget: float = DEFAULT_TIME_BUDGET, max_iterations: int = MAX_ITERATIONS) -> Result:
+    """
+    limits[member] - daily {nutrient: limit}; planned_meals / planned_day -
+    {(member, day): [calories, proteins, fats, carbs]} already in the plan for
+    lunch + dinner / for the whole day. With the same seed and data the result
+    is reproducible unless the time budget cuts the search short (stopped_by == "time").
+    """
+    if not places or not dishes:
+        return Result([], 0.0, 0, "iterations")
+    rng = np.random.default_rng(seed)
+    problem = _Problem(dishes, places, limits, planned_meals or {}, planned_day or {})
+    n = len(dishes)
+    rows = np.arange(BATCH_SIZE)
+
+    # Котлов не больше, чем мест; используется только префикс
+    pots = rng.integers(n, size=len(places))
+    scores, used = problem.score(pots[None])
+    score, used = float(scores[0]), int(used[0])
+    best, best_score = pots.copy(), score
+
+    deadline = time.perf_counter() + time_budget
+    stopped_by = "iterations"
+    iteration = 0
+    while iteration < max_iterations:
+        if time.perf_counter() > deadline:
+            stopped_by = "time"
+            break
+        iteration += 1
+        temperature = _START_TEMPERATURE * (_END_TEMPERATURE / _START_TEMPERATURE) ** (iteration / max_iterations)
+
+        # Соседи текущего плана: замена котла или перестановка двух котлов в прочитанном префиксе
+        limit = min(used + 1, len(pots))
+        i = rng.integers(limit, size=BATCH_SIZE)
+        j = rng.integers(limit, size=BATCH_SIZE)
+        swap = rng.random(BATCH_SIZE) >= 0.7 if limit >= 2 else np.zeros(BATCH_SIZE, dtype=bool)
+        candidates = np.repeat(pots[None], BATCH_SIZE, axis=0)
+        candidates[rows, i] = np.where(swap, pots[j], rng.integers(n, size=BATCH_SIZE))
+        candidates[rows[swap], j[swap]] = pots[i[swap]]
+
+        scores, useds = problem.score(candidates)
+        k = int(np.argmin(scores))
+        delta = scores[k] - score
+        if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+            pots, score, used = candidates[k], float(scores[k]), int(useds[k])
+            if score < best_score:
+                best, best_score = pots.copy(), score
+
+    filled, _, _ = problem.fill(best[None])
+    return Result([dishes[i] for i in filled[0]], best_score, iteration, stopped_by)
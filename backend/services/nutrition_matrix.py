@@ -0,0 +1,157 @@
+"""
+Recipe x nutrient matrix for scoring plans with array operations.
+
+One row per recipe: calories, proteins, fats, carbs, weight and cost per portion
+(from the cached_* totals) plus the number of portions. Rows are loaded on first
+use - one query for all recipes missing from the matrix - and dropped when the
+recipe or one of its products changes (RECIPES_CHANGED), so after a change only
+the affected recipes are read again.
+"""
+import threading
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import models
+from services import invalidation
+from services.cache_sync import cache_sync
+
+COLUMNS = ("calories", "proteins", "fats", "carbs", "weight", "cost")
+_INITIAL_CAPACITY = 256
+
+class NutritionMatrix:
+    """
+    Thread-safe. A generation counter keeps a request that read rows concurrently
+    with a change from storing values that are already stale.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = {}  # recipe_id -> строка матрицы
+        self._free = []   # строки удаленных из матрицы рецептов, используются повторно
+        self._values = np.zeros((_INITIAL_CAPACITY, len(COLUMNS)))
+        self._portions = np.ones(_INITIAL_CAPACITY, dtype=np.int64)
+        self._rows = 0
+        self._generation = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    def lookup(self, db: Session, recipe_ids):
+        """
+        (values, portions) aligned with recipe_ids: values[i] - per-portion COLUMNS
+        of recipe_ids[i], portions[i] - its portions. Unknown ids give a zero row.
+        """
+        recipe_ids = list(recipe_ids)
+        with self._lock:
+            rows = [self._index.get(rid) for rid in recipe_ids]
+            generation = self._generation
+            taken = [0 if row is None else row for row in rows]
+            values = self._values[taken]
+            portions = self._portions[taken]
+
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if missing:
+            loaded = self._load(db, {recipe_ids[i] for i in missing}, generation)
+            for i in missing:
+                values[i], portions[i] = loaded.get(recipe_ids[i], (0.0, 1))
+        return values, portions
+
+    def preload(self, db: Session):
+        """Loads every recipe that is not in the matrix yet."""
+        with self._lock:
+            generation = self._generation
+            known = list(self._index)
+        query = db.query(models.Recipe.id)
+        if known:
+            query = query.filter(models.Recipe.id.notin_(known))
+        ids = {row.id for row in query}
+        if ids:
+            self._load(db, ids, generation)
+
+    def _load(self, db: Session, recipe_ids, generation):
+        Recipe = models.Recipe
+        # Итоги без кэша заполняет RecipeService.backfill_totals при старте
+        rows = db.query(
+            Recipe.id, Recipe.portions, *(getattr(Recipe, f"cached_{c}") for c in COLUMNS)
+        ).filter(Recipe.id.in_(list(recipe_ids))).all()
+        loaded = {}
+        for row in rows:
+            portions = max(row.portions or 1, 1)
+            totals = np.array([value or 0.0 for value in row[2:]], dtype=float)
+            loaded[row.id] = (totals / portions, portions)
+
+        with self._lock:
+            if generation == self._generation:
+                for recipe_id, (vector, portions) in loaded.items():
+                    row = self._index.get(recipe_id)
+                    if row is None:
+                        row = self._index[recipe_id] = self._allocate()
+                    self._values[row] = vector
+                    self._portions[row] = portions
+                self.loads += len(loaded)
+        return loaded
+
+    def _allocate(self):
+        if self._free:
+            return self._free.pop()
+        if self._rows == len(self._values):
+            self._values = np.concatenate([self._values, np.zeros_like(self._values)])
+            self._portions = np.concatenate([self._portions, np.ones_like(self._portions)])
+        self._rows += 1
+        return self._rows - 1
+
+    def invalidate(self, recipe_ids):
+        recipe_ids = set(recipe_ids)
+        if not recipe_ids:
+            return
+        with self._lock:
+            self._generation += 1
+            for recipe_id in recipe_ids:
+                row = self._index.pop(recipe_id, None)
+                if row is not None:
+                    self._free.append(row)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._index)
+            self._index.clear()
+            self._free = []
+            self._rows = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._index),
+                "capacity": len(self._values),
+                "loads": self.loads,
+                "invalidations": self.invalidations,
+            }
+
+nutrition_matrix = NutritionMatrix()
+
+# --- Инвалидация ---
+# Строки сбрасываются сразу и еще раз после COMMIT: строка, прочитанная
+# параллельно по еще старым данным, не переживет фиксацию изменений.
+
+_PENDING_KEY = "nutrition_matrix_dirty_recipes"
+# Канал services/cache_sync.py - сброс строк в других процессах сервера
+SYNC_CHANNEL = "nutrition_matrix"
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    recipe_ids = session.info.pop(_PENDING_KEY, None)
+    if recipe_ids:
+        nutrition_matrix.invalidate(recipe_ids)
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+def _on_recipes_changed(db: Session, recipe_ids):
+    nutrition_matrix.invalidate(recipe_ids)
+    db.info.setdefault(_PENDING_KEY, set()).update(recipe_ids)
+    cache_sync.publish(db, SYNC_CHANNEL, sorted(recipe_ids))
+
+invalidation.subscribe(invalidation.RECIPES_CHANGED, _on_recipes_changed)
+cache_sync.subscribe(SYNC_CHANNEL, nutrition_matrix.invalidate, reset=nutrition_matrix.clear)
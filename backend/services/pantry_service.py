@@ -0,0 +1,193 @@
+import asyncio
+import datetime
+import logging
+import os
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+import models
+from services import invalidation, product_search, purchase_optimizer
+from services.cache_sync import cache_sync
+from services.shopping_list import join_products, planned_quantity
+
+logger = logging.getLogger(__name__)
+
+# Остаток меньше этого считаем нулем (погрешность float после списаний)
+_EPS = 1e-6
+# День, за который прошедшие блюда уже списаны в этом процессе
+_checked_on = None
+# Как часто фоновая задача проверяет прошедшие блюда, секунд (main.py)
+CONSUME_INTERVAL = float(os.getenv("PANTRY_CONSUME_INTERVAL", "300"))
+
+def _key(product):
+    return purchase_optimizer.substitute_key(product.name, product.unit, product_search.normalize)
+
+def _factor(unit):
+    return purchase_optimizer.unit_base(unit)[1]
+
+class PantryService:
+    @staticmethod
+    def get_pantry(db: Session):
+        return db.query(models.PantryItem).options(joinedload(models.PantryItem.product)) \
+            .join(models.Product, models.Product.id == models.PantryItem.product_id) \
+            .order_by(models.Product.name, models.Product.id).all()
+
+    @staticmethod
+    def set_quantity(db: Session, product_id: int, quantity: float):
+        product = db.query(models.Product).filter(models.Product.id == product_id).first()
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        item = db.query(models.PantryItem).filter(models.PantryItem.product_id == product_id).first()
+        if item is None:
+            item = models.PantryItem(product_id=product_id)
+            db.add(item)
+        item.quantity = quantity
+        db.flush()
+        invalidation.notify_pantry_changed(db, [product_id])
+        db.commit()
+        db.refresh(item)
+        return item
+
+    @staticmethod
+    def remove(db: Session, product_id: int):
+        deleted = db.query(models.PantryItem).filter(models.PantryItem.product_id == product_id) \
+            .delete(synchronize_session=False)
+        if not deleted:
+            raise HTTPException(status_code=404, detail="Pantry item not found")
+        invalidation.notify_pantry_changed(db, [product_id])
+        db.commit()
+        return {"ok": True}
+
+    @staticmethod
+    def add_stock(db: Session, quantities: dict):
+        """Adds {product_id: quantity in product units} to the pantry. Does not commit."""
+        quantities = {pid: qty for pid, qty in quantities.items() if qty > 0}
+        if not quantities:
+            return
+        existing = {item.product_id: item for item in db.query(models.PantryItem).filter(
+            models.PantryItem.product_id.in_(quantities)
+        )}
+        for product_id, qty in quantities.items():
+            item = existing.get(product_id)
+            if item is None:
+                db.add(models.PantryItem(product_id=product_id, quantity=qty))
+            else:
+                item.quantity = (item.quantity or 0) + qty
+        db.flush()
+        invalidation.notify_pantry_changed(db, quantities.keys())
+
+    @staticmethod
+    def add_purchases(db: Session, lines, line_ids=None):
+        """Puts the packs of shopping list lines (all or the given line ids) into the pantry."""
+        quantities = {}
+        for line in lines:
+            if line_ids is not None and line["id"] not in line_ids:
+                continue
+            for p in line["purchases"]:
+                quantities[p["product_id"]] = quantities.get(p["product_id"], 0.0) + p["packs"] * p["pack_amount"]
+        PantryService.add_stock(db, quantities)
+        db.commit()
+        return quantities
+
+    @staticmethod
+    def consume_past_meals(db: Session, today: datetime.date = None):
+        """
+        Takes ingredients of planned meals dated before today out of the pantry, once per meal.
+        Needs come from one grouped query; a product missing at home is taken from its
+        substitutes' stock (same name, compatible unit). Cheap no-op after the first call of
+        the day unless the plan changed in the past. Returns the number of meals taken.
+
+        Runs on startup, from consume_periodically() and POST /pantry/consume - never from
+        reads. Editing or deleting a meal that was already taken does not return its products
+        to the pantry: the stock is corrected with PUT /pantry/{product_id}.
+        """
+        global _checked_on
+        today = today or datetime.date.today()
+        if _checked_on == today:
+            return 0
+
+        Entry = models.WeeklyPlanEntry
+        pending = (Entry.date < today, Entry.pantry_consumed.isnot(True))
+        count = db.query(func.count(Entry.id)).filter(*pending).scalar()
+        if count:
+            needs = join_products(db.query(Entry).filter(*pending)).with_entities(
+                models.Product.id, models.Product.name, models.Product.unit,
+                func.sum(planned_quantity()).label("quantity")
+            ).group_by(models.Product.id).all()
+            # Метка - заявка на списание: параллельный процесс, успевший раньше, изменит число строк
+            claimed = db.query(Entry).filter(*pending).update(
+                {Entry.pantry_consumed: True}, synchronize_session=False
+            )
+            if claimed != count:
+                db.rollback()
+                logger.warning("План изменился во время списания запасов, повторим при следующей проверке")
+                return 0
+            PantryService._take(db, needs)
+            invalidation.notify_pantry_changed(db, {row.id for row in needs})
+            db.commit()
+            logger.info(f"Списаны продукты {count} прошедших блюд")
+        _checked_on = today
+        return count
+
+    @staticmethod
+    def _take(db: Session, needs):
+        stock = {}
+        items = db.query(models.PantryItem).options(joinedload(models.PantryItem.product)) \
+            .filter(models.PantryItem.quantity > 0).all()
+        for item in items:
+            if item.product:
+                stock.setdefault(_key(item.product), []).append(item)
+
+        for row in needs:
+            left = row.quantity * _factor(row.unit)
+            # Сначала сам продукт, затем его замены
+            for item in sorted(stock.get(_key(row), []), key=lambda i: i.product_id != row.id):
+                if left <= _EPS:
+                    break
+                factor = _factor(item.product.unit)
+                taken = min(item.quantity * factor, left)
+                left -= taken
+                item.quantity = item.quantity - taken / factor
+                if item.quantity < _EPS:
+                    item.quantity = 0.0
+        db.flush()
+
+# --- Фоновое списание ---
+
+def _consume(session_factory):
+    # Отметку могли сбросить изменения плана в других процессах
+    cache_sync.poll()
+    db = session_factory()
+    try:
+        PantryService.consume_past_meals(db)
+    finally:
+        db.close()
+
+async def consume_periodically(session_factory, interval: float = CONSUME_INTERVAL):
+    """Takes past meals out of the pantry every `interval` seconds (and after midnight); a lifespan task."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(_consume, session_factory)
+        except Exception:
+            logger.exception("Ошибка фонового списания прошедших блюд")
+
+# --- Сброс дневной отметки ---
+
+# Канал services/cache_sync.py - сброс отметки в других процессах сервера
+SYNC_CHANNEL = "pantry.consume_check"
+
+def _reset_check(payload=None):
+    global _checked_on
+    _checked_on = None
+
+def _on_plan_changed(db: Session, keys):
+    # Блюдо в прошлом добавлено или изменено - его нужно списать, не дожидаясь следующего дня
+    today = datetime.date.today()
+    if any(d is not None and d < today for d, _ in keys):
+        _reset_check()
+        cache_sync.publish(db, SYNC_CHANNEL)
+
+invalidation.subscribe(invalidation.PLAN_CHANGED, _on_plan_changed)
+cache_sync.subscribe(SYNC_CHANNEL, _reset_check, reset=_reset_check)
@@ -2,23 +2,65 @@ import datetime
 import random
 import os
 import json
-from sqlalchemy.orm import Session, joinedload
+import numpy as np
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session, selectinload
 from fastapi import HTTPException
 import models
 import schemas
+from services import invalidation, meal_distribution, meal_optimizer, nutrition_matrix
+from services.recipe_service import recipe_loader
 from utils.date_utils import get_date_for_day_of_week
+from utils.pagination import paginate
 
 EXPORT_PATH = "/app/data/plan.json"
 
+def plan_item_loaders():
+    """Loader options for PlanItemResponse: recipe (with ingredients/products) and family member."""
+    return (
+        recipe_loader(selectinload(models.WeeklyPlanEntry.recipe)),
+        selectinload(models.WeeklyPlanEntry.family_member),
+    )
+
 class PlanService:
+    @staticmethod
+    def get_plan_item(db: Session, item_id: int):
+        return db.query(models.WeeklyPlanEntry).options(*plan_item_loaders()).filter(
+            models.WeeklyPlanEntry.id == item_id
+        ).first()
+
     @staticmethod
     def get_plan(db: Session, start_date: datetime.date = None, end_date: datetime.date = None):
+        return PlanService.get_plan_page(db, start_date, end_date).items
+
+    @staticmethod
+    def get_plan_page(db: Session, start_date: datetime.date = None, end_date: datetime.date = None,
+                      limit: int = None, cursor: str = None):
+        q = db.query(models.WeeklyPlanEntry).options(*plan_item_loaders())
+        if start_date:
+            q = q.filter(models.WeeklyPlanEntry.date >= start_date)
+        if end_date:
+            q = q.filter(models.WeeklyPlanEntry.date <= end_date)
+        return paginate(q, [models.WeeklyPlanEntry.date, models.WeeklyPlanEntry.id], limit, cursor)
+
+    @staticmethod
+    def get_plan_compact(db: Session, start_date: datetime.date = None, end_date: datetime.date = None,
+                         limit: int = None, cursor: str = None):
+        """
+        Normalized plan: entries reference recipes by id, each recipe is sent once.
+        Recipe totals come from the cached columns, so ingredients are not loaded.
+        Returns the page and the PlanCompactResponse payload.
+        """
         q = db.query(models.WeeklyPlanEntry)
         if start_date:
             q = q.filter(models.WeeklyPlanEntry.date >= start_date)
         if end_date:
             q = q.filter(models.WeeklyPlanEntry.date <= end_date)
-        return q.order_by(models.WeeklyPlanEntry.date.asc(), models.WeeklyPlanEntry.id.asc()).all()
+        page = paginate(q, [models.WeeklyPlanEntry.date, models.WeeklyPlanEntry.id], limit, cursor)
+
+        recipe_ids = {e.recipe_id for e in page.items if e.recipe_id is not None}
+        recipes = db.query(models.Recipe).filter(models.Recipe.id.in_(recipe_ids)).all() if recipe_ids else []
+        return page, {"entries": page.items, "recipes": {r.id: r for r in recipes}}
 
     @staticmethod
     def add_to_plan(db: Session, item: schemas.PlanItemCreate):
@@ -35,15 +77,17 @@ class PlanService:
             date=calculated_date
         )
         db.add(db_item)
+        db.flush()
+        invalidation.notify_plan_changed(db, invalidation.plan_keys([db_item]))
         db.commit()
-        db.refresh(db_item)
-        return db_item
+        return PlanService.get_plan_item(db, db_item.id)
 
     @staticmethod
     def update_plan_item(db: Session, item_id: int, item_update: schemas.PlanItemUpdate):
         db_item = db.query(models.WeeklyPlanEntry).filter(models.WeeklyPlanEntry.id == item_id).first()
         if not db_item:
             raise HTTPException(status_code=404, detail="Item not found")
+        old_keys = invalidation.plan_keys([db_item])
         
         if item_update.portions is not None:
             db_item.portions = item_update.portions
@@ -56,9 +100,10 @@ class PlanService:
         if item_update.day_of_week is not None:
             db_item.day_of_week = item_update.day_of_week
             
+        db.flush()
+        invalidation.notify_plan_changed(db, old_keys | invalidation.plan_keys([db_item]))
         db.commit()
-        db.refresh(db_item)
-        return db_item
+        return PlanService.get_plan_item(db, db_item.id)
 
     @staticmethod
     def remove_from_plan(db: Session, item_id: int):
@@ -66,7 +111,10 @@ class PlanService:
         if not db_item:
             raise HTTPException(status_code=404, detail="Item not found")
         
+        keys = invalidation.plan_keys([db_item])
         db.delete(db_item)
+        db.flush()
+        invalidation.notify_plan_changed(db, keys)
         db.commit()
         return {"ok": True}
 
@@ -77,48 +125,42 @@ class PlanService:
             q = q.filter(models.WeeklyPlanEntry.date >= start_date)
         if end_date:
             q = q.filter(models.WeeklyPlanEntry.date <= end_date)
-            
+
+        keys = {(row.date, row.family_member_id) for row in q.with_entities(
+            models.WeeklyPlanEntry.date, models.WeeklyPlanEntry.family_member_id
+        ).distinct()}
         q.delete(synchronize_session=False)
+        invalidation.notify_plan_changed(db, keys)
         db.commit()
         return {"ok": True}
 
     @staticmethod
     def batch_update(db: Session, items: list[schemas.PlanItemCreate]):
+        """
+        Makes the plan between the first and the last date of the batch equal to the
+        items, touching only what differs. Returns a change summary (see _merge_range).
+        """
         if not items:
-            return []
+            return {"added": [], "updated": [], "removed": [], "unchanged": 0}
 
         dates = [item.date for item in items if item.date]
         if not dates:
              raise HTTPException(status_code=400, detail="Dates required for batch update")
 
-        min_date = min(dates)
-        max_date = max(dates)
-
-        # Clear range
-        PlanService.clear_plan(db, min_date, max_date)
-        
-        # Insert
-        new_items = []
-        for item in items:
-            db_item = models.WeeklyPlanEntry(
-                day_of_week=item.day_of_week,
-                meal_type=item.meal_type,
-                recipe_id=item.recipe_id,
-                portions=item.portions,
-                family_member_id=item.family_member_id,
-                date=item.date
-            )
-            db.add(db_item)
-            new_items.append(db_item)
-
+        diff = PlanService._merge_range(db, min(dates), max(dates), [item.model_dump() for item in items])
         db.commit()
-        for item in new_items: db.refresh(item)
-        return new_items
+        return diff
 
     @staticmethod
-    def autofill_week(db: Session):
+    def autofill_week(db: Session, seed: int = None, time_budget: float = meal_optimizer.DEFAULT_TIME_BUDGET):
+        """
+        Fills free lunch/dinner slots of next week for every family member with
+        services/meal_optimizer.py: pots of soup/main recipes chosen to keep members
+        close to their calorie/macro targets at low cost. The seed is returned so the
+        plan can be reproduced.
+        """
         # 0. Get users
-        family_members = db.query(models.FamilyMember).all()
+        family_members = db.query(models.FamilyMember).order_by(models.FamilyMember.id).all()
         if not family_members:
             family_members = [None]
 
@@ -131,101 +173,203 @@ class PlanService:
         days_map = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
         target_meals = ['lunch', 'dinner']
         
-        # 2. Fetch candidates (Main/Soup)
-        candidates = db.query(models.Recipe).options(
-            joinedload(models.Recipe.ingredients).joinedload(models.RecipeIngredient.product)
-        ).filter(
+        # 2. Fetch candidates (Main/Soup); КБЖУ и стоимость порций - из матрицы рецептов
+        candidates = [row.id for row in db.query(models.Recipe.id).filter(
             models.Recipe.category.in_(['soup', 'main'])
-        ).all()
+        ).order_by(models.Recipe.id)]
         
         if not candidates:
             raise HTTPException(status_code=400, detail="No recipes found (need soup or main)")
 
-        count = 0
-        current_recipe = None
-        portions_left = 0
-        last_recipe_id = None
+        # 3. Уже запланированное на неделю - одним запросом: занятые слоты и КБЖУ по дням
+        member_index = {(m.id if m else None): i for i, m in enumerate(family_members)}
+        Entry = models.WeeklyPlanEntry
+        week = db.query(
+            Entry.date, Entry.meal_type, Entry.family_member_id, Entry.portions, Entry.recipe_id
+        ).filter(
+            Entry.date >= next_monday,
+            Entry.date <= next_monday + datetime.timedelta(days=6)
+        ).all()
 
-        # Track daily calories: {(date_str, member_id): current_calories}
-        daily_calories = {}
-        
-        # Generate chronological slots
-        slots = []
-        for i in range(7):
-            target_date = next_monday + datetime.timedelta(days=i)
-            target_day_name = days_map[i]
-            for meal in target_meals:
-                slots.append({
-                    "date": target_date,
-                    "day": target_day_name,
-                    "meal": meal
-                })
-
-        # Iterate through slots
-        for slot in slots:
-            # 3. Pot Check
-            if portions_left <= 0:
-                # Filter repeats
-                valid_candidates = [r for r in candidates if r.id != last_recipe_id]
-                if not valid_candidates:
-                    valid_candidates = candidates
-                
-                current_recipe = random.choice(valid_candidates)
-                last_recipe_id = current_recipe.id
-                
-                portions_left = current_recipe.portions
-                if portions_left < 1: portions_left = 1
+        nutrients = [nutrition_matrix.COLUMNS.index(n) for n in meal_optimizer.NUTRIENTS]
+        values, portions = nutrition_matrix.nutrition_matrix.lookup(
+            db, candidates + [row.recipe_id for row in week]
+        )
+        planned = values[len(candidates):, nutrients] * np.array([row.portions or 0 for row in week])[:, None]
 
-            # For each member
-            for member in family_members:
-                member_id = member.id if member else None
-                
-                # Check occupancy
-                q = db.query(models.WeeklyPlanEntry).filter(
-                    models.WeeklyPlanEntry.date == slot["date"],
-                    models.WeeklyPlanEntry.meal_type == slot["meal"]
-                )
-                if member_id:
-                    q = q.filter(models.WeeklyPlanEntry.family_member_id == member_id)
-                else:
-                    q = q.filter(models.WeeklyPlanEntry.family_member_id == None)
-                    
-                exists = q.first()
-                if exists:
+        occupied = set()
+        planned_meals, planned_day = {}, {}
+        for row, added in zip(week, planned):
+            if row.meal_type in target_meals:
+                occupied.add((row.date, row.meal_type, row.family_member_id))
+            member = member_index.get(row.family_member_id)
+            if member is None:
+                continue
+            key = (member, (row.date - next_monday).days)
+            targets = [planned_day] + ([planned_meals] if row.meal_type in target_meals else [])
+            for totals in targets:
+                totals[key] = totals.get(key, 0.0) + added
+
+        # 4. Free places in chronological order
+        places = []
+        for day in range(7):
+            target_date = next_monday + datetime.timedelta(days=day)
+            for meal_index, meal in enumerate(target_meals):
+                for i, member in enumerate(family_members):
+                    if (target_date, meal, member.id if member else None) not in occupied:
+                        places.append(meal_optimizer.Place(day * len(target_meals) + meal_index, day, i))
+
+        limits = [{
+            "calories": member.max_calories if member else 2000,
+            "proteins": member.max_proteins if member else None,
+            "fats": member.max_fats if member else None,
+            "carbs": member.max_carbs if member else None,
+        } for member in family_members]
+        cost = nutrition_matrix.COLUMNS.index("cost")
+        dishes = [
+            meal_optimizer.Dish(recipe_id, int(portions[i]), *values[i, nutrients].tolist(), float(values[i, cost]))
+            for i, recipe_id in enumerate(candidates)
+        ]
+
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+        result = meal_optimizer.optimize(dishes, places, limits, planned_meals, planned_day, seed, time_budget)
+
+        # 5. Все новые записи - одним INSERT (executemany)
+        added = [{
+            "day_of_week": days_map[place.day],
+            "meal_type": target_meals[place.slot % len(target_meals)],
+            "recipe_id": dish.recipe_id,
+            "portions": 1,
+            "family_member_id": family_members[place.member].id if family_members[place.member] else None,
+            "date": next_monday + datetime.timedelta(days=place.day),
+        } for place, dish in zip(places, result.dishes)]
+        if added:
+            db.execute(insert(models.WeeklyPlanEntry), added)
+        invalidation.notify_plan_changed(db, {(row["date"], row["family_member_id"]) for row in added})
+        db.commit()
+        msg = f"Planned {len(added)} items for next week for {len(family_members)} people."
+        return {
+            "message": msg,
+            "seed": seed,
+            "score": round(result.score, 4),
+            "iterations": result.iterations,
+            "stopped_by": result.stopped_by,
+        }
+
+    @staticmethod
+    def distribute_week(db: Session, req: schemas.DistributeRequest):
+        """
+        Server-side "Распределить" of the planning page (services/meal_distribution.py):
+        replaces next week's plan with the distribution in one transaction and returns
+        only the difference to the previous plan.
+        """
+        today = datetime.date.today()
+        next_monday = today + datetime.timedelta(days=7 - today.weekday())
+        last_monday = next_monday - datetime.timedelta(days=14)
+        days_map = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+
+        member_ids = [row.id for row in db.query(models.FamilyMember.id).order_by(models.FamilyMember.id)]
+        # Без участников - безымянные едоки, как на странице планирования
+        eaters = member_ids or [None] * (req.eaters_count or 2)
+        hidden = set(req.hidden_recipe_ids)
+        recipes = [
+            meal_distribution.Recipe(row.id, row.category, row.portions)
+            for row in db.query(models.Recipe.id, models.Recipe.category, models.Recipe.portions)
+            .order_by(models.Recipe.id) if row.id not in hidden
+        ]
+
+        # История завтраков прошлой недели
+        Entry = models.WeeklyPlanEntry
+        eater_index = {member_id: i for i, member_id in enumerate(member_ids)}
+        history = {}
+        if member_ids:
+            for row in db.query(Entry.family_member_id, Entry.recipe_id).filter(
+                Entry.date >= last_monday,
+                Entry.date < last_monday + datetime.timedelta(days=7),
+                Entry.meal_type == meal_distribution.BREAKFAST,
+                Entry.family_member_id.in_(member_ids),
+                Entry.recipe_id.isnot(None),
+            ):
+                history.setdefault(eater_index[row.family_member_id], []).append(row.recipe_id)
+
+        seed = req.seed if req.seed is not None else random.randrange(2 ** 31)
+        meals = meal_distribution.distribute(
+            recipes, len(eaters), req.portions, history,
+            eaters_per_pot=req.eaters_count or len(eaters), rng=random.Random(seed)
+        )
+        if not meals:
+            raise HTTPException(status_code=400, detail="No recipes to distribute")
+
+        rows = [{
+            "day_of_week": days_map[meal.day],
+            "meal_type": meal.meal_type,
+            "recipe_id": meal.recipe_id,
+            # Каждому едоку - одна порция из котла
+            "portions": 1.0,
+            "family_member_id": eaters[meal.eater],
+            "date": next_monday + datetime.timedelta(days=meal.day),
+        } for meal in meals]
+        diff = PlanService._merge_range(db, next_monday, next_monday + datetime.timedelta(days=6), rows)
+        db.commit()
+        return {"seed": seed, **diff}
+
+    @staticmethod
+    def _merge_range(db: Session, start_date: datetime.date, end_date: datetime.date, rows):
+        """
+        Makes the plan between the dates equal to rows (dicts of WeeklyPlanEntry columns)
+        with bulk statements only for what differs. A row is matched to an existing entry
+        that is equal, else in the same slot (date, meal, member), else with the same
+        recipe and member (a moved meal); matched entries keep their ids. Does not commit.
+        Returns {"added", "updated": rows with ids, "removed": ids, "unchanged": count}.
+        """
+        Entry = models.WeeklyPlanEntry
+        columns = ("date", "meal_type", "family_member_id", "recipe_id", "portions", "day_of_week")
+        existing = db.query(Entry.id, *(getattr(Entry, c) for c in columns)).filter(
+            Entry.date >= start_date, Entry.date <= end_date
+        ).order_by(Entry.id).all()
+
+        unchanged, updated = 0, []
+        left = [dict(row) for row in rows]
+        matchers = [columns, ("date", "meal_type", "family_member_id"), ("recipe_id", "family_member_id")]
+        for number, key_columns in enumerate(matchers):
+            free = {}
+            for row in existing:
+                free.setdefault(tuple(getattr(row, c) for c in key_columns), []).append(row)
+            rest = []
+            for row in left:
+                matches = free.get(tuple(row[c] for c in key_columns))
+                if not matches:
+                    rest.append(row)
                     continue
-                
-                # 4. Fill Logic
-                if portions_left > 0:
-                    recipe_cals = current_recipe.calories_per_portion
-                    
-                    # Calorie Check
-                    limit = member.max_calories if member else 2000
-                    date_str = slot["date"].isoformat()
-                    current_daily_cals = daily_calories.get((date_str, member_id), 0)
-                    
-                    if current_daily_cals >= (limit - 200):
-                         continue
-
-                    new_item = models.WeeklyPlanEntry(
-                        day_of_week=slot["day"],
-                        meal_type=slot["meal"],
-                        recipe_id=current_recipe.id,
-                        portions=1,
-                        family_member_id=member_id,
-                        date=slot["date"]
-                    )
-                    db.add(new_item)
-                    count += 1
-                    
-                    # Update stats
-                    daily_calories[(date_str, member_id)] = current_daily_cals + recipe_cals
-                    portions_left -= 1
+                old = matches.pop(0)
+                if number == 0:
+                    unchanged += 1
                 else:
-                    pass
+                    updated.append((old, {**row, "id": old.id}))
+            left = rest
+            existing = [row for matches in free.values() for row in matches]
+        added, removed = left, existing
 
-        db.commit()
-        msg = f"Planned {count} items for next week for {len(family_members)} people."
-        return {"message": msg}
+        if removed:
+            db.query(Entry).filter(Entry.id.in_([row.id for row in removed])).delete(synchronize_session=False)
+        if updated:
+            db.execute(update(Entry), [{c: new[c] for c in ("id",) + columns} for _, new in updated])
+        if added:
+            ids = db.execute(insert(Entry).returning(Entry.id, sort_by_parameter_order=True), added).scalars().all()
+            for row, entry_id in zip(added, ids):
+                row["id"] = entry_id
+        invalidation.notify_plan_changed(
+            db,
+            {(row["date"], row["family_member_id"]) for row in added + [new for _, new in updated]} |
+            {(row.date, row.family_member_id) for row in removed + [old for old, _ in updated]}
+        )
+        return {
+            "added": added,
+            "updated": [new for _, new in updated],
+            "removed": sorted(row.id for row in removed),
+            "unchanged": unchanged,
+        }
 
     @staticmethod
     def autofill_one(db: Session, req: schemas.AutoFillRequest = None):
@@ -261,6 +405,8 @@ class PlanService:
             date=datetime.date.today()
         )
         db.add(new_item)
+        db.flush()
+        invalidation.notify_plan_changed(db, invalidation.plan_keys([new_item]))
         db.commit()
         db.refresh(new_item)
         
@@ -268,7 +414,7 @@ class PlanService:
         if req and req.family_member_id:
             member = db.query(models.FamilyMember).filter(models.FamilyMember.id == req.family_member_id).first()
             if member:
-                today_items = db.query(models.WeeklyPlanEntry).options(joinedload(models.WeeklyPlanEntry.recipe)).filter(
+                today_items = db.query(models.WeeklyPlanEntry).options(selectinload(models.WeeklyPlanEntry.recipe)).filter(
                     models.WeeklyPlanEntry.date == datetime.date.today(),
                     models.WeeklyPlanEntry.family_member_id == req.family_member_id
                 ).all()
@@ -330,6 +476,7 @@ class PlanService:
         PlanService.clear_plan(db, start_of_week, end_of_week)
         
         count = 0
+        added = []
         for item in data:
             day_name = item.get("day")
             target_date = get_date_for_day_of_week(day_name)
@@ -343,7 +490,10 @@ class PlanService:
                 date=target_date
             )
             db.add(new_entry)
+            added.append(new_entry)
             count += 1
         
+        db.flush()
+        invalidation.notify_plan_changed(db, invalidation.plan_keys(added))
         db.commit()
         return {"message": f"Imported {count} items into current week"}
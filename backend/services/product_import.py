@@ -0,0 +1,129 @@
+import datetime
+import logging
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+import models
+from services import invalidation
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки для executemany INSERT/UPDATE
+IMPORT_CHUNK_SIZE = 500
+
+def parse_import_item(item: dict):
+    """Converts a feed item into (name, params). Raises KeyError/ValueError/TypeError for bad items."""
+    params = {
+        "price": float(item.get("price", 0)),
+        "amount": float(item.get("amount", 1.0)),
+        "unit": item.get("unit", "шт"),
+        "calories": float(item.get("calories", 0)),
+        "proteins": item.get("proteins"),
+        "fats": item.get("fats"),
+        "carbs": item.get("carbs"),
+        "weight_per_piece": item.get("weight_per_piece")
+    }
+    return item["name"], params
+
+def _is_changed(current: dict, params: dict):
+    # Как и раньше, обновляем только при изменении цены, упаковки или калорий
+    return (current["price"] != params["price"] or
+            current["amount"] != params["amount"] or
+            current["unit"] != params["unit"] or
+            current["calories"] != params["calories"])
+
+class ProductImporter:
+    """
+    Set-based product upsert keyed by name.
+
+    All existing names are loaded with one query; feed items are diffed in memory
+    and written with chunked executemany INSERT/UPDATE. Product.name is not unique,
+    so INSERT ... ON CONFLICT is not applicable - like the old per-row lookup,
+    an item updates the first (lowest id) product with that name.
+    """
+
+    def __init__(self, db: Session, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.changed_ids = set()
+        self._existing = {}
+        rows = db.query(
+            models.Product.id, models.Product.name, models.Product.price,
+            models.Product.amount, models.Product.unit, models.Product.calories
+        ).order_by(models.Product.id.asc()).all()
+        for row in rows:
+            if row.name not in self._existing:
+                self._existing[row.name] = {
+                    "id": row.id, "price": row.price, "amount": row.amount,
+                    "unit": row.unit, "calories": row.calories
+                }
+
+    def process(self, items):
+        """Diffs a batch of feed items against the DB state and writes the changes. Does not commit."""
+        inserts = {}
+        updates = {}
+        now = datetime.datetime.utcnow()
+        for item in items:
+            try:
+                name, params = parse_import_item(item)
+            except KeyError as e:
+                logger.warning(f"Пропущен продукт из-за отсутствия поля {e}: {item}")
+                self.skipped += 1
+                continue
+            except Exception as e:
+                logger.error(f"Ошибка при обработке продукта {item.get('name', 'unknown')}: {str(e)}")
+                self.skipped += 1
+                continue
+
+            current = self._existing.get(name)
+            if current is None:
+                pending = inserts.get(name)
+                if pending is None:
+                    inserts[name] = {"name": name, **params, "updated_at": now}
+                    self.created += 1
+                    logger.debug(f"Создан новый продукт: {name}")
+                elif _is_changed(pending, params):
+                    # Повтор имени в фиде - берем последнюю версию
+                    pending.update(params)
+                    self.updated += 1
+                else:
+                    self.skipped += 1
+            elif _is_changed(current, params):
+                current.update({k: params[k] for k in ("price", "amount", "unit", "calories")})
+                updates[current["id"]] = {"id": current["id"], **params, "updated_at": now}
+                self.updated += 1
+                logger.debug(f"Обновлен продукт: {name}")
+            else:
+                self.skipped += 1
+
+        insert_rows = list(inserts.values())
+        for start in range(0, len(insert_rows), self.chunk_size):
+            chunk = insert_rows[start:start + self.chunk_size]
+            created = self.db.execute(
+                insert(models.Product).returning(models.Product.id, models.Product.name), chunk
+            ).all()
+            # Новые имена нужны в карте, чтобы повторы в следующих пачках обновляли, а не дублировали
+            for row in created:
+                data = inserts[row.name]
+                self._existing[row.name] = {
+                    "id": row.id, "price": data["price"], "amount": data["amount"],
+                    "unit": data["unit"], "calories": data["calories"]
+                }
+            # Новые продукты тоже изменения: они могут заменить уже нужные в списке покупок
+            self.changed_ids.update(row.id for row in created)
+
+        update_rows = list(updates.values())
+        for start in range(0, len(update_rows), self.chunk_size):
+            chunk = update_rows[start:start + self.chunk_size]
+            self.db.execute(update(models.Product), chunk)
+        self.changed_ids.update(updates.keys())
+
+    def finish(self):
+        """
+        Publishes products changed since the previous call to dependents.
+        Returns affected recipe ids. Does not commit.
+        """
+        changed, self.changed_ids = self.changed_ids, set()
+        return invalidation.notify_products_changed(self.db, changed)
@@ -0,0 +1,246 @@
+import difflib
+import logging
+import re
+from sqlalchemy import column, or_, text
+from sqlalchemy.orm import Session
+import models
+
+logger = logging.getLogger(__name__)
+
+# Индексы поиска - отдельные FTS5-таблицы, синхронизируются триггерами на products,
+# поэтому их видят все пути записи (CRUD, массовый импорт, админка).
+WORD_INDEX = "products_fts"
+TRIGRAM_INDEX = "products_trigram"
+# Таблицы (включая служебные FTS5 *_data, *_idx ...), которые не описаны в models.py
+SEARCH_TABLE_PREFIXES = (WORD_INDEX, TRIGRAM_INDEX)
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# Сколько совпадений индекса ранжировать на один запрос
+CANDIDATE_WINDOW = 500
+FUZZY_MIN_RATIO = 0.7
+
+# Нормализация одинакова в индексе и в запросе: регистр FTS5 сворачивает сам, а "ё" - нет
+_NORMALIZE_SQL = "replace(replace({col}, 'ё', 'е'), 'Ё', 'Е')"
+_WORD_RE = re.compile(r"\w+")
+
+_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {WORD_INDEX}
+        USING fts5(name, tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TRIGRAM_INDEX}
+        USING fts5(name, tokenize='trigram')""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_search_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {WORD_INDEX}(rowid, name) VALUES (new.id, {_NORMALIZE_SQL.format(col='new.name')});
+        INSERT INTO {TRIGRAM_INDEX}(rowid, name) VALUES (new.id, {_NORMALIZE_SQL.format(col='new.name')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_search_ad AFTER DELETE ON products BEGIN
+        DELETE FROM {WORD_INDEX} WHERE rowid = old.id;
+        DELETE FROM {TRIGRAM_INDEX} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_search_au AFTER UPDATE OF name ON products BEGIN
+        DELETE FROM {WORD_INDEX} WHERE rowid = old.id;
+        DELETE FROM {TRIGRAM_INDEX} WHERE rowid = old.id;
+        INSERT INTO {WORD_INDEX}(rowid, name) VALUES (new.id, {_NORMALIZE_SQL.format(col='new.name')});
+        INSERT INTO {TRIGRAM_INDEX}(rowid, name) VALUES (new.id, {_NORMALIZE_SQL.format(col='new.name')});
+    END""",
+]
+
+_available = False
+
+def is_search_table(name: str) -> bool:
+    return name.startswith(SEARCH_TABLE_PREFIXES)
+
+def normalize(value: str) -> str:
+    return value.casefold().replace("ё", "е")
+
+def ensure_search_index(engine):
+    """
+    Creates the FTS5 indexes and sync triggers if missing and rebuilds the
+    indexes when they are out of step with the products table.
+    Without FTS5 support search falls back to a full scan.
+    """
+    global _available
+    try:
+        with engine.begin() as conn:
+            for ddl in _DDL:
+                conn.execute(text(ddl))
+            products = conn.execute(text("SELECT count(*) FROM products")).scalar()
+            indexed = conn.execute(text(f"SELECT count(*) FROM {WORD_INDEX}")).scalar()
+            if products != indexed:
+                logger.info(f"Перестраиваем поисковый индекс продуктов ({indexed} -> {products})")
+                for table in (WORD_INDEX, TRIGRAM_INDEX):
+                    conn.execute(text(f"DELETE FROM {table}"))
+                    conn.execute(text(
+                        f"INSERT INTO {table}(rowid, name) "
+                        f"SELECT id, {_NORMALIZE_SQL.format(col='name')} FROM products"
+                    ))
+        _available = True
+    except Exception as e:
+        _available = False
+        logger.error(f"FTS5 недоступен, поиск продуктов работает без индекса: {str(e)}")
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+def _fuzzy_match(words):
+    """
+    Trigram MATCH expression that keeps names where every word may contain one typo.
+    A single typo cannot break both halves of a word, so long words match by either
+    half; shorter ones by any of their trigrams. Words under 3 chars are not indexed.
+    """
+    groups = []
+    for word in words:
+        if len(word) >= 6:
+            pieces = [word[:len(word) // 2], word[len(word) // 2:]]
+        elif len(word) >= 3:
+            pieces = sorted({word[i:i + 3] for i in range(len(word) - 2)})
+        else:
+            continue
+        groups.append("(" + " OR ".join(_quote(p) for p in pieces) + ")")
+    return " AND ".join(groups)
+
+def _load(db: Session, ids):
+    if not ids:
+        return []
+    by_id = {p.id: p for p in db.query(models.Product).filter(models.Product.id.in_(ids))}
+    return [by_id[i] for i in ids if i in by_id]
+
+def _word_ratio(term: str, word: str) -> float:
+    if word.startswith(term):
+        return 1.0
+    if len(term) < 3:
+        return 0.0
+    # Сравниваем и со словом целиком, и с его началом (ввод еще не закончен).
+    # real_quick_ratio/quick_ratio - дешевые верхние оценки, отсекают явно непохожие слова.
+    best = 0.0
+    matcher = difflib.SequenceMatcher(None, b=term)
+    for candidate in {word, word[:len(term)]}:
+        matcher.set_seq1(candidate)
+        if matcher.real_quick_ratio() >= FUZZY_MIN_RATIO and matcher.quick_ratio() >= FUZZY_MIN_RATIO:
+            best = max(best, matcher.ratio())
+    return best
+
+def _fuzzy_ratio(terms, name: str, cache: dict) -> float:
+    # Каждое слово запроса должно похоже совпасть с каким-то словом названия.
+    # Слова в названиях повторяются, поэтому оценки кэшируются на время запроса.
+    words = _WORD_RE.findall(normalize(name))
+    result = 1.0
+    for term in terms:
+        best = 0.0
+        for word in words:
+            key = (term, word)
+            ratio = cache.get(key)
+            if ratio is None:
+                ratio = cache[key] = _word_ratio(term, word)
+            best = max(best, ratio)
+        result = min(result, best)
+    return result
+
+def search_products(db: Session, q: str, limit: int = DEFAULT_LIMIT):
+    """
+    Ranked product search for typeahead: word prefixes first (bm25), then
+    typo-tolerant matches found via the trigram index.
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    query = normalize(q.strip())
+    words = _WORD_RE.findall(query)
+    if not words:
+        return []
+    if not _available:
+        return _scan(db, query, words, limit)
+
+    # Ранжируем ограниченное окно совпадений: bm25 по всем десяткам тысяч
+    # совпадений короткого префикса ("м") не укладывается в бюджет автодополнения
+    match = " AND ".join(_quote(w) + "*" for w in words)
+    ids = [row[0] for row in db.execute(
+        text(f"SELECT rowid FROM (SELECT rowid, rank, name FROM {WORD_INDEX} "
+             f"WHERE {WORD_INDEX} MATCH :match LIMIT :window) "
+             f"ORDER BY rank, length(name) LIMIT :limit"),
+        {"match": match, "window": CANDIDATE_WINDOW, "limit": limit}
+    )]
+
+    # Опечатки: кандидаты из триграммного индекса, точный порядок - по похожести
+    fuzzy_match = _fuzzy_match(words)
+    if len(ids) < limit and fuzzy_match:
+        candidates = db.execute(
+            text(f"SELECT rowid, name FROM {TRIGRAM_INDEX} WHERE {TRIGRAM_INDEX} MATCH :match LIMIT :window"),
+            {"match": fuzzy_match, "window": CANDIDATE_WINDOW}
+        ).all()
+        seen = set(ids)
+        cache = {}
+        scored = []
+        for row in candidates:
+            if row.rowid in seen:
+                continue
+            ratio = _fuzzy_ratio(words, row.name, cache)
+            if ratio >= FUZZY_MIN_RATIO:
+                scored.append((-ratio, len(row.name), row.rowid))
+        ids.extend(rowid for _, _, rowid in sorted(scored)[:limit - len(ids)])
+
+    return _load(db, ids)
+
+def filter_by_name(db: Session, query, name: str):
+    """
+    Case-insensitive name filter (including Cyrillic) for the product listing: a substring
+    from 3 characters, shorter terms match word starts (the word index keeps 1-3 char prefixes).
+    """
+    term = normalize(name)
+    if not _available:
+        ids = [p.id for p in db.query(models.Product.id, models.Product.name) if p.name and term in normalize(p.name)]
+        return query.filter(models.Product.id.in_(ids))
+    if len(term) >= 3:
+        return query.filter(models.Product.id.in_(
+            text(f"SELECT rowid FROM {TRIGRAM_INDEX} WHERE {TRIGRAM_INDEX} MATCH :term")
+            .bindparams(term=_quote(term))
+            .columns(column("rowid"))
+        ))
+    # Короче триграммы: префиксный индекс слов, а не перебор названий в Python
+    words = _WORD_RE.findall(term)
+    if words:
+        return query.filter(models.Product.id.in_(
+            text(f"SELECT rowid FROM {WORD_INDEX} WHERE {WORD_INDEX} MATCH :match")
+            .bindparams(match=" AND ".join(_quote(w) + "*" for w in words))
+            .columns(column("rowid"))
+        ))
+    # Только знаки препинания - регистр не важен
+    return query.filter(models.Product.name.contains(name, autoescape=True))
+
+def name_key(name: str) -> str:
+    """Name compared ignoring case, "ё" and extra spaces."""
+    return " ".join(normalize(name or "").split())
+
+def same_name_filter(names):
+    """
+    Criterion narrowing products to those that may have the same name_key() as one
+    of `names` - a superset, compare name_key() on the loaded rows.
+    """
+    names = {n for n in names if n}
+    long_keys = {name_key(n) for n in names} - {""}
+    long_keys = {k for k in long_keys if len(k) >= 3}
+    if not _available:
+        return models.Product.name.in_(names)
+    # Одно обращение к триграммному индексу на все имена; короткие имена не индексируются
+    criteria = [models.Product.name.in_([n for n in names if len(name_key(n)) < 3])]
+    if long_keys:
+        criteria.append(models.Product.id.in_(
+            text(f"SELECT rowid FROM {TRIGRAM_INDEX} WHERE {TRIGRAM_INDEX} MATCH :match")
+            .bindparams(match=" OR ".join(_quote(k) for k in sorted(long_keys)))
+            .columns(column("rowid"))
+        ))
+    return or_(*criteria)
+
+def _scan(db: Session, query: str, words, limit: int):
+    # Запасной вариант без FTS5: полный перебор с той же логикой ранжирования
+    scored = []
+    cache = {}
+    for p in db.query(models.Product.id, models.Product.name):
+        if not p.name:
+            continue
+        name = normalize(p.name)
+        if query in name:
+            scored.append((0 if name.startswith(query) else 1, 0.0, len(name), p.id))
+        else:
+            ratio = _fuzzy_ratio(words, p.name, cache)
+            if ratio >= FUZZY_MIN_RATIO:
+                scored.append((2, -ratio, len(name), p.id))
+    return _load(db, [row[-1] for row in sorted(scored)[:limit]])
@@ -1,26 +1,64 @@
-import requests
+import httpx
 import os
 import json
 import logging
+import time
+import datetime
+import hashlib
+import tempfile
+import email.utils
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 import models
 import schemas
+from services import invalidation, product_search
+from services.product_import import ProductImporter
+from utils.http_client import outbound_http
+from utils.json_stream import iter_json_items
+from utils.pagination import paginate
 
 logger = logging.getLogger(__name__)
 
 EXPORT_PATH = "/app/data/products.json"
 # Порт 8000 - Backend API (FastAPI), порт 8010 - Frontend
-EXTERNAL_API_URL = "http://192.168.10.222:8000/products/"
+# Адрес фида - только из окружения развертывания: импорт ходит лишь по нему
+EXTERNAL_API_URL = os.getenv("PRODUCT_FEED_URL", "http://192.168.10.222:8000/products/")
+# Строк фида на одну транзакцию (и шаг контрольной точки)
+IMPORT_BATCH_SIZE = 5000
+STREAM_CHUNK_SIZE = 64 * 1024
+# Сколько фида держать в памяти при скачивании, остальное - во временном файле
+FEED_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+# Таймаут ответа источника (соединение - по умолчанию utils/http_client.py)
+FEED_TIMEOUT = httpx.Timeout(10.0, connect=3.05)
 
 class ProductService:
     @staticmethod
-    def get_products(db: Session, name: str = None):
+    def get_products(db: Session, name: str = None, since: datetime.datetime = None):
+        return ProductService._products_query(db, name, since).all()
+
+    @staticmethod
+    def get_products_page(db: Session, name: str = None, since: datetime.datetime = None,
+                          limit: int = None, cursor: str = None):
+        query = ProductService._products_query(db, name, since)
+        return paginate(query, [models.Product.id], limit, cursor)
+
+    @staticmethod
+    def _products_query(db: Session, name: str = None, since: datetime.datetime = None):
         query = db.query(models.Product)
         if name:
-            # Case-insensitive partial match
-            query = query.filter(models.Product.name.ilike(f"%{name}%"))
-        return query.all()
+            # Case-insensitive partial match (ilike в SQLite не сворачивает регистр кириллицы)
+            query = product_search.filter_by_name(db, query, name)
+        if since:
+            # Инкрементальная выгрузка для импорта на других инстансах
+            if since.tzinfo is not None:
+                since = since.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            query = query.filter(models.Product.updated_at >= since)
+        return query
+
+    @staticmethod
+    def search_products(db: Session, q: str, limit: int = product_search.DEFAULT_LIMIT):
+        return product_search.search_products(db, q, limit)
 
     @staticmethod
     def get_product_by_id(db: Session, product_id: int):
@@ -29,10 +67,17 @@ class ProductService:
             raise HTTPException(status_code=404, detail="Product not found")
         return product
 
+    @staticmethod
+    def get_product_recipe_ids(db: Session, product_id: int):
+        ProductService.get_product_by_id(db, product_id)
+        return sorted(invalidation.recipes_using_products(db, [product_id]))
+
     @staticmethod
     def create_product(db: Session, product: schemas.ProductCreate):
         db_product = models.Product(**product.dict())
         db.add(db_product)
+        db.flush()
+        invalidation.notify_products_changed(db, [db_product.id])
         db.commit()
         db.refresh(db_product)
         return db_product
@@ -53,6 +98,8 @@ class ProductService:
         db_product.carbs = product.carbs
         db_product.weight_per_piece = product.weight_per_piece
         
+        db.flush()
+        invalidation.notify_products_changed(db, [product_id])
         db.commit()
         db.refresh(db_product)
         return db_product
@@ -62,7 +109,10 @@ class ProductService:
         item = db.query(models.Product).filter(models.Product.id == product_id).first()
         if not item:
             raise HTTPException(status_code=404, detail="Product not found")
+        db.query(models.PantryItem).filter(models.PantryItem.product_id == product_id).delete(synchronize_session=False)
         db.delete(item)
+        db.flush()
+        invalidation.notify_products_changed(db, [product_id])
         db.commit()
         return {"ok": True}
 
@@ -94,78 +144,183 @@ class ProductService:
             raise HTTPException(status_code=500, detail=f"Ошибка записи: {str(e)}")
 
     @staticmethod
-    def import_products(db: Session):
-        logger.info(f"Начало импорта продуктов из {EXTERNAL_API_URL}")
+    def _commit_import_batch(db: Session, importer: ProductImporter, source: models.ImportSource,
+                             batch, rows_done: int, validator: str):
+        """Writes a batch and moves the source checkpoint in the same transaction."""
+        importer.process(batch)
+        affected_recipes = importer.finish()
+        source.checkpoint_row = rows_done
+        source.checkpoint_validator = validator
+        source.updated_at = datetime.datetime.utcnow()
+        db.commit()
+        return affected_recipes
+
+    @staticmethod
+    def _download_feed(response):
+        """
+        Copies the response body into a spooled temp file (RAM up to FEED_SPOOL_MAX_MEMORY,
+        then disk) and returns (file, sha256 hex). Memory use does not depend on feed size.
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=FEED_SPOOL_MAX_MEMORY)
+        digest = hashlib.sha256()
+        for chunk in response.iter_bytes(chunk_size=STREAM_CHUNK_SIZE):
+            digest.update(chunk)
+            spool.write(chunk)
+        spool.seek(0)
+        return spool, digest.hexdigest()
+
+    @staticmethod
+    def _sync_time(response):
+        # Время синхронизации по часам источника (заголовок Date), иначе по нашим
+        date_header = response.headers.get("Date")
+        if date_header:
+            try:
+                parsed = email.utils.parsedate_to_datetime(date_header)
+                return parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            except (TypeError, ValueError):
+                pass
+        return datetime.datetime.utcnow()
+
+    @staticmethod
+    def _not_modified_result():
+        return {
+            "message": "Без изменений",
+            "created": 0,
+            "updated": 0,
+            "skipped": 0,
+            "rows": 0,
+            "resumed_from": 0,
+            "not_modified": True,
+            "delta": False
+        }
+
+    @staticmethod
+    def import_products(db: Session, batch_size: int = None):
+        """
+        Imports the product feed (JSON array or NDJSON) in batches.
+
+        - Conditional GET with the ETag/Last-Modified of the last complete import;
+          304 or an unchanged content hash is a no-op.
+        - If the source advertises X-Supports-Since, only changes since the last sync are requested.
+        - Each batch is committed together with a checkpoint, so after a failure the next run
+          for the same feed version skips the rows that are already imported.
+        """
+        url = EXTERNAL_API_URL
+        batch_size = batch_size if batch_size and batch_size > 0 else IMPORT_BATCH_SIZE
+        logger.info(f"Начало импорта продуктов из {url}")
+
+        source = db.query(models.ImportSource).filter(models.ImportSource.url == url).first()
+        if not source:
+            source = models.ImportSource(url=url, checkpoint_row=0)
+            db.add(source)
+
+        headers, params = {}, {}
+        # Незавершенный импорт докачиваем полностью, без условных запросов
+        if not source.checkpoint_row:
+            if source.etag:
+                headers["If-None-Match"] = source.etag
+            if source.last_modified:
+                headers["If-Modified-Since"] = source.last_modified
+        delta = bool(source.supports_since and source.last_synced_at and not source.checkpoint_row)
+        if delta:
+            params["since"] = source.last_synced_at.isoformat()
+
         try:
-            response = requests.get(EXTERNAL_API_URL, timeout=10)
-            logger.info(f"Получен ответ с кодом {response.status_code}")
-            
-            if response.status_code != 200:
-                logger.error(f"Ошибка API: код {response.status_code}, ответ: {response.text}")
-                raise HTTPException(status_code=response.status_code, detail=f"Ошибка внешнего API: {response.text}")
-            
-            data = response.json()
-            logger.info(f"Получено {len(data)} продуктов из внешнего API")
-            
-        except requests.RequestException as e:
-            logger.error(f"Ошибка соединения с {EXTERNAL_API_URL}: {str(e)}")
+            # Общий пул: keep-alive соединения к источнику переиспользуются между импортами
+            with outbound_http.client.stream("GET", url, params=params, headers=headers,
+                                             timeout=FEED_TIMEOUT) as response:
+                logger.info(f"Получен ответ с кодом {response.status_code}")
+
+                if response.status_code == 304:
+                    logger.info("Источник не изменился (304)")
+                    return ProductService._not_modified_result()
+
+                if response.status_code != 200:
+                    response.read()
+                    logger.error(f"Ошибка API: код {response.status_code}, ответ: {response.text}")
+                    raise HTTPException(status_code=response.status_code, detail=f"Ошибка внешнего API: {response.text}")
+
+                spool, content_hash = ProductService._download_feed(response)
+        except httpx.HTTPError as e:
+            logger.error(f"Ошибка соединения с {url}: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Ошибка соединения с внешним API: {str(e)}")
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        validator = etag or last_modified or content_hash
+        sync_time = ProductService._sync_time(response)
+
+        def remember_version():
+            source.etag = etag
+            source.last_modified = last_modified
+            if not delta:
+                source.content_hash = content_hash
+            source.supports_since = response.headers.get("X-Supports-Since", "").lower() == "true"
+            source.last_synced_at = sync_time
+            source.checkpoint_row = 0
+            source.checkpoint_validator = None
+            source.updated_at = datetime.datetime.utcnow()
+
+        if not delta and not source.checkpoint_row and source.content_hash == content_hash:
+            spool.close()
+            remember_version()
+            db.commit()
+            logger.info("Содержимое источника не изменилось (тот же хэш)")
+            return ProductService._not_modified_result()
+
+        resume_from = 0
+        if source.checkpoint_row and source.checkpoint_validator == validator:
+            resume_from = source.checkpoint_row
+            logger.info(f"Продолжение импорта с контрольной точки: строка {resume_from}")
+
+        started = time.perf_counter()
+        importer = ProductImporter(db)
+        affected_recipes = set()
+        rows = 0
+        committed_rows = resume_from
+        batch = []
+        try:
+            with spool:
+                for item in iter_json_items(iter(lambda: spool.read(STREAM_CHUNK_SIZE), b"")):
+                    rows += 1
+                    if rows <= resume_from:
+                        continue
+                    batch.append(item)
+                    if len(batch) >= batch_size:
+                        affected_recipes |= ProductService._commit_import_batch(
+                            db, importer, source, batch, rows, validator)
+                        committed_rows = rows
+                        batch = []
+
+            importer.process(batch)
+            affected_recipes |= importer.finish()
+            remember_version()
+            db.commit()
         except Exception as e:
-            logger.error(f"Ошибка обработки данных: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Ошибка обработки данных: {str(e)}")
+            db.rollback()
+            logger.error(f"Ошибка обработки данных (закоммичено строк: {committed_rows}): {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Ошибка обработки данных: {str(e)}. Импортировано строк: {committed_rows}, "
+                       f"повторный запуск продолжит с этого места"
+            )
 
-        created_count, updated_count, skipped_count = 0, 0, 0
-        
-        for item in data:
-            try:
-                db_product = db.query(models.Product).filter(models.Product.name == item["name"]).first()
-                params = {
-                    "price": float(item.get("price", 0)),
-                    "amount": float(item.get("amount", 1.0)),
-                    "unit": item.get("unit", "шт"),
-                    "calories": float(item.get("calories", 0)),
-                    "proteins": item.get("proteins"),
-                    "fats": item.get("fats"),
-                    "carbs": item.get("carbs"),
-                    "weight_per_piece": item.get("weight_per_piece")
-                }
-
-                if not db_product:
-                    new_product = models.Product(name=item["name"], **params)
-                    db.add(new_product)
-                    created_count += 1
-                    logger.debug(f"Создан новый продукт: {item['name']}")
-                else:
-                    if (db_product.price != params["price"] or 
-                        db_product.amount != params["amount"] or
-                        db_product.unit != params["unit"] or
-                        db_product.calories != params["calories"]):
-                        
-                        db_product.price = params["price"]
-                        db_product.amount = params["amount"]
-                        db_product.unit = params["unit"]
-                        db_product.calories = params["calories"]
-                        db_product.proteins = params["proteins"]
-                        db_product.fats = params["fats"]
-                        db_product.carbs = params["carbs"]
-                        db_product.weight_per_piece = params["weight_per_piece"]
-                        updated_count += 1
-                        logger.debug(f"Обновлен продукт: {item['name']}")
-                    else:
-                        skipped_count += 1
-            
-            except KeyError as e:
-                logger.warning(f"Пропущен продукт из-за отсутствия поля {e}: {item}")
-                skipped_count += 1
-            except Exception as e:
-                logger.error(f"Ошибка при обработке продукта {item.get('name', 'unknown')}: {str(e)}")
-                skipped_count += 1
-    
-        db.commit()
-        logger.info(f"Импорт завершен: создано={created_count}, обновлено={updated_count}, пропущено={skipped_count}")
+        elapsed = time.perf_counter() - started
+        processed = rows - resume_from
+        rows_per_second = round(processed / elapsed) if elapsed > 0 else processed
+
+        created_count, updated_count, skipped_count = importer.created, importer.updated, importer.skipped
+        logger.info(f"Импорт завершен: создано={created_count}, обновлено={updated_count}, пропущено={skipped_count}, "
+                    f"пересчитано рецептов={len(affected_recipes)}, {rows_per_second} строк/с")
         return {
             "message": f"Создано: {created_count}, Обновлено: {updated_count}, Пропущено: {skipped_count}",
             "created": created_count,
             "updated": updated_count,
-            "skipped": skipped_count
+            "skipped": skipped_count,
+            "rows": rows,
+            "resumed_from": resume_from,
+            "not_modified": False,
+            "delta": delta,
+            "elapsed_sec": round(elapsed, 3),
+            "rows_per_second": rows_per_second
         }
@@ -0,0 +1,124 @@
+"""
+Whole-pack purchase planning for the shopping list.
+
+Needs are grouped by interchangeable products (same normalized name and a
+compatible unit); for every group the cheapest combination of whole packs
+covering the need is chosen. Pure functions - no DB access.
+"""
+import math
+from typing import Dict, List, NamedTuple
+
+# Единицы, приводимые к базовой (граммы, миллилитры, штуки)
+_UNITS = {
+    "g": ("mass", 1.0), "г": ("mass", 1.0), "kg": ("mass", 1000.0), "кг": ("mass", 1000.0),
+    "ml": ("volume", 1.0), "мл": ("volume", 1.0), "l": ("volume", 1000.0), "л": ("volume", 1000.0),
+    "шт": ("pieces", 1.0), "шт.": ("pieces", 1.0), "pcs": ("pieces", 1.0), "piece": ("pieces", 1.0),
+    "stk": ("pieces", 1.0),
+}
+# Предел размера таблицы DP на одну группу: выше - потребность считается шагами крупнее
+MAX_DP_STATES = 2000
+_EPS = 1e-9
+
+class PackOption(NamedTuple):
+    product_id: int
+    name: str
+    unit: str
+    pack_amount: float  # в единицах продукта
+    pack_base: float    # в базовых единицах группы
+    price: float
+
+def unit_base(unit: str):
+    """(unit family, factor to the family's base unit); unknown units form their own family."""
+    unit_lower = (unit or "").strip().lower()
+    return _UNITS.get(unit_lower, (unit_lower, 1.0))
+
+def substitute_key(name: str, unit: str, normalize):
+    """Products with equal keys can replace each other in the shopping list."""
+    return " ".join(normalize(name or "").split()), unit_base(unit)[0]
+
+def pack_option(product_id, name, unit, amount, price) -> PackOption:
+    # Как и раньше: упаковка <= 0 считается за 1 единицу
+    pack_amount = amount if amount and amount > 0 else 1.0
+    return PackOption(product_id, name, unit, pack_amount, pack_amount * unit_base(unit)[1], price or 0.0)
+
+def _undominated(options: List[PackOption]):
+    # Упаковка не нужна, если есть не меньшая и не дороже
+    kept = []
+    for i, o in enumerate(options):
+        if not any(
+            (p.pack_base >= o.pack_base and p.price <= o.price) and
+            (p.pack_base > o.pack_base or p.price < o.price or j < i)
+            for j, p in enumerate(options) if j != i
+        ):
+            kept.append(i)
+    return kept
+
+def optimize_packs(need: float, options: List[PackOption]) -> Dict[int, int]:
+    """
+    Cheapest whole-pack combination whose total size covers `need` (base units).
+    Returns {option index: packs}. Unbounded covering knapsack solved by DP over
+    the quantity; pack sizes are rounded down to the DP step, so the result
+    always covers the need.
+    """
+    if need <= _EPS or not options:
+        return {}
+    candidates = _undominated(options)
+    best = min(candidates, key=lambda i: (options[i].price / options[i].pack_base, i))
+    if len(candidates) == 1:
+        return {best: math.ceil(need / options[best].pack_base - _EPS)}
+
+    step = 0
+    for i in candidates:
+        step = math.gcd(step, max(1, int(round(options[i].pack_base))))
+    step = max(step, math.ceil(need / MAX_DP_STATES))
+    units = {i: int(options[i].pack_base // step) for i in candidates}
+    units = {i: u for i, u in units.items() if u > 0}
+    if best not in units:
+        return {best: math.ceil(need / options[best].pack_base - _EPS)}
+    target = math.ceil(need / step - _EPS)
+
+    # Есть оптимум, где прочих упаковок меньше units[best] (иначе их подмножество
+    # кратно units[best] и заменяется лучшими по цене за единицу). Поэтому сверх
+    # этой границы потребность закрывается лучшими упаковками, а DP решает остаток.
+    packs = {}
+    bound = units[best] * (max(units.values()) + 1)
+    if target > bound:
+        packs[best] = math.ceil((target - bound) / units[best])
+        target -= packs[best] * units[best]
+
+    # cost[q] - минимальная стоимость, покрывающая не меньше q шагов
+    cost = [0.0] + [math.inf] * target
+    choice = [-1] * (target + 1)
+    items = [(i, u, options[i].price) for i, u in units.items()]
+    for q in range(1, target + 1):
+        best_cost, best_i = math.inf, -1
+        for i, u, price in items:
+            c = cost[q - u if q > u else 0] + price
+            if c < best_cost:
+                best_cost, best_i = c, i
+        cost[q], choice[q] = best_cost, best_i
+
+    q = target
+    while q > 0:
+        i = choice[q]
+        packs[i] = packs.get(i, 0) + 1
+        q -= units[i]
+    return packs
+
+def purchase(need: float, options: List[PackOption]):
+    """Runs the optimizer and returns (purchases, covered base quantity)."""
+    packs = optimize_packs(need, options)
+    purchases = []
+    covered = 0.0
+    for i, count in sorted(packs.items(), key=lambda kv: options[kv[0]].product_id):
+        option = options[i]
+        covered += count * option.pack_base
+        purchases.append({
+            "product_id": option.product_id,
+            "name": option.name,
+            "pack_amount": option.pack_amount,
+            "unit": option.unit,
+            "packs": count,
+            "cost": round(count * option.price, 2),
+        })
+    return purchases, covered
@@ -1,17 +1,58 @@
 import json
 import os
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, selectinload
 from fastapi import HTTPException
 import models
 import schemas
+from services import invalidation
 from services.telegram import send_telegram_message
+from utils.pagination import paginate
 
 EXPORT_PATH = "/app/data/recipes.json"
 
+def recipe_loader(path=None):
+    """
+    Loader option for recipes with ingredients and their products.
+    Fetches each level with one batched SELECT ... IN instead of lazy loads per row.
+    `path` - relationship loader leading to Recipe (e.g. selectinload(WeeklyPlanEntry.recipe)).
+    """
+    if path is None:
+        ingredients = selectinload(models.Recipe.ingredients)
+    else:
+        ingredients = path.selectinload(models.Recipe.ingredients)
+    return ingredients.selectinload(models.RecipeIngredient.product)
+
 class RecipeService:
     @staticmethod
     def get_recipes(db: Session):
-        return db.query(models.Recipe).all()
+        return db.query(models.Recipe).options(recipe_loader()).all()
+
+    @staticmethod
+    def get_recipes_page(db: Session, limit: int = None, cursor: str = None):
+        query = db.query(models.Recipe).options(recipe_loader())
+        return paginate(query, [models.Recipe.id], limit, cursor)
+
+    @staticmethod
+    def get_recipe(db: Session, recipe_id: int):
+        return db.query(models.Recipe).options(recipe_loader()).filter(models.Recipe.id == recipe_id).first()
+
+    @staticmethod
+    def _build_ingredients(db: Session, items: list[schemas.IngredientCreate]):
+        """Creates RecipeIngredient objects with products attached (one SELECT for all products)."""
+        product_ids = {item.product_id for item in items}
+        products = {}
+        if product_ids:
+            products = {
+                p.id: p for p in db.query(models.Product).filter(models.Product.id.in_(product_ids)).all()
+            }
+
+        ingredients = []
+        for item in items:
+            db_ingredient = models.RecipeIngredient(product_id=item.product_id, quantity=item.quantity)
+            if item.product_id in products:
+                db_ingredient.product = products[item.product_id]
+            ingredients.append(db_ingredient)
+        return ingredients
 
     @staticmethod
     def create_recipe(db: Session, recipe: schemas.RecipeCreate):
@@ -22,22 +63,15 @@ class RecipeService:
             category=recipe.category,
             rating=recipe.rating
         )
+        db_recipe.ingredients = RecipeService._build_ingredients(db, recipe.ingredients)
+        db_recipe.recalculate_totals()
         db.add(db_recipe)
         db.commit()
-        db.refresh(db_recipe)
-        
-        for item in recipe.ingredients:
-            db_ingredient = models.RecipeIngredient(
-                recipe_id=db_recipe.id, product_id=item.product_id, quantity=item.quantity
-            )
-            db.add(db_ingredient)
-        db.commit()
-        db.refresh(db_recipe)
-        return db_recipe
+        return RecipeService.get_recipe(db, db_recipe.id)
 
     @staticmethod
     def update_recipe(db: Session, recipe_id: int, recipe: schemas.RecipeCreate):
-        db_recipe = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
+        db_recipe = RecipeService.get_recipe(db, recipe_id)
         if not db_recipe:
             raise HTTPException(status_code=404, detail="Recipe not found")
 
@@ -47,16 +81,40 @@ class RecipeService:
         db_recipe.category = recipe.category
         db_recipe.rating = recipe.rating
         
-        db.query(models.RecipeIngredient).filter(models.RecipeIngredient.recipe_id == recipe_id).delete()
-        for item in recipe.ingredients:
-            db_ingredient = models.RecipeIngredient(
-                recipe_id=db_recipe.id, product_id=item.product_id, quantity=item.quantity
-            )
-            db.add(db_ingredient)
+        # Старые ингредиенты удаляются каскадом (delete-orphan)
+        db_recipe.ingredients = RecipeService._build_ingredients(db, recipe.ingredients)
+        db_recipe.recalculate_totals()
         
+        db.flush()
+        invalidation.notify_recipes_changed(db, [db_recipe.id])
         db.commit()
-        db.refresh(db_recipe)
-        return db_recipe
+        return RecipeService.get_recipe(db, db_recipe.id)
+
+    @staticmethod
+    def recalculate_totals(db: Session, recipe_ids):
+        """
+        Refreshes cached totals of the given recipes.
+        Does not commit - the caller commits together with the change that caused it.
+        """
+        if not recipe_ids:
+            return 0
+        recipes = db.query(models.Recipe).options(recipe_loader()).filter(
+            models.Recipe.id.in_(list(recipe_ids))
+        ).all()
+        for db_recipe in recipes:
+            db_recipe.recalculate_totals()
+        return len(recipes)
+
+    @staticmethod
+    def backfill_totals(db: Session):
+        """Fills cached totals for recipes that were never calculated (rows from older versions)."""
+        recipes = db.query(models.Recipe).options(recipe_loader()).filter(
+            models.Recipe.cached_calories.is_(None)
+        ).all()
+        for db_recipe in recipes:
+            db_recipe.recalculate_totals()
+        db.commit()
+        return len(recipes)
 
     @staticmethod
     def delete_recipe(db: Session, recipe_id: int):
@@ -64,6 +122,8 @@ class RecipeService:
         if not db_recipe:
             raise HTTPException(status_code=404, detail="Recipe not found")
         db.delete(db_recipe)
+        db.flush()
+        invalidation.notify_recipes_changed(db, [recipe_id])
         db.commit()
         return {"ok": True}
 
@@ -95,6 +155,7 @@ class RecipeService:
             raise HTTPException(status_code=500, detail=str(e))
 
         created, updated = 0, 0
+        changed_ids = set()
         for item in data:
             title = item.get("title")
             description = item.get("description", "")
@@ -112,6 +173,7 @@ class RecipeService:
                     category=category,
                     rating=item.get("rating", 0)
                 )
+                new_recipe.recalculate_totals()
                 db.add(new_recipe)
                 created += 1
             else:
@@ -133,13 +195,17 @@ class RecipeService:
                 
                 if updated_flag:
                     updated += 1
+                    changed_ids.add(db_recipe.id)
 
+        db.flush()
+        # Порции делят КБЖУ и стоимость в кэшах (матрица, статистика, список покупок)
+        invalidation.notify_recipes_changed(db, changed_ids)
         db.commit()
         return {"message": "Импорт завершен", "created": created, "updated": updated}
 
     @staticmethod
     def send_telegram(db: Session, recipe_id: int, chat_id: str):
-        db_recipe = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
+        db_recipe = RecipeService.get_recipe(db, recipe_id)
         if not db_recipe:
             raise HTTPException(status_code=404, detail="Рецепт не найден")
 
@@ -159,6 +225,11 @@ class RecipeService:
                 
         message_text = "\\n".join(lines)
         
-        send_telegram_message(db, chat_id, message_text)
+        outbox_id = send_telegram_message(db, chat_id, message_text)
+
+        return {"status": "queued", "message": "Рецепт поставлен в очередь отправки", "outbox_id": outbox_id}
+
+def _on_products_changed(db: Session, product_ids, recipe_ids):
+    RecipeService.recalculate_totals(db, recipe_ids)
 
-        return {"status": "ok", "message": "Рецепт отправлен"}
+invalidation.subscribe(invalidation.PRODUCTS_CHANGED, _on_products_changed)
@@ -0,0 +1,147 @@
+"""
+In-process cache of static configuration: the app_settings table (bot token,
+Bot API address) and /app/data/config.json (admin password).
+
+app_settings is read with one query on first use and kept until a change is
+published (SETTINGS_CHANGED: token and Bot API address endpoints, settings
+import). config.json is parsed again only when its mtime or size changes; the
+file is stat'ed at most once per CONFIG_CHECK_INTERVAL.
+"""
+import json
+import os
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import models
+from services import invalidation
+from services.cache_sync import cache_sync
+
+CONFIG_PATH = "/app/data/config.json"
+DEFAULT_CONFIG = {"admin_password": "123", "app_name": "FoodPlanner"}
+# Как часто проверять, не изменился ли config.json, секунд
+CONFIG_CHECK_INTERVAL = 1.0
+
+class AppSettingsCache:
+    """
+    Thread-safe. A generation counter keeps a request that read the table
+    concurrently with a change from storing values that are already stale.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = None
+        self._generation = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    def get(self, db: Session, key: str, default: str = "") -> str:
+        """Setting value; `default` for missing and empty settings."""
+        values = self._values
+        if values is None:
+            values = self._load(db)
+        return values.get(key) or default
+
+    def _load(self, db: Session):
+        with self._lock:
+            generation = self._generation
+        values = dict(db.query(models.AppSetting.key, models.AppSetting.value).all())
+        with self._lock:
+            if generation == self._generation:
+                self._values = values
+                self.loads += 1
+        return values
+
+    def invalidate(self):
+        with self._lock:
+            self._values = None
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {"cached": self._values is not None, "loads": self.loads, "invalidations": self.invalidations}
+
+class ConfigFile:
+    """JSON config file, parsed again only after it changes on disk."""
+
+    def __init__(self, path: str, default: dict):
+        self.path = path
+        self.default = default
+        self._lock = threading.Lock()
+        self._data = None
+        self._signature = None
+        self._checked_at = 0.0
+        self.loads = 0
+
+    def get(self) -> dict:
+        """The parsed config (shared - do not modify)."""
+        if self._data is not None and time.monotonic() - self._checked_at < CONFIG_CHECK_INTERVAL:
+            return self._data
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self._data, self._signature = self._create_default(), None
+            else:
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if signature != self._signature:
+                    self._data, self._signature = self._read(), signature
+            self._checked_at = time.monotonic()
+            return self._data
+
+    def _create_default(self):
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.default, f, indent=2)
+        except Exception: pass
+        return self.default
+
+    def _read(self):
+        self.loads += 1
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception: return self.default
+
+    def stats(self):
+        return {"path": self.path, "loads": self.loads}
+
+app_settings = AppSettingsCache()
+config_file = ConfigFile(CONFIG_PATH, DEFAULT_CONFIG)
+
+def load_config() -> dict:
+    return config_file.get()
+
+def set_app_setting(db: Session, key: str, value: str):
+    """Creates or updates a setting and publishes the change (the caller commits)."""
+    setting = db.query(models.AppSetting).filter(models.AppSetting.key == key).first()
+    if not setting:
+        db.add(models.AppSetting(key=key, value=value))
+    else: setting.value = value
+    invalidation.notify_settings_changed(db, {key})
+
+# --- Инвалидация ---
+# Кэш сбрасывается сразу и еще раз после COMMIT: значения, прочитанные
+# параллельно до фиксации изменений, не переживут ее.
+
+_PENDING_KEY = "app_settings_dirty"
+# Канал services/cache_sync.py - сброс в других процессах сервера
+SYNC_CHANNEL = "app_settings"
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop(_PENDING_KEY, None):
+        app_settings.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+def _on_settings_changed(db: Session, keys):
+    app_settings.invalidate()
+    db.info[_PENDING_KEY] = True
+    cache_sync.publish(db, SYNC_CHANNEL, sorted(keys))
+
+invalidation.subscribe(invalidation.SETTINGS_CHANGED, _on_settings_changed)
+cache_sync.subscribe(SYNC_CHANNEL, lambda keys: app_settings.invalidate(), reset=app_settings.invalidate)
@@ -1,62 +1,339 @@
+import threading
+from collections import OrderedDict
+from sqlalchemy import and_, case, event, func, literal, or_
 from sqlalchemy.orm import Session
 import models
+from services import invalidation, product_search, purchase_optimizer
+from services.cache_sync import cache_sync
 
-from datetime import datetime
+from datetime import date, datetime, timedelta
+
+# Сколько диапазонов (start_date, end_date) держать в кэше
+CACHE_MAX_SIZE = 64
+# Излишки купленных упаковок за столько дней до начала диапазона переходят в него
+CARRY_OVER_DAYS = 7
+
+def _parse_range(start_date: str = None, end_date: str = None):
+    """(start, end) dates of the requested range; (None, None) means the whole plan."""
+    if start_date and end_date:
+        try:
+            return (datetime.strptime(start_date, "%Y-%m-%d").date(),
+                    datetime.strptime(end_date, "%Y-%m-%d").date())
+        except ValueError:
+            pass # Ignore invalid dates or handle error
+    return None, None
+
+def planned_quantity():
+    """Ingredient quantity scaled to the plan entry; as before, portions <= 0 count as 1."""
+    Entry, Recipe = models.WeeklyPlanEntry, models.Recipe
+    ratio = (
+        case((Entry.portions > 0, Entry.portions), else_=1.0) /
+        case((Recipe.portions > 0, Recipe.portions), else_=1)
+    )
+    return func.coalesce(models.RecipeIngredient.quantity, 0) * ratio
+
+def join_products(query):
+    """Joins a WeeklyPlanEntry query down to the products of the planned recipes."""
+    Entry, Recipe = models.WeeklyPlanEntry, models.Recipe
+    Ingredient, Product = models.RecipeIngredient, models.Product
+    return query.join(Recipe, Recipe.id == Entry.recipe_id) \
+        .join(Ingredient, Ingredient.recipe_id == Recipe.id) \
+        .join(Product, Product.id == Ingredient.product_id)
+
+def _aggregate_needs(db: Session, start_dt, end_dt):
+    """
+    Per-product needs in one grouped query over plan ⋈ recipes ⋈ recipe_ingredients ⋈ products:
+    total_quantity - the range; consumed_quantity - its part already taken from the pantry;
+    previous_quantity - CARRY_OVER_DAYS before the range; pending_quantity - meals before
+    the range that will still be taken from the pantry.
+    """
+    Entry, Product = models.WeeklyPlanEntry, models.Product
+    qty = planned_quantity()
+    consumed = Entry.pantry_consumed.is_(True)
+    query = db.query(Entry)
+
+    if start_dt is not None:
+        in_range = Entry.date >= start_dt
+        query = query.filter(
+            Entry.date <= end_dt,
+            or_(Entry.date >= start_dt - timedelta(days=CARRY_OVER_DAYS), ~consumed)
+        )
+        previous_qty = func.sum(case(
+            (and_(Entry.date < start_dt, Entry.date >= start_dt - timedelta(days=CARRY_OVER_DAYS)), qty),
+            else_=0))
+        pending_qty = func.sum(case((and_(Entry.date < start_dt, ~consumed), qty), else_=0))
+    else:
+        in_range = literal(True)
+        previous_qty = pending_qty = literal(0.0)
+
+    return join_products(query).with_entities(
+            Product.id,
+            Product.name,
+            Product.unit,
+            Product.amount,
+            Product.price,
+            func.sum(case((in_range, qty), else_=0)).label("total_quantity"),
+            func.sum(case((and_(in_range, consumed), qty), else_=0)).label("consumed_quantity"),
+            previous_qty.label("previous_quantity"),
+            pending_qty.label("pending_quantity"),
+        ) \
+        .group_by(Product.id) \
+        .order_by(Product.name, Product.id) \
+        .all()
 
 def calculate_shopping_list(db: Session, start_date: str = None, end_date: str = None):
     """
     Business logic for aggregating the shopping list from the weekly plan.
+
+    Needs of interchangeable products (same name, compatible unit) are merged
+    into one line and turned into whole-pack purchases of minimal cost. Lines
+    with pantry records are netted against the stock left by the range start;
+    otherwise the surplus of last week's packs is subtracted first.
     """
-    query = db.query(models.WeeklyPlanEntry)
+    start_dt, end_dt = _parse_range(start_date, end_date)
+    rows = _aggregate_needs(db, start_dt, end_dt)
 
-    if start_date and end_date:
-        try:
-            start_dt = datetime.strptime(start_date, "%Y-%m-%d").date()
-            end_dt = datetime.strptime(end_date, "%Y-%m-%d").date()
-            query = query.filter(models.WeeklyPlanEntry.date >= start_dt, models.WeeklyPlanEntry.date <= end_dt)
-        except ValueError:
-             pass # Ignore invalid dates or handle error
-
-    plan_items = query.all()
-    shopping_dict = {}
-
-    for plan_item in plan_items:
-        if not plan_item.recipe: continue
-        
-        # --- SCALING ---
-        base_portions = plan_item.recipe.portions if plan_item.recipe.portions > 0 else 1
-        target_portions = plan_item.portions if plan_item.portions > 0 else 1
-        
-        # Scaling Ratio
-        ratio = target_portions / base_portions
-
-        for ingredient in plan_item.recipe.ingredients:
-            if not ingredient.product: continue
-            
-            p_id = ingredient.product_id
-            if p_id not in shopping_dict:
-                shopping_dict[p_id] = {"product": ingredient.product, "quantity": 0.0}
-            
-            # Multiply by ratio
-            shopping_dict[p_id]["quantity"] += (ingredient.quantity * ratio)
+    groups = {}
+    for row in rows:
+        key = purchase_optimizer.substitute_key(row.name, row.unit, product_search.normalize)
+        groups.setdefault(key, []).append(row)
+
+    # Варианты покупки и запасы по ним - одним запросом (products ⟕ pantry_items)
+    options, stock = {}, {}
+    names = {row.name for row in rows if row.total_quantity > 0}
+    if names:
+        candidates = db.query(models.Product, models.PantryItem.quantity.label("stock")) \
+            .outerjoin(models.PantryItem, models.PantryItem.product_id == models.Product.id) \
+            .filter(product_search.same_name_filter(names))
+        for p, in_stock in candidates:
+            key = purchase_optimizer.substitute_key(p.name, p.unit, product_search.normalize)
+            if key not in groups:
+                continue
+            options.setdefault(key, []).append(
+                purchase_optimizer.pack_option(p.id, p.name, p.unit, p.amount, p.price))
+            if in_stock is not None:
+                stock[key] = stock.get(key, 0.0) + in_stock * purchase_optimizer.unit_base(p.unit)[1]
 
     result = []
-    for p_id, data in shopping_dict.items():
-        product = data["product"]
-        total_qty = data["quantity"]
-        
-        pack_amount = product.amount if product.amount > 0 else 1.0
-        price_per_unit = product.price / pack_amount
-        estimated_cost = total_qty * price_per_unit
+    for key, group_rows in groups.items():
+        current = [row for row in group_rows if row.total_quantity > 0]
+        if not current:
+            continue # Нужно было только на прошлой неделе
+        main = current[0]
+        factor = purchase_optimizer.unit_base(main.unit)[1]
+        group_options = sorted(options.get(key) or [], key=lambda o: o.product_id) or [
+            purchase_optimizer.pack_option(row.id, row.name, row.unit, row.amount, row.price) for row in current
+        ]
+
+        def need_of(attr):
+            return sum(getattr(row, attr) * purchase_optimizer.unit_base(row.unit)[1] for row in group_rows)
 
+        need = to_cover = need_of("total_quantity")
+        if key in stock:
+            # Уже съеденное списано из запасов; до начала диапазона запасы еще потратятся
+            to_cover -= need_of("consumed_quantity")
+            available = max(stock[key] - need_of("pending_quantity"), 0.0)
+        else:
+            # Остаток прошлой недели: купленные тогда целые упаковки минус потраченное
+            previous = need_of("previous_quantity")
+            _, previous_covered = purchase_optimizer.purchase(previous, group_options)
+            available = previous_covered - previous
+        used = min(available, to_cover)
+        purchases, covered = purchase_optimizer.purchase(to_cover - used, group_options)
+        in_pantry, carried = (used, 0.0) if key in stock else (0.0, used)
+
+        estimated_cost = sum(
+            row.total_quantity * (row.price or 0) / (row.amount if row.amount and row.amount > 0 else 1.0)
+            for row in current
+        )
+        main_pack = main.amount if main.amount and main.amount > 0 else 1.0
         result.append({
-            "id": product.id,
-            "name": product.name,
-            "total_quantity": round(total_qty, 3),
-            "unit": product.unit,
+            "id": main.id,
+            "name": main.name,
+            "total_quantity": round(need / factor, 3),
+            "unit": main.unit,
             "estimated_cost": round(estimated_cost, 2),
-            "packs_needed": round(total_qty / pack_amount, 1)
+            "packs_needed": round(need / factor / main_pack, 1),
+            "product_ids": [row.id for row in current],
+            "in_pantry": round(in_pantry / factor, 3),
+            "carried_over": round(carried / factor, 3),
+            "purchases": purchases,
+            "packs_to_buy": sum(p["packs"] for p in purchases),
+            "purchase_cost": round(sum(p["cost"] for p in purchases), 2),
+            "leftover": round(max(available + covered - to_cover, 0.0) / factor, 3),
         })
-    
-    result.sort(key=lambda x: x["name"])
     return result
+
+class ShoppingListCache:
+    """
+    LRU cache of computed shopping lists keyed by (start, end) date range.
+
+    Entries are dropped when a plan entry dated inside their range or the
+    carry-over days before it changes (directly or through its recipe/products),
+    when a not yet eaten meal before the range changes (it draws on the pantry),
+    or when a product that can be bought for one of their lines or its stock changes.
+    A generation counter keeps a
+    request that computed the list concurrently with a change from storing
+    a result that is already stale.
+    """
+
+    def __init__(self, max_size: int = CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, compute):
+        """Returns (items, hit)."""
+        with self._lock:
+            items = self._items.get(key)
+            if items is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return items, True
+            self.misses += 1
+            generation = self._generation
+
+        items = compute()
+        with self._lock:
+            if generation == self._generation:
+                self._items[key] = items
+                self._items.move_to_end(key)
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last=False)
+                    self.evictions += 1
+        return items, False
+
+    def invalidate_dates(self, dates):
+        """Drops ranges that depend on any of the dates; None (undated entries) hits whole-plan lists only."""
+        dates = set(dates)
+        if not dates:
+            return
+        today = date.today()
+        with self._lock:
+            self._generation += 1
+            for key in list(self._items):
+                start, end = key
+                if start is None or any(
+                    d is not None and d <= end and (d >= start - timedelta(days=CARRY_OVER_DAYS) or d >= today)
+                    for d in dates
+                ):
+                    del self._items[key]
+                    self.invalidations += 1
+
+    def invalidate_products(self, product_ids, keys):
+        """Drops lists that buy one of the products or have a line it can substitute (by substitute_key)."""
+        product_ids, keys = set(product_ids), set(keys)
+        if not product_ids and not keys:
+            return
+        with self._lock:
+            self._generation += 1
+            for key, items in list(self._items.items()):
+                if any(_line_key(item) in keys or any(p["product_id"] in product_ids for p in item["purchases"])
+                       for item in items):
+                    del self._items[key]
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._items)
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+shopping_list_cache = ShoppingListCache()
+
+def get_shopping_list(db: Session, start_date: str = None, end_date: str = None):
+    """Cached calculate_shopping_list. Returns (items, cache_hit)."""
+    key = _parse_range(start_date, end_date)
+    items, hit = shopping_list_cache.get(key, lambda: calculate_shopping_list(db, start_date, end_date))
+    # Копии строк: вызывающий код не должен портить закэшированный список
+    return [{**item, "purchases": [dict(p) for p in item["purchases"]]} for item in items], hit
+
+def _line_key(item):
+    return purchase_optimizer.substitute_key(item["name"], item["unit"], product_search.normalize)
+
+# --- Инвалидация ---
+# Даты сбрасываются сразу и еще раз после COMMIT изменяющей транзакции: список,
+# посчитанный параллельно по еще старым данным, не переживет фиксацию изменений.
+
+_PENDING_KEY = "shopping_list_dirty_dates"
+_PENDING_PRODUCTS_KEY = "shopping_list_dirty_products"
+# Каналы services/cache_sync.py - те же сбросы в других процессах сервера
+SYNC_DATES = "shopping_list.dates"
+SYNC_PRODUCTS = "shopping_list.products"
+
+def _invalidate(db: Session, dates):
+    dates = set(dates)
+    if not dates:
+        return
+    shopping_list_cache.invalidate_dates(dates)
+    db.info.setdefault(_PENDING_KEY, set()).update(dates)
+    cache_sync.publish(db, SYNC_DATES, [d.isoformat() if d else None for d in dates])
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    dates = session.info.pop(_PENDING_KEY, None)
+    if dates:
+        shopping_list_cache.invalidate_dates(dates)
+    products = session.info.pop(_PENDING_PRODUCTS_KEY, None)
+    if products:
+        shopping_list_cache.invalidate_products(*products)
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_PENDING_PRODUCTS_KEY, None)
+
+def _on_plan_changed(db: Session, keys):
+    _invalidate(db, {d for d, _ in keys})
+
+def _on_recipes_changed(db: Session, recipe_ids):
+    # Изменения продуктов приходят сюда же - через рецепты, в которых они используются
+    rows = db.query(models.WeeklyPlanEntry.date).filter(
+        models.WeeklyPlanEntry.recipe_id.in_(recipe_ids)
+    ).distinct().all()
+    _invalidate(db, {row.date for row in rows})
+
+def _on_products_changed(db: Session, product_ids, recipe_ids):
+    # Продукт может быть заменой в строке, где сам не используется ни одним рецептом
+    rows = db.query(models.Product.name, models.Product.unit).filter(models.Product.id.in_(product_ids)).all()
+    keys = {purchase_optimizer.substitute_key(row.name, row.unit, product_search.normalize) for row in rows}
+    shopping_list_cache.invalidate_products(product_ids, keys)
+    pending_ids, pending_keys = db.info.setdefault(_PENDING_PRODUCTS_KEY, (set(), set()))
+    pending_ids.update(product_ids)
+    pending_keys.update(keys)
+    cache_sync.publish(db, SYNC_PRODUCTS, {"product_ids": sorted(product_ids), "keys": [list(key) for key in keys]})
+
+def _on_pantry_changed(db: Session, product_ids):
+    _on_products_changed(db, product_ids, set())
+
+invalidation.subscribe(invalidation.PRODUCTS_CHANGED, _on_products_changed)
+invalidation.subscribe(invalidation.PANTRY_CHANGED, _on_pantry_changed)
+invalidation.subscribe(invalidation.PLAN_CHANGED, _on_plan_changed)
+invalidation.subscribe(invalidation.RECIPES_CHANGED, _on_recipes_changed)
+
+def _apply_synced_dates(dates):
+    shopping_list_cache.invalidate_dates({date.fromisoformat(d) if d else None for d in dates})
+
+def _apply_synced_products(payload):
+    shopping_list_cache.invalidate_products(payload["product_ids"], {tuple(key) for key in payload["keys"]})
+
+cache_sync.subscribe(SYNC_DATES, _apply_synced_dates, reset=shopping_list_cache.clear)
+cache_sync.subscribe(SYNC_PRODUCTS, _apply_synced_products, reset=shopping_list_cache.clear)
@@ -0,0 +1,158 @@
+import datetime
+import logging
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+import models
+from services import invalidation
+
+logger = logging.getLogger(__name__)
+
+DAYS = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+# Самый длинный диапазон одного запроса (дней)
+MAX_RANGE_DAYS = 366
+NUTRIENTS = ("calories", "proteins", "fats", "carbs", "cost")
+# member_id в свертке для записей без участника
+UNASSIGNED = 0
+
+def _member_key(family_member_id):
+    return family_member_id if family_member_id is not None else UNASSIGNED
+
+def _empty_totals():
+    return {**{k: 0.0 for k in NUTRIENTS}, "items_count": 0}
+
+def _add(target: dict, source):
+    for k in NUTRIENTS:
+        target[k] += getattr(source, k) or 0
+    target["items_count"] += source.items_count or 0
+
+def _rounded(totals: dict):
+    # Как на фронтенде: КБЖУ - целые, стоимость - до центов
+    result = {k: round(totals[k]) for k in NUTRIENTS if k != "cost"}
+    result["cost"] = round(totals["cost"], 2)
+    result["items_count"] = totals["items_count"]
+    return result
+
+class StatsService:
+    @staticmethod
+    def refresh(db: Session, keys=None):
+        """
+        Recomputes rollup rows for the given (date, family_member_id) keys from the plan
+        with one grouped query; keys=None rebuilds everything. Does not commit.
+        Item contribution matches the frontend: recipe totals * portions / recipe portions.
+        """
+        db.flush()
+        Entry = models.WeeklyPlanEntry
+        member = func.coalesce(Entry.family_member_id, UNASSIGNED)
+
+        delete_q = db.query(models.PlanDailyStats)
+        source_q = db.query(Entry).filter(Entry.date.isnot(None))
+        if keys is not None:
+            keys = {(d, _member_key(m)) for d, m in keys if d is not None}
+            if not keys:
+                return
+            # Пересчитываем все сочетания затронутых дней и участников: лишние ячейки
+            # просто пересчитаются заново, зато фильтр - два IN вместо длинного OR
+            dates = {d for d, _ in keys}
+            member_ids = {m for _, m in keys}
+            delete_q = delete_q.filter(models.PlanDailyStats.date.in_(dates),
+                                       models.PlanDailyStats.member_id.in_(member_ids))
+            source_q = source_q.filter(Entry.date.in_(dates), member.in_(member_ids))
+        delete_q.delete(synchronize_session=False)
+
+        ratio = Entry.portions / func.max(func.coalesce(models.Recipe.portions, 1), 1)
+        rows = source_q.join(models.Recipe, models.Recipe.id == Entry.recipe_id).with_entities(
+            Entry.date.label("date"),
+            member.label("member_id"),
+            func.sum(ratio * func.coalesce(models.Recipe.cached_calories, 0)).label("calories"),
+            func.sum(ratio * func.coalesce(models.Recipe.cached_proteins, 0)).label("proteins"),
+            func.sum(ratio * func.coalesce(models.Recipe.cached_fats, 0)).label("fats"),
+            func.sum(ratio * func.coalesce(models.Recipe.cached_carbs, 0)).label("carbs"),
+            func.sum(ratio * func.coalesce(models.Recipe.cached_cost, 0)).label("cost"),
+            func.count(Entry.id).label("items_count"),
+        ).group_by(Entry.date, member).all()
+
+        if rows:
+            db.execute(insert(models.PlanDailyStats), [row._asdict() for row in rows])
+
+    @staticmethod
+    def backfill(db: Session):
+        """Builds the rollup for plan history that predates it."""
+        if db.query(models.PlanDailyStats).first() is not None:
+            return
+        if db.query(models.WeeklyPlanEntry.id).filter(models.WeeklyPlanEntry.date.isnot(None)).first() is None:
+            return
+        logger.info("Строим свертку статистики по всей истории плана")
+        StatsService.refresh(db)
+        db.commit()
+
+    @staticmethod
+    def get_stats(db: Session, start_date: datetime.date = None, end_date: datetime.date = None):
+        """Per-day and per-week totals for the whole family and each member, from the rollup only."""
+        if start_date is None:
+            today = datetime.date.today()
+            start_date = today - datetime.timedelta(days=today.weekday())
+        if end_date is None:
+            end_date = start_date + datetime.timedelta(days=6)
+        if end_date < start_date or (end_date - start_date).days >= MAX_RANGE_DAYS:
+            raise HTTPException(status_code=400, detail=f"Invalid date range (max {MAX_RANGE_DAYS} days)")
+
+        rows = db.query(models.PlanDailyStats).filter(
+            models.PlanDailyStats.date >= start_date,
+            models.PlanDailyStats.date <= end_date
+        ).all()
+        members = db.query(models.FamilyMember).order_by(models.FamilyMember.id).all()
+
+        dates = [start_date + datetime.timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+        def limits(group_members):
+            if not group_members:
+                return None
+            return {
+                "calories": sum(m.max_calories or 0 for m in group_members),
+                "proteins": sum(m.max_proteins or 0 for m in group_members),
+                "fats": sum(m.max_fats or 0 for m in group_members),
+                "carbs": sum(m.max_carbs or 0 for m in group_members),
+            }
+
+        def group(member_rows, member=None):
+            by_date = {d: _empty_totals() for d in dates}
+            for row in member_rows:
+                _add(by_date[row.date], row)
+            weeks = {}
+            total = _empty_totals()
+            for d in dates:
+                week_start = d - datetime.timedelta(days=d.weekday())
+                week = weeks.setdefault(week_start, _empty_totals())
+                for k, v in by_date[d].items():
+                    week[k] += v
+                    total[k] += v
+            return {
+                "member": member,
+                "limits": limits([member] if member else members),
+                "days": [{"date": d, "day_of_week": DAYS[d.weekday()], **_rounded(by_date[d])} for d in dates],
+                "weeks": [{"week_start": w, **_rounded(t)} for w, t in weeks.items()],
+                "total": _rounded(total),
+            }
+
+        return {
+            "start_date": start_date,
+            "end_date": end_date,
+            "all": group(rows),
+            "members": [group([r for r in rows if r.member_id == m.id], m) for m in members],
+        }
+
+# --- Инкрементальное обновление свертки ---
+
+def _on_plan_changed(db: Session, keys):
+    StatsService.refresh(db, keys)
+
+def _on_recipes_changed(db: Session, recipe_ids):
+    # Итоги рецептов уже пересчитаны: обновляем дни, где эти рецепты стоят в плане
+    rows = db.query(models.WeeklyPlanEntry.date, models.WeeklyPlanEntry.family_member_id).filter(
+        models.WeeklyPlanEntry.recipe_id.in_(recipe_ids)
+    ).distinct().all()
+    StatsService.refresh(db, {(row.date, row.family_member_id) for row in rows})
+
+invalidation.subscribe(invalidation.PLAN_CHANGED, _on_plan_changed)
+invalidation.subscribe(invalidation.RECIPES_CHANGED, _on_recipes_changed)
@@ -1,34 +1,459 @@
+"""
+Telegram delivery through a persistent outbox.
+
+Endpoints only add rows to telegram_outbox and return. TelegramDispatcher, a
+coroutine started with the app on the loop of the shared outbound HTTP client
+(utils/http_client.py), claims due messages and sends them concurrently over
+its pooled async client, paced by token buckets for the Bot API limits (a
+message per second per chat, 30 per second overall). Network errors, 5xx and 429 are retried with exponential
+backoff (429 - after the retry_after Telegram asks for). Other errors and
+messages that ran out of attempts become "dead" and stay in the table until they
+are re-queued from the admin API. A broadcast is one outbox row per recipient
+sharing a broadcast_id.
+
+In a multi-process server only one process (holding a file lock) dispatches,
+so the rate limits stay global; the others wake it through a shared counter.
+"""
+import asyncio
+import datetime
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from typing import List, NamedTuple, Optional
+import httpx
+from sqlalchemy import func, insert, update
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-import requests
 import models
+from services.cache_sync import cache_sync
+from services.settings_cache import app_settings
+from utils import process_shared
+from utils.http_client import outbound_http
+
+logger = logging.getLogger(__name__)
+
+PENDING, SENDING, SENT, DEAD = "pending", "sending", "sent", "dead"
+STATUSES = (PENDING, SENDING, SENT, DEAD)
+
+TOKEN_SETTING = "bot_token"
+# Адрес Bot API - только из окружения развертывания (локальный Bot API сервер, тесты):
+# по нему уходят токен бота и все сообщения
+API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+
+# Одновременных запросов к Bot API
+MAX_CONCURRENCY = 8
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+SEND_TIMEOUT = httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+MAX_ATTEMPTS = 6
+# Пауза перед n-й повторной попыткой: BACKOFF_BASE * 2^(n-1), не больше BACKOFF_MAX, секунд
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 300.0
+# Лимиты Bot API - сообщение в секунду в один чат и 30 в секунду всего;
+# общий с запасом: задержки сети сдвигают отправки и сбивают их в пачки
+PER_CHAT_RATE = 1.0
+GLOBAL_RATE = 25.0
+# Попытка в статусе sending дольше этого срока считается зависшей (процесс упал) и повторяется
+SENDING_LEASE = datetime.timedelta(seconds=CONNECT_TIMEOUT + READ_TIMEOUT + 30)
+# Как часто диспетчер проверяет очередь без пробуждений
+POLL_INTERVAL = 5.0
+# Несколько процессов: как часто смотреть на счетчик пробуждений от других процессов
+# и пытаться стать диспетчером, если им был упавший процесс
+WAKE_CHECK_INTERVAL = 0.1
+LEADER_LOCK_FILE = ".telegram_dispatcher.lock"
+WAKE_COUNTER_FILE = ".telegram_wake"
+
+def _check_token(db: Session):
+    if not app_settings.get(db, TOKEN_SETTING):
+        raise HTTPException(status_code=400, detail="Токен бота не настроен в админке")
+
+def _outbox_row(chat_id, text, broadcast_id=None):
+    return {"chat_id": str(chat_id), "text": text, "parse_mode": "Markdown", "broadcast_id": broadcast_id,
+            "status": PENDING, "attempts": 0, "next_attempt_at": datetime.datetime.utcnow(),
+            "created_at": datetime.datetime.utcnow()}
 
-def send_telegram_message(db: Session, chat_id: str, message_text: str):
+def send_telegram_message(db: Session, chat_id: str, message_text: str) -> int:
     """
-    Sends a message via Telegram Bot API using the token stored in AppSettings.
+    Queues a message for the dispatcher and commits. Returns the outbox id.
     """
-    # 1. Get Token
-    setting = db.query(models.AppSetting).filter(models.AppSetting.key == "bot_token").first()
-    if not setting or not setting.value:
-        raise HTTPException(status_code=400, detail="Токен бота не настроен в админке")
-    
-    bot_token = setting.value
-    telegram_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    
-    # 2. Send Request
-    try:
-        resp = requests.post(telegram_url, json={
-            "chat_id": chat_id,
-            "text": message_text,
-            "parse_mode": "Markdown"
-        })
-        if resp.status_code != 200:
-            raise HTTPException(status_code=500, detail=f"Telegram Error: {resp.text}")
-            
-    except Exception as e:
-        # Re-raise HTTP exceptions (like the 500 above)
-        if isinstance(e, HTTPException):
-            raise e
-        raise HTTPException(status_code=500, detail=f"Connection Error: {str(e)}")
-
-    return True
+    _check_token(db)
+    message = models.TelegramOutbox(**_outbox_row(chat_id, message_text))
+    db.add(message)
+    db.flush()
+    message_id = message.id
+    db.commit()
+    telegram_dispatcher.wake()
+    return message_id
+
+def broadcast_message(db: Session, message_text: str, chat_ids: Optional[List[str]] = None):
+    """
+    Queues the message for every registered TelegramUser, or for those of
+    chat_ids. Delivery is tracked per recipient by broadcast_status.
+    """
+    _check_token(db)
+    users = db.query(models.TelegramUser)
+    if chat_ids is not None:
+        users = users.filter(models.TelegramUser.chat_id.in_(chat_ids))
+    recipients = list(dict.fromkeys(u.chat_id for u in users.order_by(models.TelegramUser.id)))
+    unknown = set(chat_ids or []) - set(recipients)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные получатели: {', '.join(sorted(unknown))}")
+    if not recipients:
+        raise HTTPException(status_code=400, detail="Нет получателей")
+
+    broadcast_id = uuid.uuid4().hex
+    db.execute(insert(models.TelegramOutbox), [_outbox_row(c, message_text, broadcast_id) for c in recipients])
+    db.commit()
+    telegram_dispatcher.wake()
+    return {"status": "queued", "message": f"Рассылка поставлена в очередь: {len(recipients)} получателей",
+            "broadcast_id": broadcast_id, "recipients": len(recipients)}
+
+def broadcast_status(db: Session, broadcast_id: str):
+    rows = db.query(models.TelegramOutbox, models.TelegramUser.name).outerjoin(
+        models.TelegramUser, models.TelegramUser.chat_id == models.TelegramOutbox.chat_id
+    ).filter(models.TelegramOutbox.broadcast_id == broadcast_id).order_by(models.TelegramOutbox.id).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Рассылка не найдена")
+
+    counts = {status: 0 for status in STATUSES}
+    for message, _ in rows:
+        counts[message.status] += 1
+    return {
+        "broadcast_id": broadcast_id,
+        "total": len(rows),
+        "counts": counts,
+        "done": counts[PENDING] + counts[SENDING] == 0,
+        "recipients": [{
+            "outbox_id": m.id, "chat_id": m.chat_id, "name": name, "status": m.status,
+            "attempts": m.attempts, "last_error": m.last_error, "sent_at": m.sent_at
+        } for m, name in rows],
+    }
+
+def list_outbox(db: Session, status: str = None, limit: int = 100):
+    query = db.query(models.TelegramOutbox)
+    if status:
+        query = query.filter(models.TelegramOutbox.status == status)
+    return query.order_by(models.TelegramOutbox.id.desc()).limit(limit).all()
+
+def outbox_stats(db: Session):
+    counts = dict(db.query(models.TelegramOutbox.status, func.count(models.TelegramOutbox.id))
+                  .group_by(models.TelegramOutbox.status).all())
+    return {"queue": {status: counts.get(status, 0) for status in STATUSES},
+            **telegram_dispatcher.stats()}
+
+def retry_message(db: Session, message_id: int):
+    """Puts a dead message back into the queue with a fresh attempt budget."""
+    message = db.query(models.TelegramOutbox).filter(models.TelegramOutbox.id == message_id).first()
+    if not message:
+        raise HTTPException(status_code=404, detail="Сообщение не найдено")
+    if message.status != DEAD:
+        raise HTTPException(status_code=400, detail="Повторить можно только недоставленное сообщение")
+    message.status = PENDING
+    message.attempts = 0
+    message.next_attempt_at = datetime.datetime.utcnow()
+    db.commit()
+    telegram_dispatcher.wake()
+    return message
+
+class TokenBucket:
+    """
+    `rate` tokens per second, at most `capacity` stored. reserve() takes a token
+    ahead of time and returns how long to wait before using it, so concurrent
+    callers queue up in reservation order. Used only from the dispatcher's loop.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def idle(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+class _Claim(NamedTuple):
+    id: int
+    chat_id: str
+    text: str
+    parse_mode: Optional[str]
+    attempts: int
+
+class _Outcome(NamedTuple):
+    status: str  # SENT, PENDING (повторить) или DEAD
+    error: Optional[str] = None
+    retry_after: Optional[float] = None
+
+class TelegramDispatcher:
+    """
+    Claims are conditional UPDATEs, so a message is never sent twice even if
+    several dispatchers share the outbox: it goes to whoever switched it to
+    "sending" first. Rate limits are per dispatcher - in a multi-process server
+    the others stand by until the lock holder exits.
+    """
+
+    def __init__(self, concurrency: int = MAX_CONCURRENCY):
+        self._concurrency = concurrency
+        self._session_factory = None
+        self._loop = None
+        self._future = None
+        self._wakeup = None
+        self._stopping = threading.Event()
+        self._leader = None
+        self._wake_counter = None
+        self._in_flight = 0
+        self._global_bucket = TokenBucket(GLOBAL_RATE)
+        self._chat_buckets = {}
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+
+    def start(self, session_factory):
+        """Runs the dispatcher on the event loop of the shared outbound HTTP client."""
+        if self._future is not None:
+            return
+        self._session_factory = session_factory
+        self._stopping.clear()
+        if process_shared.is_multiprocess():
+            self._leader = process_shared.ProcessLock(process_shared.data_path(LEADER_LOCK_FILE))
+            self._wake_counter = process_shared.SharedCounter(process_shared.data_path(WAKE_COUNTER_FILE))
+        self._wakeup = asyncio.Event()
+        self._loop = outbound_http.loop
+        self._future = asyncio.run_coroutine_threadsafe(self._run(), self._loop)
+
+    def stop(self):
+        """Stops claiming and waits for the sends in flight (bounded by the timeouts)."""
+        if self._future is None:
+            return
+        self._stopping.set()
+        self._wake_local()
+        self._future.result()
+        self._future = self._loop = None
+        if self._leader is not None:
+            self._leader.release()
+            self._wake_counter.close()
+            self._leader = self._wake_counter = None
+
+    def wake(self):
+        """Makes the dispatcher check the queue now (new or re-queued messages)."""
+        if self._wake_counter is not None and not self._leader.held:
+            self._wake_counter.bump()
+        self._wake_local()
+
+    def _wake_local(self):
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # Цикл уже остановлен
+            pass
+
+    def _is_leader(self) -> bool:
+        return self._leader is None or self._leader.acquire()
+
+    def stats(self):
+        return {"in_flight": self._in_flight, "sent": self.sent, "retried": self.retried, "dead": self.dead,
+                "dispatching": self._future is not None and (self._leader is None or self._leader.held)}
+
+    async def _run(self):
+        client = outbound_http.async_client
+        tasks = set()
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            wakes = self._wake_counter.value() if self._wake_counter is not None else None
+            if not self._is_leader():
+                # Отправляет другой процесс; проверяем, жив ли он
+                delay = WAKE_CHECK_INTERVAL
+            else:
+                try:
+                    delay = await self._dispatch(client, tasks)
+                except Exception:
+                    logger.exception("Ошибка диспетчера Telegram")
+                    delay = POLL_INTERVAL
+            await self._sleep(delay, wakes)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _sleep(self, delay: float, wakes: Optional[int]):
+        """Waits up to `delay` for a local wake() or, in a multi-process server, one from another process."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + delay
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            timeout = remaining if wakes is None else min(remaining, WAKE_CHECK_INTERVAL)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+                return
+            except asyncio.TimeoutError:
+                if wakes is not None and self._wake_counter.value() != wakes:
+                    return
+
+    async def _dispatch(self, client: httpx.AsyncClient, tasks: set) -> float:
+        """Starts sends for due messages; returns how long to sleep."""
+        free = self._concurrency - self._in_flight
+        if free <= 0:
+            # Разбудит завершившаяся отправка
+            return POLL_INTERVAL
+
+        claims, token, next_due = await asyncio.to_thread(self._claim, free)
+        for claim in claims:
+            self._in_flight += 1
+            task = asyncio.create_task(self._deliver(client, claim, token))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if len(claims) == free:
+            return 0
+        if next_due is None:
+            return POLL_INTERVAL
+        wait = (next_due - datetime.datetime.utcnow()).total_seconds()
+        return min(max(wait, 0.05), POLL_INTERVAL)
+
+    def _claim(self, limit: int):
+        """Claims up to `limit` due messages: (claims, token, api url, next due time)."""
+        Outbox = models.TelegramOutbox
+        # Токен и адрес Bot API могли смениться в другом процессе
+        cache_sync.poll()
+        db = self._session_factory()
+        try:
+            now = datetime.datetime.utcnow()
+            # pending с наступившим сроком и зависшие sending
+            due = db.query(Outbox.id, Outbox.status, Outbox.next_attempt_at).filter(
+                Outbox.status.in_((PENDING, SENDING)), Outbox.next_attempt_at <= now
+            ).order_by(Outbox.next_attempt_at, Outbox.id).limit(limit).all()
+
+            claims = []
+            for message_id, status, next_attempt_at in due:
+                row = db.execute(
+                    update(Outbox)
+                    .where(Outbox.id == message_id, Outbox.status == status, Outbox.next_attempt_at == next_attempt_at)
+                    .values(status=SENDING, attempts=Outbox.attempts + 1, next_attempt_at=now + SENDING_LEASE)
+                    .returning(Outbox.id, Outbox.chat_id, Outbox.text, Outbox.parse_mode, Outbox.attempts)
+                ).first()
+                # Пусто - сообщение уже забрал другой процесс
+                if row is not None:
+                    claims.append(_Claim(*row))
+            db.commit()
+
+            next_due = db.query(func.min(Outbox.next_attempt_at)).filter(
+                Outbox.status.in_((PENDING, SENDING))
+            ).scalar()
+            return claims, app_settings.get(db, TOKEN_SETTING), next_due
+        finally:
+            db.close()
+
+    async def _deliver(self, client: httpx.AsyncClient, claim: _Claim, token: str):
+        try:
+            await self._throttle(claim.chat_id)
+            outcome = await self._send(client, claim, token)
+        except Exception as e:
+            outcome = _Outcome(PENDING, f"{type(e).__name__}: {e}")
+        try:
+            status = await asyncio.to_thread(self._record, claim, outcome)
+            if status == SENT:
+                self.sent += 1
+            elif status == PENDING:
+                self.retried += 1
+            else:
+                self.dead += 1
+        except Exception:
+            logger.exception(f"Не удалось сохранить результат отправки сообщения {claim.id}")
+        finally:
+            self._in_flight -= 1
+            self._wakeup.set()
+
+    async def _throttle(self, chat_id: str):
+        # Сначала очередь чата, затем общая: общий лимит отсчитывается от фактической отправки
+        now = time.monotonic()
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                self._chat_buckets = {c: b for c, b in self._chat_buckets.items() if not b.idle(now)}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(PER_CHAT_RATE)
+        delay = bucket.reserve(now)
+        if delay:
+            await asyncio.sleep(delay)
+        delay = self._global_bucket.reserve(time.monotonic())
+        if delay:
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _send(client: httpx.AsyncClient, claim: _Claim, token: str) -> _Outcome:
+        if not token:
+            return _Outcome(PENDING, "Токен бота не настроен в админке")
+        payload = {"chat_id": claim.chat_id, "text": claim.text}
+        if claim.parse_mode:
+            payload["parse_mode"] = claim.parse_mode
+        try:
+            resp = await client.post(f"{API_URL}/bot{token}/sendMessage", json=payload, timeout=SEND_TIMEOUT)
+        except httpx.HTTPError as e:
+            # URL запроса содержит токен
+            return _Outcome(PENDING, f"Connection Error: {type(e).__name__}: {str(e).replace(token, '***')}")
+
+        if resp.status_code == 200:
+            return _Outcome(SENT)
+        error = f"Telegram Error {resp.status_code}: {resp.text[:500]}"
+        if resp.status_code == 429:
+            try:
+                retry_after = float(resp.json()["parameters"]["retry_after"])
+            except (ValueError, KeyError, TypeError):
+                retry_after = None
+            return _Outcome(PENDING, error, retry_after)
+        if resp.status_code >= 500:
+            return _Outcome(PENDING, error)
+        # 400 (чат не найден, ошибка разметки), 401/403/404 (токен, бот заблокирован) - повтор не поможет
+        return _Outcome(DEAD, error)
+
+    def _record(self, claim: _Claim, outcome: _Outcome) -> str:
+        """Stores the outcome of the claimed attempt; returns the new status."""
+        now = datetime.datetime.utcnow()
+        status = outcome.status
+        if status == PENDING and claim.attempts >= MAX_ATTEMPTS:
+            status = DEAD
+
+        if status == SENT:
+            values = {"status": SENT, "sent_at": now, "last_error": None}
+        elif status == PENDING:
+            values = {"status": PENDING, "last_error": outcome.error,
+                      "next_attempt_at": now + datetime.timedelta(seconds=self._backoff(claim.attempts, outcome))}
+        else:
+            values = {"status": DEAD, "last_error": outcome.error}
+
+        Outbox = models.TelegramOutbox
+        db = self._session_factory()
+        try:
+            # Только своя попытка: зависшую после SENDING_LEASE мог забрать другой процесс
+            db.execute(update(Outbox).where(
+                Outbox.id == claim.id, Outbox.status == SENDING, Outbox.attempts == claim.attempts
+            ).values(**values))
+            db.commit()
+        finally:
+            db.close()
+
+        if status == PENDING:
+            logger.info(f"Сообщение {claim.id}: попытка {claim.attempts} не удалась, повтор: {outcome.error}")
+        elif status == DEAD:
+            logger.warning(f"Сообщение {claim.id} в Telegram не доставлено: {outcome.error}")
+        return status
+
+    @staticmethod
+    def _backoff(attempts: int, outcome: _Outcome) -> float:
+        if outcome.retry_after is not None:
+            return min(outcome.retry_after, BACKOFF_MAX)
+        delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+        # Разброс, чтобы повторы после общего сбоя не шли одной волной
+        return delay / 2 + random.uniform(0, delay / 2)
+
+telegram_dispatcher = TelegramDispatcher()
@@ -0,0 +1,274 @@
+"""
+Outbound HTTP shared by all integrations (product feeds, Telegram Bot API).
+
+One pooled keep-alive httpx.Client for code running in threads and one
+httpx.AsyncClient on a dedicated event loop thread for background senders,
+created at startup and closed at shutdown. Both go through the same policy
+transport: at most PER_HOST_LIMIT requests in flight per host (a streamed
+response holds its slot until it is closed), retries of connection failures
+(the request never reached the server) for any method and of 502/503/504 and
+read timeouts for idempotent methods, and per-host call metrics. Latency is
+measured up to the response headers.
+"""
+import asyncio
+import collections
+import logging
+import random
+import threading
+import time
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=3.05, pool=10.0)
+LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60)
+PER_HOST_LIMIT = 8
+RETRIES = 2
+RETRY_BACKOFF = 0.2
+RETRY_STATUSES = (502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+# Сколько последних замеров держать для перцентилей
+LATENCY_SAMPLES = 500
+
+class HostMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.statuses = collections.Counter()
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.samples = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def to_dict(self):
+        samples = sorted(self.samples)
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 1) if samples else None
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "statuses": {str(code): count for code, count in sorted(self.statuses.items())},
+            "latency_ms": {
+                "avg": round(self.latency_total / self.requests * 1000, 1) if self.requests else None,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(self.latency_max * 1000, 1),
+            },
+        }
+
+def _host(request: httpx.Request) -> str:
+    return request.url.netloc.decode("ascii")
+
+def _retryable(request: httpx.Request, error: Exception = None, response: httpx.Response = None) -> bool:
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if request.method not in IDEMPOTENT_METHODS:
+        return False
+    if error is not None:
+        return isinstance(error, httpx.ReadTimeout)
+    return response.status_code in RETRY_STATUSES
+
+def _backoff(attempt: int) -> float:
+    delay = RETRY_BACKOFF * 2 ** attempt
+    return delay / 2 + random.uniform(0, delay / 2)
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that frees the host slot when closed."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+def _once(release):
+    done = []
+
+    def wrapper():
+        if not done:
+            done.append(True)
+            release()
+    return wrapper
+
+class _PolicyTransport(httpx.BaseTransport):
+    def __init__(self, outbound):
+        self._outbound = outbound
+        self._inner = httpx.HTTPTransport(limits=LIMITS)
+        self._slots = collections.defaultdict(lambda: threading.BoundedSemaphore(PER_HOST_LIMIT))
+        self._lock = threading.Lock()
+
+    def handle_request(self, request):
+        host = _host(request)
+        with self._lock:
+            slot = self._slots[host]
+        slot.acquire()
+        started = time.perf_counter()
+        try:
+            for attempt in range(RETRIES + 1):
+                last = attempt == RETRIES
+                try:
+                    response = self._inner.handle_request(request)
+                except httpx.TransportError as e:
+                    if last or not _retryable(request, error=e):
+                        raise
+                    self._outbound._record_retry(host, e)
+                else:
+                    if last or not _retryable(request, response=response):
+                        break
+                    response.close()
+                    self._outbound._record_retry(host, f"HTTP {response.status_code}")
+                time.sleep(_backoff(attempt))
+        except BaseException:
+            slot.release()
+            self._outbound._record(host, time.perf_counter() - started, None)
+            raise
+        self._outbound._record(host, time.perf_counter() - started, response.status_code)
+        response.stream = _ReleasingStream(response.stream, _once(slot.release))
+        return response
+
+    def close(self):
+        self._inner.close()
+
+class _AsyncPolicyTransport(httpx.AsyncBaseTransport):
+    """Used only from OutboundHttp.loop, so asyncio primitives are safe here."""
+
+    def __init__(self, outbound):
+        self._outbound = outbound
+        self._inner = httpx.AsyncHTTPTransport(limits=LIMITS)
+        self._slots = collections.defaultdict(lambda: asyncio.BoundedSemaphore(PER_HOST_LIMIT))
+
+    async def handle_async_request(self, request):
+        host = _host(request)
+        slot = self._slots[host]
+        await slot.acquire()
+        started = time.perf_counter()
+        try:
+            for attempt in range(RETRIES + 1):
+                last = attempt == RETRIES
+                try:
+                    response = await self._inner.handle_async_request(request)
+                except httpx.TransportError as e:
+                    if last or not _retryable(request, error=e):
+                        raise
+                    self._outbound._record_retry(host, e)
+                else:
+                    if last or not _retryable(request, response=response):
+                        break
+                    await response.aclose()
+                    self._outbound._record_retry(host, f"HTTP {response.status_code}")
+                await asyncio.sleep(_backoff(attempt))
+        except BaseException:
+            slot.release()
+            self._outbound._record(host, time.perf_counter() - started, None)
+            raise
+        self._outbound._record(host, time.perf_counter() - started, response.status_code)
+        response.stream = _AsyncReleasingStream(response.stream, _once(slot.release))
+        return response
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+class OutboundHttp:
+    """
+    `client` - for sync code, `async_client` - only for coroutines running on
+    `loop`. Both are created on first use if start() was not called.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = collections.defaultdict(HostMetrics)
+        self._client = None
+        self._async_client = None
+        self._loop = None
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._client is not None:
+                return
+            self._client = httpx.Client(transport=_PolicyTransport(self), timeout=DEFAULT_TIMEOUT)
+            self._async_client = httpx.AsyncClient(transport=_AsyncPolicyTransport(self), timeout=DEFAULT_TIMEOUT)
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="outbound-http", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Closes both pools and stops the loop (its senders must be stopped first)."""
+        with self._lock:
+            if self._client is None:
+                return
+            client, async_client, loop, thread = self._client, self._async_client, self._loop, self._thread
+            self._client = self._async_client = self._loop = self._thread = None
+        client.close()
+        asyncio.run_coroutine_threadsafe(async_client.aclose(), loop).result()
+        asyncio.run_coroutine_threadsafe(loop.shutdown_default_executor(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    @property
+    def client(self) -> httpx.Client:
+        self.start()
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        self.start()
+        return self._async_client
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self.start()
+        return self._loop
+
+    def _record(self, host, elapsed, status):
+        with self._metrics_lock:
+            metrics = self._metrics[host]
+            metrics.requests += 1
+            metrics.latency_total += elapsed
+            metrics.latency_max = max(metrics.latency_max, elapsed)
+            metrics.samples.append(elapsed)
+            if status is None:
+                metrics.errors += 1
+            else:
+                metrics.statuses[status] += 1
+
+    def _record_retry(self, host, reason):
+        logger.info(f"Повтор запроса к {host}: {reason}")
+        with self._metrics_lock:
+            self._metrics[host].retries += 1
+
+    def metrics(self):
+        with self._metrics_lock:
+            return {
+                "per_host_limit": PER_HOST_LIMIT,
+                "hosts": {host: m.to_dict() for host, m in sorted(self._metrics.items())},
+            }
+
+outbound_http = OutboundHttp()
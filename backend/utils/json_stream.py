@@ -0,0 +1,84 @@
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+def iter_json_items(chunks):
+    """
+    Incrementally parses a JSON feed from an iterable of byte chunks.
+    Supports a top-level JSON array (`[{...}, {...}]`) and NDJSON (one value per line).
+    Only the current chunk and the item being parsed are kept in memory.
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    mode = None  # "array" | "ndjson"
+    finished = False
+
+    def more():
+        nonlocal buf, pos
+        for chunk in chunks_iter:
+            text = text_decoder.decode(chunk)
+            if text:
+                buf = buf[pos:] + text
+                pos = 0
+                return True
+        tail = text_decoder.decode(b"", final=True)
+        buf = buf[pos:] + tail
+        pos = 0
+        return False
+
+    chunks_iter = iter(chunks)
+    has_more = True
+
+    while not finished:
+        # Пропускаем пробелы (и запятые между элементами массива)
+        while pos < len(buf) and (buf[pos] in _WHITESPACE or (mode == "array" and buf[pos] == ",")):
+            pos += 1
+        if pos >= len(buf):
+            if not has_more:
+                if mode == "array":
+                    raise ValueError("Unexpected end of JSON array")
+                return
+            has_more = more()
+            continue
+
+        if mode is None:
+            if buf[pos] == "[":
+                mode = "array"
+                pos += 1
+            else:
+                mode = "ndjson"
+            continue
+
+        if mode == "array" and buf[pos] == "]":
+            finished = True
+            continue
+
+        if mode == "ndjson":
+            end = buf.find("\n", pos)
+            if end == -1:
+                if has_more:
+                    has_more = more()
+                    continue
+                end = len(buf)
+            line = buf[pos:end].strip()
+            pos = end + 1
+            if line:
+                yield json.loads(line)
+            continue
+
+        try:
+            item, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if not has_more:
+                raise
+            has_more = more()
+            continue
+        if end >= len(buf) and has_more:
+            # Значение упирается в конец буфера (например, число) - дочитываем
+            has_more = more()
+            continue
+        pos = end
+        yield item
@@ -0,0 +1,77 @@
+import base64
+import datetime
+import json
+from typing import List, NamedTuple, Optional
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, func, or_, tuple_
+
+# Верхняя граница размера страницы (limit)
+MAX_PAGE_SIZE = 500
+
+class Page(NamedTuple):
+    items: list
+    total: int
+    next_cursor: Optional[str] = None
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime.date) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, columns: list) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor length")
+        return [_parse(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _parse(column, value):
+    if value is None:
+        # Nullable колонка сортировки (дата в старых записях плана)
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime.datetime:
+        return datetime.datetime.fromisoformat(value)
+    if python_type is datetime.date:
+        return datetime.date.fromisoformat(value)
+    return python_type(value)
+
+def paginate(query, columns: List, limit: int = None, cursor: str = None) -> Page:
+    """
+    Keyset pagination ordered by `columns` (ascending; the last one must be unique, e.g. id).
+    The cursor holds the sort key of the last returned row, so a page costs one indexed
+    range scan no matter how deep it is. Without `limit` the whole list is returned, as before.
+    """
+    ordered = query.order_by(*columns)
+    if limit is None:
+        items = ordered.all()
+        return Page(items, len(items))
+
+    # Общее количество - отдельный COUNT по тем же фильтрам, без подгрузки связей
+    total = query.enable_eagerloads(False).with_entities(func.count(columns[-1])).order_by(None).scalar()
+    if cursor:
+        ordered = ordered.filter(_after(columns, decode_cursor(cursor, columns)))
+
+    items = ordered.limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column in columns])
+    return Page(items, total, next_cursor)
+
+def _after(columns, values):
+    """Rows after the cursor in ORDER BY columns; NULLs sort first (SQLite), so NULL keys are compared explicitly."""
+    if None not in values:
+        return columns[0] > values[0] if len(columns) == 1 else tuple_(*columns) > tuple_(*values)
+    column, value = columns[0], values[0]
+    if value is None:
+        # После NULL - остальные строки с NULL по следующим колонкам, затем все непустые
+        return or_(and_(column.is_(None), _after(columns[1:], values[1:])), column.isnot(None))
+    return or_(column > value, and_(column == value, _after(columns[1:], values[1:])))
+
+def set_page_headers(response: Response, page: Page):
+    response.headers["X-Total-Count"] = str(page.total)
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
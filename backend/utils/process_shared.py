@@ -0,0 +1,93 @@
+"""
+State shared by the worker processes of one server (gunicorn / uvicorn --workers).
+
+WEB_CONCURRENCY is the worker count (gunicorn.conf.py sets it for the workers);
+with more than one process in-memory caches need cross-process invalidation
+(services/cache_sync.py) and only one process may run the Telegram dispatcher.
+
+Counters and locks live in files in DATA_DIR next to the database, so every
+process of the server sees the same ones.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+from database import DATA_DIR
+
+_COUNTER = struct.Struct("<Q")
+
+def worker_count() -> int:
+    try:
+        return max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+    except ValueError:
+        return 1
+
+def is_multiprocess() -> bool:
+    return worker_count() > 1
+
+def data_path(name: str) -> str:
+    return os.path.join(DATA_DIR, name)
+
+class SharedCounter:
+    """
+    A 64-bit counter in a memory-mapped file. value() is a plain memory read -
+    cheap enough for every request; bump() is serialized between processes by flock.
+    Open it in the process that uses it (after fork): flock does not separate
+    processes sharing one inherited descriptor.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < _COUNTER.size:
+            os.ftruncate(self._fd, _COUNTER.size)
+        self._map = mmap.mmap(self._fd, _COUNTER.size)
+        self._lock = threading.Lock()
+
+    def value(self) -> int:
+        return _COUNTER.unpack_from(self._map)[0]
+
+    def bump(self) -> int:
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                value = _COUNTER.unpack_from(self._map)[0] + 1
+                _COUNTER.pack_into(self._map, 0, value)
+                return value
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+class ProcessLock:
+    """
+    Non-blocking exclusive lock held until the process exits (or release()):
+    elects the one process that runs a singleton task. A process that dies frees
+    the lock, and the next acquire() elsewhere takes over.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self.held = False
+
+    def acquire(self) -> bool:
+        if self.held:
+            return True
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self.held = True
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+        self.held = False
@@ -0,0 +1,28 @@
+import contextvars
+from sqlalchemy import event
+
+# Счетчик SQL-запросов текущего HTTP-запроса.
+# Объект счетчика общий для всех копий контекста (threadpool sync-эндпоинтов),
+# поэтому инкременты из рабочих потоков видны в middleware.
+_current_counter = contextvars.ContextVar("query_counter", default=None)
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+def install(engine):
+    """Subscribes to engine cursor executions and counts them for the active request."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        counter = _current_counter.get()
+        if counter is not None:
+            counter.count += 1
+
+def start():
+    """Starts counting queries in the current context. Returns (counter, token)."""
+    counter = QueryCounter()
+    token = _current_counter.set(counter)
+    return counter, token
+
+def stop(token):
+    _current_counter.reset(token)
@@ -0,0 +1,62 @@
+import datetime
+import re
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+import models
+from services.shopping_list import join_products
+
+# Таблицы, полный перебор которых в горячих запросах - регрессия индексов
+INDEXED_TABLES = ("weekly_plan", "recipe_ingredients")
+_INDEX_RE = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+
+def hot_queries(db: Session):
+    """The plan's hottest statements in the shape the services build them (sample parameters)."""
+    Entry, Ingredient = models.WeeklyPlanEntry, models.RecipeIngredient
+    start = datetime.date.today()
+    end = start + datetime.timedelta(days=6)
+    in_range = (Entry.date >= start, Entry.date <= end)
+    return {
+        # get_plan / get_plan_compact: диапазон в порядке (date, id)
+        "plan_range": db.query(Entry).filter(*in_range).order_by(Entry.date, Entry.id).statement,
+        "clear_plan": delete(Entry).where(*in_range),
+        # calculate_shopping_list: план -> рецепты -> ингредиенты -> продукты
+        "shopping_list": join_products(db.query(Entry).filter(*in_range))
+            .with_entities(models.Product.id).statement,
+        # autofill_week: занятые слоты недели
+        "autofill_occupancy": db.query(Entry.date, Entry.meal_type, Entry.family_member_id)
+            .filter(*in_range).statement,
+        # autofill_one: записи участника за день
+        "member_day": db.query(Entry).filter(Entry.date == start, Entry.family_member_id == 1).statement,
+        "slot": db.query(Entry.id).filter(
+            Entry.date == start, Entry.meal_type == "lunch", Entry.family_member_id == 1
+        ).statement,
+        # Инвалидация: записи с измененными рецептами, рецепты с измененными продуктами
+        "plan_by_recipe": db.query(Entry.date).filter(Entry.recipe_id.in_([1, 2])).statement,
+        "recipes_using_products": db.query(Ingredient.recipe_id)
+            .filter(Ingredient.product_id.in_([1, 2])).distinct().statement,
+        "recipe_ingredients": db.query(Ingredient).filter(Ingredient.recipe_id.in_([1, 2])).statement,
+    }
+
+def explain(db: Session, statement):
+    """EXPLAIN QUERY PLAN details of a statement (SQLite)."""
+    bind = db.get_bind()
+    sql = str(statement.compile(dialect=bind.dialect, compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+
+def report(db: Session):
+    """
+    {name: {"plan": details, "indexes": indexes used, "full_scans": tables of
+    INDEXED_TABLES read without an index}} for every hot query.
+    """
+    result = {}
+    for name, statement in hot_queries(db).items():
+        plan = explain(db, statement)
+        result[name] = {
+            "plan": plan,
+            "indexes": sorted({m for line in plan for m in _INDEX_RE.findall(line)}),
+            "full_scans": sorted({
+                table for line in plan for table in INDEXED_TABLES
+                if re.match(rf"SCAN {table}\b", line) and "INDEX" not in line
+            }),
+        }
+    return result
@@ -12,6 +12,22 @@ export const fetchPlan = async (startDate, endDate) => {
     return response.json();
 };
 
+// Normalized plan: { entries, recipes } - entries carry recipe_id,
+// each recipe (totals only, no ingredients) is sent once in `recipes`
+export const fetchPlanCompact = async (startDate, endDate) => {
+    const params = new URLSearchParams({ compact: 'true' });
+    if (startDate) params.append('start_date', startDate);
+    if (endDate) params.append('end_date', endDate);
+
+    const response = await fetch(`/api/plan/?${params.toString()}`);
+    if (!response.ok) {
+        throw new Error('Failed to fetch plan');
+    }
+    return response.json();
+};
+
+// Replaces the plan between the first and the last date of items;
+// returns the change summary { added, updated, removed, unchanged }
 export const savePlan = async (items) => {
     const response = await fetch('/api/plan/batch', {
         method: 'POST',
@@ -56,6 +72,22 @@ export const autofillWeek = async () => {
     return response.json();
 };
 
+// Server-side distribution of next week; returns only the diff: { added, updated, removed, unchanged, seed }
+export const distributePlan = async (settings = {}) => {
+    const response = await fetch('/api/plan/distribute', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(settings),
+    });
+    if (!response.ok) {
+        const err = await response.json();
+        throw new Error(err.detail || 'Failed to distribute plan');
+    }
+    return response.json();
+};
+
 export const autofillOne = async (data = {}) => {
     const response = await fetch('/api/plan/autofill_one', {
         method: 'POST',
@@ -0,0 +1,8 @@
+export const searchProducts = async (query, limit = 50, signal) => {
+    const params = new URLSearchParams({ q: query, limit });
+    const response = await fetch(`/api/products/search?${params.toString()}`, { signal });
+    if (!response.ok) {
+        throw new Error('Failed to search products');
+    }
+    return response.json();
+};
@@ -0,0 +1,11 @@
+export const fetchStats = async (startDate, endDate) => {
+    const params = new URLSearchParams();
+    if (startDate) params.append('start_date', startDate);
+    if (endDate) params.append('end_date', endDate);
+
+    const response = await fetch(`/api/stats/?${params.toString()}`);
+    if (!response.ok) {
+        throw new Error('Failed to fetch stats');
+    }
+    return response.json();
+};
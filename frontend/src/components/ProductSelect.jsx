@@ -1,8 +1,13 @@
 import React, { useState, useEffect, useRef, useMemo } from 'react';
+import { searchProducts } from '../api/products';
+
+// Пауза после ввода перед запросом к серверному поиску
+const SEARCH_DEBOUNCE_MS = 150;
 
 const ProductSelect = ({ products, value, onChange, onOpen }) => {
   const [isOpen, setIsOpen] = useState(false);
   const [searchTerm, setSearchTerm] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
   const wrapperRef = useRef(null);
 
   // Закрытие выпадающего списка при клике вне компонента
@@ -20,12 +25,34 @@ const ProductSelect = ({ products, value, onChange, onOpen }) => {
   // Безопасный поиск выбранного продукта (защита от undefined products)
   const selectedProduct = (products || []).find(p => p.id === parseInt(value));
 
-  // Фильтрация списка продуктов по поисковому запросу
+  // Поиск на сервере (индекс, регистр кириллицы, опечатки); устаревшие запросы отменяются
+  useEffect(() => {
+    const query = searchTerm.trim();
+    if (!query) {
+      setSearchResults(null);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      searchProducts(query, 50, controller.signal)
+        .then(setSearchResults)
+        .catch(err => {
+          if (err.name !== 'AbortError') console.error(err);
+        });
+    }, SEARCH_DEBOUNCE_MS);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [searchTerm]);
+
+  // Без запроса - полный список по алфавиту, с запросом - ранжированная выдача сервера
   const filteredProducts = useMemo(() => {
-    return (products || [])
-      .filter(p => p.name.toLowerCase().includes(searchTerm.toLowerCase()))
-      .sort((a, b) => a.name.localeCompare(b.name));
-  }, [products, searchTerm]);
+    if (searchTerm.trim()) {
+      return searchResults || [];
+    }
+    return [...(products || [])].sort((a, b) => a.name.localeCompare(b.name));
+  }, [products, searchTerm, searchResults]);
 
   const handleSelect = (id) => {
     onChange(id);
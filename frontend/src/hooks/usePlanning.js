@@ -1,7 +1,6 @@
 import { useCallback } from 'react';
-import { fetchPlan, savePlan, clearPlan } from '../api/plan';
+import { fetchPlanCompact, savePlan, clearPlan, distributePlan } from '../api/plan';
 import { calculateItemStats } from '../utils/stats';
-import { calculateDistributedMeals } from '../utils/planningLogic';
 import { usePlanningState } from './usePlanningState';
 
 export const usePlanning = () => {
@@ -257,80 +256,36 @@ export const usePlanning = () => {
     const autoDistribute = async () => {
         if (plannedMeals.length > 0 && !window.confirm("Это действие перезапишет текущее расписание по дням. Продолжить?")) return;
 
-        // Calculate Last Week Range
-        const today = new Date();
-        const dayOfWeek = today.getDay(); // 0(Sun)..6(Sat) in JS
-        // We want Monday of current week as baseline.
-        // If today is Sunday (0), Monday was 6 days ago. If Monday (1), 0 days ago.
-        // BUT wait, standard week starts Monday.
-        // JS getDay(): Sun=0, Mon=1, ..., Sat=6.
-        // Monday offset:
-        const diffToMon = dayOfWeek === 0 ? 6 : dayOfWeek - 1;
-        const currentMonday = new Date(today);
-        currentMonday.setDate(today.getDate() - diffToMon);
-
-        const lastMonday = new Date(currentMonday);
-        lastMonday.setDate(currentMonday.getDate() - 7);
-        const lastSunday = new Date(currentMonday);
-        lastSunday.setDate(currentMonday.getDate() - 1);
-
-        const formatDate = (d) => d.toISOString().split('T')[0];
-
-        let lastWeekPlan = [];
-        try {
-            lastWeekPlan = await fetchPlan(formatDate(lastMonday), formatDate(lastSunday));
-        } catch (e) {
-            console.error("Failed to fetch last week history", e);
-            // Non-blocking error, just proceed with empty history
-        }
-
-        // Calculate Auto Distribution using Utility
-        const newMeals = calculateDistributedMeals({
-            recipes,
-            familyMembers,
-            eatersCount,
-            plannedPortions,
-            visibleRecipes,
-            lastWeekPlan,
-            getDefaultPortion
-        });
-
-        // Save to Backend using Batch API
-        const batchPayload = newMeals.map(m => {
-            const dateStr = getDateForDayIndex(m.day);
-            const r = recipes.find(r => r.id === m.recipeId);
-            const portions = r ? (r.portions || 1) : 1;
-
-            // Handle Mock IDs
-            let finalMemberId = m.memberId;
-            if (typeof m.memberId === 'string' && m.memberId.startsWith('mock-')) {
-                finalMemberId = null;
-            }
-
-            return {
-                day_of_week: WEEK_DAYS_NAMES[m.day],
-                meal_type: m.type,
-                recipe_id: m.recipeId,
-                portions: portions,
-                family_member_id: finalMemberId,
-                date: dateStr
-            };
-        });
-
+        // Распределяет сервер: рецепты, семья и прошлая неделя не скачиваются,
+        // в ответ приходит только разница с текущим планом
+        const daysMap = {
+            'Понедельник': 0, 'Вторник': 1, 'Среда': 2, 'Четверг': 3,
+            'Пятница': 4, 'Суббота': 5, 'Воскресенье': 6
+        };
 
         try {
-            const res = await fetch('/api/plan/batch', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(batchPayload)
+            const diff = await distributePlan({
+                hidden_recipe_ids: hiddenIds,
+                portions: plannedPortions,
+                eaters_count: eatersCount
             });
-            if (res.ok) {
-                loadSharedPlan();
-            } else {
-                console.error("Batch save failed");
-            }
+            const toMeal = item => ({
+                id: item.id,
+                day: daysMap[item.day_of_week],
+                type: item.meal_type,
+                recipeId: item.recipe_id,
+                memberId: item.family_member_id,
+                portions: item.portions || 1
+            });
+            const changed = new Set([...diff.removed, ...diff.updated.map(item => item.id)]);
+            setPlannedMeals(prev => [
+                ...prev.filter(m => !changed.has(m.id)),
+                ...diff.updated.map(toMeal),
+                ...diff.added.map(toMeal)
+            ]);
         } catch (e) {
             console.error(e);
+            alert("Ошибка распределения: " + e.message);
         }
     };
 
@@ -385,7 +340,7 @@ export const usePlanning = () => {
             // We fetch the plan for next week first.
             let backupPlan = [];
             try {
-                backupPlan = await fetchPlan(startDateStr, endDateStr);
+                backupPlan = (await fetchPlanCompact(startDateStr, endDateStr)).entries;
             } catch (e) {
                 console.warn("Could not fetch backup plan", e);
                 // Decide if we proceed. Yes, but warn? No, proceed.
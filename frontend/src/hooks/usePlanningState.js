@@ -1,6 +1,6 @@
 import { useState, useEffect, useCallback } from 'react';
 import { fetchRecipes } from '../api/recipes';
-import { fetchPlan } from '../api/plan';
+import { fetchPlanCompact } from '../api/plan';
 import { fetchFamily } from '../api/admin';
 
 export const usePlanningState = () => {
@@ -14,7 +14,7 @@ export const usePlanningState = () => {
     useEffect(() => {
         Promise.all([
             fetchRecipes().catch(console.error),
-            fetchPlan().catch(console.error),
+            fetchPlanCompact().then(data => data.entries).catch(console.error),
             fetchFamily().catch(console.error)
         ]).then(([recipesData, planData, familyData]) => {
             if (Array.isArray(recipesData)) setRecipes(recipesData);
@@ -102,7 +102,7 @@ export const usePlanningState = () => {
 
             const formatDate = (d) => d.toISOString().split('T')[0];
 
-            const data = await fetchPlan(formatDate(nextMonday), formatDate(nextSunday));
+            const { entries: data } = await fetchPlanCompact(formatDate(nextMonday), formatDate(nextSunday));
 
             if (Array.isArray(data)) {
                 const daysMap = {
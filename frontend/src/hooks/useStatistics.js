@@ -1,11 +1,10 @@
 import { useState, useEffect, useMemo } from 'react';
-import { calculateItemStats } from '../utils/stats';
+import { fetchStats } from '../api/stats';
 
 const DAYS = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье'];
 
 export const useStatistics = () => {
-    const [plan, setPlan] = useState([]);
-    const [users, setUsers] = useState([]);
+    const [data, setData] = useState(null);
     const [selectedUser, setSelectedUser] = useState('all');
     const [loading, setLoading] = useState(true);
     const [currentDate, setCurrentDate] = useState(new Date());
@@ -47,25 +46,14 @@ export const useStatistics = () => {
         setCurrentDate(newDate);
     };
 
-    // 1a. Загрузка пользователей (один раз)
-    useEffect(() => {
-        fetch('/api/admin/family')
-            .then(res => res.json())
-            .then(usersData => {
-                setUsers(Array.isArray(usersData) ? usersData : []);
-            })
-            .catch(console.error);
-    }, []);
-
-    // 1b. Загрузка плана (при смене даты)
+    // 1. Загрузка готовой статистики за неделю (один запрос, считается на сервере)
     useEffect(() => {
         setLoading(true);
         const { start, end } = getWeekRange(currentDate);
 
-        fetch(`/api/plan/?start_date=${start}&end_date=${end}`)
-            .then(res => res.json())
-            .then(planData => {
-                setPlan(Array.isArray(planData) ? planData : []);
+        fetchStats(start, end)
+            .then(statsData => {
+                setData(statsData);
                 setLoading(false);
             })
             .catch(err => {
@@ -74,54 +62,39 @@ export const useStatistics = () => {
             });
     }, [currentDate]);
 
-    // 2. Агрегация данных
+    const users = useMemo(() => (data ? data.members.map(g => g.member) : []), [data]);
+
+    // 2. Выбор группы (вся семья / участник) и приведение к формату страницы
     const stats = useMemo(() => {
         const dailyStats = {};
-        let totalCost = 0;
-        let totalCals = 0;
-        let totalProt = 0;
-        let totalFat = 0;
-        let totalCarb = 0;
-
-        // Инициализируем нулями
         DAYS.forEach(day => {
             dailyStats[day] = { cost: 0, cals: 0, prot: 0, fat: 0, carb: 0, itemsCount: 0 };
         });
+        const empty = { daily: dailyStats, total: { cost: 0, cals: 0, prot: 0, fat: 0, carb: 0 } };
+        if (!data) return empty;
 
-        plan.forEach(item => {
-            // Фильтрация по пользователю
-            if (selectedUser !== 'all') {
-                if (item.family_member_id !== parseInt(selectedUser)) return;
-            }
+        const group = selectedUser === 'all'
+            ? data.all
+            : data.members.find(g => g.member.id === parseInt(selectedUser));
+        if (!group) return empty;
 
-            if (dailyStats[item.day_of_week]) {
-                const { cost, cals, prot, fat, carb } = calculateItemStats(item);
-                dailyStats[item.day_of_week].cost += cost;
-                dailyStats[item.day_of_week].cals += cals;
-                dailyStats[item.day_of_week].prot += prot;
-                dailyStats[item.day_of_week].fat += fat;
-                dailyStats[item.day_of_week].carb += carb;
-                dailyStats[item.day_of_week].itemsCount += 1;
-
-                totalCost += cost;
-                totalCals += cals;
-                totalProt += prot;
-                totalFat += fat;
-                totalCarb += carb;
-            }
+        group.days.forEach(d => {
+            dailyStats[d.day_of_week] = {
+                cost: d.cost, cals: d.calories, prot: d.proteins, fat: d.fats, carb: d.carbs, itemsCount: d.items_count
+            };
         });
 
         return {
             daily: dailyStats,
             total: {
-                cost: totalCost,
-                cals: totalCals,
-                prot: totalProt,
-                fat: totalFat,
-                carb: totalCarb
+                cost: group.total.cost,
+                cals: group.total.calories,
+                prot: group.total.proteins,
+                fat: group.total.fats,
+                carb: group.total.carbs
             }
         };
-    }, [plan, selectedUser]);
+    }, [data, selectedUser]);
 
     // 3. Расчет дневного лимита калорий и БЖУ
     const dailyLimit = useMemo(() => {
@@ -152,7 +125,6 @@ export const useStatistics = () => {
     }, [users, selectedUser]);
 
     return {
-        plan,
         users,
         selectedUser,
         setSelectedUser,
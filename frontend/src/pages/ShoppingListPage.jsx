@@ -1,5 +1,7 @@
 import React, { useEffect, useState } from 'react';
 
+const ALL_USERS = '*';
+
 const ShoppingListPage = () => {
   const [items, setItems] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -8,6 +10,7 @@ const ShoppingListPage = () => {
   const [tgUsers, setTgUsers] = useState([]);
   const [selectedUser, setSelectedUser] = useState('');
   const [sending, setSending] = useState(false);
+  const [storing, setStoring] = useState(false);
 
   // --- Date Logic (copied from StatisticsPage) ---
   const [currentDate, setCurrentDate] = useState(() => {
@@ -88,6 +91,31 @@ const ShoppingListPage = () => {
     }));
   };
 
+  // Купленное - в запасы (отмеченные строки или весь список); список пересчитается с учетом запасов
+  const handleMarkBought = async () => {
+    const checkedIds = items.filter(item => checkedItems[item.id]).map(item => item.id);
+    if (checkedIds.length === 0 && !window.confirm("Отметить купленным весь список?")) return;
+
+    setStoring(true);
+    try {
+      const { start, end } = getWeekRange(currentDate);
+      const res = await fetch(`/api/shopping-list/bought?start_date=${start}&end_date=${end}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ line_ids: checkedIds.length > 0 ? checkedIds : null })
+      });
+      if (!res.ok) throw new Error('Failed to mark bought');
+
+      const listRes = await fetch(`/api/shopping-list/?start_date=${start}&end_date=${end}`);
+      setItems(await listRes.json());
+      setCheckedItems({});
+    } catch (e) {
+      alert("Ошибка сети");
+    } finally {
+      setStoring(false);
+    }
+  };
+
   const handleSendTelegram = async () => {
     if (!selectedUser) {
       alert("Выберите получателя");
@@ -106,10 +134,12 @@ const ShoppingListPage = () => {
     try {
       const { start, end } = getWeekRange(currentDate);
       // Pass dates to Telegram endpoint too so it sends the CORRECT list
-      const res = await fetch(`/api/shopping-list/send?start_date=${start}&end_date=${end}`, {
+      // "all" - one broadcast to every Telegram user instead of a request per recipient
+      const toAll = selectedUser === ALL_USERS;
+      const res = await fetch(`/api/shopping-list/${toAll ? 'broadcast' : 'send'}?start_date=${start}&end_date=${end}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ chat_id: selectedUser })
+        body: JSON.stringify(toAll ? {} : { chat_id: selectedUser })
       });
       const data = await res.json();
 
@@ -124,6 +154,7 @@ const ShoppingListPage = () => {
   };
 
   const totalCost = items.reduce((sum, item) => sum + item.estimated_cost, 0);
+  const purchaseCost = items.reduce((sum, item) => sum + (item.purchase_cost ?? item.estimated_cost), 0);
 
   if (loading) return <div className="p-10 text-center text-gray-500">Загрузка списка...</div>;
 
@@ -162,6 +193,7 @@ const ShoppingListPage = () => {
         <div className="text-right">
           <div className="text-sm text-gray-500">Примерная стоимость</div>
           <div className="text-2xl font-bold text-green-600">€{totalCost.toFixed(2)}</div>
+          <div className="text-xs text-gray-500">Целыми упаковками: €{purchaseCost.toFixed(2)}</div>
         </div>
       </div>
 
@@ -207,9 +239,27 @@ const ShoppingListPage = () => {
                     </td>
                     <td className={`px-6 py-4 text-right font-mono transition-all ${isChecked ? 'text-gray-400' : 'text-indigo-600 font-bold'}`}>
                       {item.total_quantity} {item.unit}
+                      {item.purchases?.map(p => (
+                        <div key={p.product_id} className="text-xs font-normal text-gray-500">
+                          {p.packs} × {p.pack_amount} {p.unit}
+                        </div>
+                      ))}
+                      {item.in_pantry > 0 && (
+                        <div className="text-xs font-normal text-gray-400">
+                          есть дома: {item.in_pantry} {item.unit}
+                        </div>
+                      )}
+                      {item.carried_over > 0 && (
+                        <div className="text-xs font-normal text-gray-400">
+                          остаток с прошлой недели: {item.carried_over} {item.unit}
+                        </div>
+                      )}
                     </td>
                     <td className={`px-6 py-4 text-right transition-all ${isChecked ? 'text-gray-300' : 'text-gray-600'}`}>
                       €{item.estimated_cost.toFixed(2)}
+                      {item.purchase_cost !== undefined && (
+                        <div className="text-xs text-gray-400">упаковки: €{item.purchase_cost.toFixed(2)}</div>
+                      )}
                     </td>
                   </tr>
                 );
@@ -227,6 +277,14 @@ const ShoppingListPage = () => {
           <span>🖨</span> Печать / PDF
         </button>
 
+        <button
+          onClick={handleMarkBought}
+          disabled={storing || items.length === 0}
+          className="px-4 py-2 bg-green-50 text-green-700 rounded border border-green-300 hover:bg-green-100 transition-colors flex items-center gap-2 font-medium w-full md:w-auto justify-center disabled:opacity-50"
+        >
+          <span>🏠</span> {storing ? 'Сохранение...' : 'Куплено - в запасы'}
+        </button>
+
         <div className="flex items-center gap-2 w-full md:w-auto">
           {tgUsers.length === 0 ? (
             <span className="text-xs text-gray-400">Добавьте пользователей в Админке для отправки</span>
@@ -240,6 +298,7 @@ const ShoppingListPage = () => {
                 {tgUsers.map(u => (
                   <option key={u.id} value={u.chat_id}>{u.name}</option>
                 ))}
+                {tgUsers.length > 1 && <option value={ALL_USERS}>Всем</option>}
               </select>
 
               <button
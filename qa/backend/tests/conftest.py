@@ -32,3 +32,126 @@ else:
     debug_msg = ["Could not find main.py in common locations. Assuming INTEGRATION TEST mode."]
     debug_msg.append(f"Current Test Dir: {current_test_dir}")
     print("\nDEBUG: " + "\nDEBUG: ".join(debug_msg))
+
+
+# --- Local HTTP stand-in for external services (product feed, Telegram Bot API) ---
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Address under which the backend can reach this test container.
+# In docker it's the container IP; for a backend on the same machine use QA_HOST=127.0.0.1.
+QA_HOST = os.getenv("QA_HOST") or socket.gethostbyname(socket.gethostname())
+# Fixed port: the backend gets the stub's address from its environment (README.md, section 5)
+QA_STUB_PORT = int(os.getenv("QA_STUB_PORT", "8099"))
+
+class StubServer:
+    """
+    Minimal threaded HTTP server. `routes` maps (method, path) to a callable
+    handler(request) -> (status, headers, body). `body` is bytes or an iterable of bytes
+    (sent chunk by chunk). All received requests are recorded in `requests`.
+    """
+
+    def __init__(self, port=0):
+        self.routes = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.body = self.rfile.read(length) if length else b""
+                path, _, self.query = self.path.partition("?")
+                stub.requests.append({"method": method, "path": path, "query": self.query,
+                                      "headers": dict(self.headers), "body": self.body, "time": time.time(),
+                                      "client": self.client_address})
+                route = stub.routes.get((method, path))
+                if route is None:
+                    status, headers, body = 404, {}, b"not found"
+                else:
+                    status, headers, body = route(self)
+
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                if isinstance(body, (bytes, bytearray)):
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for chunk in body:
+                        if chunk:
+                            self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+                    self.wfile.write(b"0\r\n\r\n")
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path="/"):
+        return f"http://{QA_HOST}:{self.server.server_address[1]}{path}"
+
+    def serves(self, url, path):
+        """True if the backend's configured `url` points at `path` of this server."""
+        parts = urlsplit(url or "")
+        return parts.port == self.server.server_address[1] and parts.path.rstrip("/") == path.rstrip("/")
+
+    def reset(self):
+        self.routes.clear()
+        self.requests.clear()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture(scope="session")
+def _stub_server_session():
+    server = StubServer(QA_STUB_PORT)
+    server.start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def stub_server(_stub_server_session):
+    # Один сервер на всю сессию: адрес задан бэкенду при запуске
+    _stub_server_session.reset()
+    yield _stub_server_session
+    _stub_server_session.reset()
+
+# --- Server process model ---
+# Cache hit/miss, per-process stats and query budgets are only observable on a
+# single-process server: with several workers consecutive requests land in
+# different processes (and writes also record cache events for the others).
+
+def server_workers():
+    import requests
+    base_url = os.getenv("API_URL", "http://backend:8000")
+    return requests.get(f"{base_url}/admin/server").json()["cache_sync"]["workers"]
+
+@pytest.fixture
+def single_process():
+    if server_workers() > 1:
+        pytest.skip("observes per-process state; the server runs several workers")
+
+@pytest.fixture
+def multi_process():
+    if server_workers() == 1:
+        pytest.skip("needs a server with several workers (WEB_CONCURRENCY > 1)")
@@ -11,7 +11,8 @@ BASE_URL = os.getenv("API_URL", "http://backend:8000")
 def autofill_fixtures():
     """Create necessary recipes for autofill."""
     # Create product
-    p_resp = requests.post(f"{BASE_URL}/products/", json={"name": "AutoFillProd", "price": 1, "amount": 1, "unit": "kg", "calories": 200, "weight_per_piece": 100})
+    # 200 ккал на 100 г: quantity рецептов ниже - в граммах
+    p_resp = requests.post(f"{BASE_URL}/products/", json={"name": "AutoFillProd", "price": 1, "amount": 1000, "unit": "g", "calories": 200, "weight_per_piece": 100})
     product_id = p_resp.json()["id"]
 
     created_recipes = []
@@ -72,3 +73,136 @@ def test_autofill_week(autofill_fixtures):
     for item in plan:
         requests.delete(f"{BASE_URL}/plan/{item['id']}")
 
+
+@pytest.fixture
+def household():
+    """10 family members."""
+    suffix = "".join(random.choices(string.ascii_letters, k=5))
+    members = [requests.post(f"{BASE_URL}/admin/family", json={
+        "name": f"AutoFillMember_{suffix}_{i}", "color": "blue", "max_calories": 2500
+    }).json() for i in range(10)]
+    yield members
+    ids = {m["id"] for m in members}
+    for item in requests.get(f"{BASE_URL}/plan/").json():
+        if item["family_member_id"] in ids:
+            requests.delete(f"{BASE_URL}/plan/{item['id']}")
+    for m in members:
+        requests.delete(f"{BASE_URL}/admin/family/{m['id']}")
+
+def test_autofill_week_query_count(autofill_fixtures, household):
+    """Occupancy is loaded once and new entries are bulk-inserted: query count does not grow with the household."""
+    today = datetime.date.today()
+    next_monday = today + datetime.timedelta(days=(7 - today.weekday()))
+    soup = next(r for r in requests.get(f"{BASE_URL}/recipes/").json() if r["title"] == "AutoFillSoup")
+    taken = requests.post(f"{BASE_URL}/plan/", json={
+        "day_of_week": "Понедельник", "meal_type": "lunch", "recipe_id": soup["id"], "portions": 1,
+        "family_member_id": household[0]["id"], "date": next_monday.isoformat()
+    }).json()
+
+    first = requests.post(f"{BASE_URL}/plan/autofill_week")
+    second = requests.post(f"{BASE_URL}/plan/autofill_week")
+    assert first.status_code == second.status_code == 200
+    assert int(first.headers["X-Query-Count"]) <= 10
+    assert int(second.headers["X-Query-Count"]) <= 10
+
+    ids = {m["id"] for m in household}
+    plan = requests.get(f"{BASE_URL}/plan/", params={
+        "start_date": next_monday.isoformat(),
+        "end_date": (next_monday + datetime.timedelta(days=6)).isoformat()
+    }).json()
+    slots = [(p["date"], p["meal_type"], p["family_member_id"]) for p in plan if p["family_member_id"] in ids]
+    assert len(slots) == len(set(slots)), "Autofill must not fill an occupied slot"
+    assert len(slots) > 10
+    monday_lunch = [p for p in plan if p["date"] == next_monday.isoformat() and p["meal_type"] == "lunch"
+                    and p["family_member_id"] == household[0]["id"]]
+    assert [p["id"] for p in monday_lunch] == [taken["id"]]
+
+def household_plan(household):
+    ids = {m["id"] for m in household}
+    today = datetime.date.today()
+    next_monday = today + datetime.timedelta(days=(7 - today.weekday()))
+    plan = requests.get(f"{BASE_URL}/plan/", params={
+        "start_date": next_monday.isoformat(),
+        "end_date": (next_monday + datetime.timedelta(days=6)).isoformat()
+    }).json()
+    return [p for p in plan if p["family_member_id"] in ids]
+
+def test_autofill_week_is_reproducible_with_seed(autofill_fixtures, household):
+    params = {"seed": 1234, "time_budget": 10}
+    first = requests.post(f"{BASE_URL}/plan/autofill_week", params=params).json()
+    assert first["seed"] == 1234
+    assert first["stopped_by"] == "iterations"
+    plan = household_plan(household)
+    assert plan
+    for item in plan:
+        requests.delete(f"{BASE_URL}/plan/{item['id']}")
+
+    second = requests.post(f"{BASE_URL}/plan/autofill_week", params=params).json()
+    replay = household_plan(household)
+    assert second["score"] == first["score"]
+
+    def key(p):
+        return (p["date"], p["meal_type"], p["family_member_id"], p["recipe_id"])
+    assert sorted(map(key, replay)) == sorted(map(key, plan))
+
+def test_autofill_week_keeps_member_within_limits(autofill_fixtures):
+    product_id = next(p["id"] for p in requests.get(f"{BASE_URL}/products/").json() if p["name"] == "AutoFillProd")
+    # 250 ккал на порцию в большом котле и 1500 ккал на порцию
+    light = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": "AutoFillLight", "portions": 50, "category": "main",
+        "ingredients": [{"product_id": product_id, "quantity": 6250}]
+    }).json()
+    heavy = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": "AutoFillHeavy", "portions": 1, "category": "main",
+        "ingredients": [{"product_id": product_id, "quantity": 750}]
+    }).json()
+    member = requests.post(f"{BASE_URL}/admin/family", json={
+        "name": "AutoFillDieter", "color": "green", "max_calories": 1000
+    }).json()
+    try:
+        resp = requests.post(f"{BASE_URL}/plan/autofill_week", params={"seed": 1, "time_budget": 10})
+        assert resp.status_code == 200
+        mine = household_plan([member])
+        assert len(mine) == 14
+        assert heavy["id"] not in {p["recipe_id"] for p in mine}
+
+        per_day = {}
+        for p in mine:
+            per_day[p["date"]] = per_day.get(p["date"], 0) + p["recipe"]["calories_per_portion"] * p["portions"]
+        assert all(cals <= 1000 for cals in per_day.values()), per_day
+    finally:
+        for p in household_plan([member]):
+            requests.delete(f"{BASE_URL}/plan/{p['id']}")
+        requests.delete(f"{BASE_URL}/admin/family/{member['id']}")
+
+def test_autofill_week_sees_product_changes(single_process, autofill_fixtures):
+    lean = {"name": "AutoFillLean", "price": 1, "amount": 1000, "unit": "g", "calories": 200}
+    product = requests.post(f"{BASE_URL}/products/", json=lean).json()
+    # 250 ккал на порцию, пока продукт не изменится
+    recipe = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": "AutoFillLeanPot", "portions": 50, "category": "main",
+        "ingredients": [{"product_id": product["id"], "quantity": 6250}]
+    }).json()
+    member = requests.post(f"{BASE_URL}/admin/family", json={
+        "name": "AutoFillDieter", "color": "green", "max_calories": 1000
+    }).json()
+    try:
+        assert requests.post(f"{BASE_URL}/plan/autofill_week", params={"seed": 1}).status_code == 200
+        for p in household_plan([member]):
+            requests.delete(f"{BASE_URL}/plan/{p['id']}")
+        before = requests.get(f"{BASE_URL}/recipes/matrix").json()
+
+        # Теперь 2500 ккал на порцию: матрица должна забыть старое значение
+        resp = requests.put(f"{BASE_URL}/products/{product['id']}", json={**lean, "calories": 2000})
+        assert resp.status_code == 200
+        assert requests.get(f"{BASE_URL}/recipes/matrix").json()["invalidations"] > before["invalidations"]
+
+        assert requests.post(f"{BASE_URL}/plan/autofill_week", params={"seed": 1}).status_code == 200
+        mine = household_plan([member])
+        assert len(mine) == 14
+        assert recipe["id"] not in {p["recipe_id"] for p in mine}
+    finally:
+        for p in household_plan([member]):
+            requests.delete(f"{BASE_URL}/plan/{p['id']}")
+        requests.delete(f"{BASE_URL}/admin/family/{member['id']}")
+        requests.delete(f"{BASE_URL}/products/{product['id']}")
@@ -0,0 +1,100 @@
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+def fetch_all_pages(url, params, limit):
+    """Follows X-Next-Cursor until the last page; returns (items, pages, totals)."""
+    items, pages, totals = [], 0, set()
+    cursor = None
+    while True:
+        query = dict(params, limit=limit)
+        if cursor:
+            query["cursor"] = cursor
+        resp = requests.get(url, params=query)
+        assert resp.status_code == 200, resp.text
+        page = resp.json()
+        assert len(page) <= limit
+        items.extend(page)
+        pages += 1
+        totals.add(resp.headers["X-Total-Count"])
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            return items, pages, totals
+        assert pages < 1000, "Pagination does not terminate"
+
+@pytest.fixture
+def paged_products():
+    prefix = f"PageProd_{uuid.uuid4().hex[:6]}"
+    created = []
+    for i in range(5):
+        r = requests.post(f"{BASE_URL}/products/", json={
+            "name": f"{prefix}_{i}", "price": 1, "amount": 100, "unit": "g", "calories": 10
+        })
+        assert r.status_code == 200
+        created.append(r.json())
+    yield prefix, created
+    for p in created:
+        requests.delete(f"{BASE_URL}/products/{p['id']}")
+
+def test_products_keyset_pagination(paged_products):
+    prefix, created = paged_products
+    items, pages, totals = fetch_all_pages(f"{BASE_URL}/products/", {"name": prefix}, limit=2)
+    assert [p["id"] for p in items] == sorted(p["id"] for p in created)
+    assert pages == 3
+    assert totals == {"5"}
+
+def test_unpaginated_listing_still_returns_everything(paged_products):
+    prefix, created = paged_products
+    resp = requests.get(f"{BASE_URL}/products/", params={"name": prefix})
+    assert len(resp.json()) == len(created)
+    assert "X-Next-Cursor" not in resp.headers
+
+def test_recipes_keyset_pagination_is_stable(paged_products):
+    _, products = paged_products
+    recipes = [requests.post(f"{BASE_URL}/recipes/", json={
+        "title": f"PageRecipe_{i}", "portions": 1,
+        "ingredients": [{"product_id": products[0]["id"], "quantity": 100}]
+    }).json() for i in range(3)]
+    try:
+        items, _, _ = fetch_all_pages(f"{BASE_URL}/recipes/", {}, limit=2)
+        ids = [r["id"] for r in items]
+        assert ids == sorted(set(ids)), "Pages must not overlap and must be ordered by id"
+        assert {r["id"] for r in recipes} <= set(ids)
+    finally:
+        for r in recipes:
+            requests.delete(f"{BASE_URL}/recipes/{r['id']}")
+
+def test_plan_pagination_by_date_then_id(paged_products):
+    _, products = paged_products
+    recipe = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": "PagePlanRecipe", "portions": 1,
+        "ingredients": [{"product_id": products[0]["id"], "quantity": 100}]
+    }).json()
+    created = []
+    try:
+        # Даты вставляются не по порядку: выдача все равно идет по (date, id)
+        for date in ["2032-05-03", "2032-05-01", "2032-05-02", "2032-05-01", "2032-05-03"]:
+            r = requests.post(f"{BASE_URL}/plan/", json={
+                "day_of_week": "Понедельник", "meal_type": "lunch",
+                "recipe_id": recipe["id"], "portions": 1, "date": date
+            })
+            created.append(r.json()["id"])
+
+        params = {"start_date": "2032-05-01", "end_date": "2032-05-03"}
+        items, pages, totals = fetch_all_pages(f"{BASE_URL}/plan/", params, limit=2)
+        assert totals == {"5"} and pages == 3
+        keys = [(item["date"], item["id"]) for item in items]
+        assert keys == sorted(keys)
+        assert sorted(item["id"] for item in items) == sorted(created)
+    finally:
+        for pid in created:
+            requests.delete(f"{BASE_URL}/plan/{pid}")
+        requests.delete(f"{BASE_URL}/recipes/{recipe['id']}")
+
+def test_invalid_cursor_and_limit():
+    assert requests.get(f"{BASE_URL}/products/", params={"limit": 2, "cursor": "garbage!"}).status_code == 400
+    assert requests.get(f"{BASE_URL}/plan/", params={"limit": 2, "cursor": "WzFd"}).status_code == 400
+    assert requests.get(f"{BASE_URL}/recipes/", params={"limit": 0}).status_code == 422
@@ -0,0 +1,131 @@
+import pytest
+import requests
+import os
+import uuid
+import datetime
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+WEEK = {"start_date": "2039-05-09", "end_date": "2039-05-15"}
+DAY = "2039-05-11"
+
+@pytest.fixture
+def pantry_plan():
+    product = requests.post(f"{BASE_URL}/products/", json={
+        "name": f"PantryRice_{uuid.uuid4().hex[:6]}", "price": 3.0, "amount": 1000, "unit": "g", "calories": 350
+    }).json()
+    recipe = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": "PantryPilaf", "portions": 1,
+        "ingredients": [{"product_id": product["id"], "quantity": 400}]
+    }).json()
+    entries = []
+
+    def plan(date):
+        e = requests.post(f"{BASE_URL}/plan/", json={
+            "day_of_week": "Среда", "meal_type": "dinner", "recipe_id": recipe["id"], "portions": 1, "date": date
+        }).json()
+        entries.append(e["id"])
+        return e
+
+    plan(DAY)
+    yield {"product": product, "plan": plan}
+
+    for eid in entries:
+        requests.delete(f"{BASE_URL}/plan/{eid}")
+    requests.delete(f"{BASE_URL}/recipes/{recipe['id']}")
+    requests.delete(f"{BASE_URL}/products/{product['id']}")
+
+def set_stock(product, quantity):
+    resp = requests.put(f"{BASE_URL}/pantry/{product['id']}", json={"quantity": quantity})
+    assert resp.status_code == 200
+    return resp.json()
+
+def stock_of(product):
+    resp = requests.get(f"{BASE_URL}/pantry/")
+    assert resp.status_code == 200
+    return next((i["quantity"] for i in resp.json() if i["product_id"] == product["id"]), None)
+
+def consume():
+    resp = requests.post(f"{BASE_URL}/pantry/consume")
+    assert resp.status_code == 200
+    return resp.json()["consumed"]
+
+def line_for(product):
+    resp = requests.get(f"{BASE_URL}/shopping-list/", params=WEEK)
+    assert resp.status_code == 200
+    return resp.headers["X-Cache"], next(i for i in resp.json() if product["id"] in i["product_ids"])
+
+def test_pantry_crud(pantry_plan):
+    product = pantry_plan["product"]
+    item = set_stock(product, 250)
+    assert item["quantity"] == 250
+    assert item["product"]["name"] == product["name"]
+    assert stock_of(product) == 250
+
+    assert requests.put(f"{BASE_URL}/pantry/{product['id']}", json={"quantity": -1}).status_code == 422
+    assert requests.put(f"{BASE_URL}/pantry/999999999", json={"quantity": 1}).status_code == 404
+
+    assert requests.delete(f"{BASE_URL}/pantry/{product['id']}").status_code == 200
+    assert stock_of(product) is None
+    assert requests.delete(f"{BASE_URL}/pantry/{product['id']}").status_code == 404
+
+def test_stock_is_netted_against_the_list(pantry_plan):
+    product = pantry_plan["product"]
+    _, line = line_for(product)
+    assert line["packs_to_buy"] == 1
+    assert line["in_pantry"] == 0
+
+    set_stock(product, 500)
+    status, line = line_for(product)
+    assert status == "MISS", "Pantry change must invalidate the cached list"
+    assert line["total_quantity"] == 400
+    assert line["in_pantry"] == 400
+    assert line["packs_to_buy"] == 0
+    assert abs(line["leftover"] - 100) < 0.01
+
+    set_stock(product, 300)
+    _, line = line_for(product)
+    assert line["in_pantry"] == 300
+    assert line["packs_to_buy"] == 1
+
+def test_marking_bought_fills_the_pantry(pantry_plan):
+    product = pantry_plan["product"]
+    _, line = line_for(product)
+    assert line["packs_to_buy"] == 1
+
+    resp = requests.post(f"{BASE_URL}/shopping-list/bought", params=WEEK, json={"line_ids": [line["id"]]})
+    assert resp.status_code == 200
+    assert stock_of(product) == 1000
+
+    _, line = line_for(product)
+    assert line["packs_to_buy"] == 0
+    assert line["in_pantry"] == 400
+    assert abs(line["leftover"] - 600) < 0.01
+
+def test_past_meals_are_taken_from_the_pantry_once(pantry_plan):
+    product = pantry_plan["product"]
+    set_stock(product, 1000)
+    today = datetime.date.today()
+
+    past = pantry_plan["plan"]((today - datetime.timedelta(days=1)).isoformat())
+    # Чтения ничего не списывают
+    assert stock_of(product) == 1000
+    line_for(product)
+    assert stock_of(product) == 1000, "GET requests must not change the pantry"
+
+    assert consume() >= 1
+    assert stock_of(product) == 600
+    assert consume() == 0
+    assert stock_of(product) == 600, "A meal must be taken from the pantry only once"
+
+    # Сегодняшнее блюдо еще не съедено, но к началу диапазона запасы на него уйдут
+    pantry_plan["plan"](today.isoformat())
+    assert stock_of(product) == 600
+    _, line = line_for(product)
+    assert line["in_pantry"] == 200
+    assert line["packs_to_buy"] == 1
+
+    # Правка списанного блюда запасы не возвращает (API_DOCS.md)
+    requests.patch(f"{BASE_URL}/plan/{past['id']}", json={"portions": 2})
+    consume()
+    assert stock_of(product) == 600
@@ -72,3 +72,40 @@ def test_add_and_remove_plan_item(recipe_fixture):
     resp_plan_after = requests.get(f"{BASE_URL}/plan/")
     plan_items_after = resp_plan_after.json()
     assert not any(i["id"] == item_id for i in plan_items_after)
+
+def test_batch_update_touches_only_what_changed(single_process, recipe_fixture):
+    week = {"start_date": "2041-03-04", "end_date": "2041-03-10"}
+
+    def item(date, meal_type, portions=1):
+        return {"day_of_week": "Понедельник", "meal_type": meal_type, "recipe_id": recipe_fixture["id"],
+                "portions": portions, "date": date}
+
+    items = [item("2041-03-04", "lunch"), item("2041-03-04", "dinner"),
+             item("2041-03-05", "lunch"), item("2041-03-10", "dinner")]
+    try:
+        first = requests.post(f"{BASE_URL}/plan/batch", json=items).json()
+        assert len(first["added"]) == 4 and first["updated"] == [] and first["removed"] == []
+        ids = {(e["date"], e["meal_type"]): e["id"] for e in first["added"]}
+
+        # Блюдо перенесено на другой день, у другого изменены порции
+        items[1] = item("2041-03-06", "dinner")
+        items[2] = item("2041-03-05", "lunch", portions=3)
+        resp = requests.post(f"{BASE_URL}/plan/batch", json=items)
+        assert resp.status_code == 200
+        diff = resp.json()
+        assert diff["added"] == [] and diff["removed"] == []
+        assert diff["unchanged"] == 2
+        updated = {e["id"]: e for e in diff["updated"]}
+        assert updated[ids[("2041-03-04", "dinner")]]["date"] == "2041-03-06"
+        assert updated[ids[("2041-03-05", "lunch")]]["portions"] == 3
+        assert int(resp.headers["X-Query-Count"]) <= 5
+
+        # Заменяется диапазон от первой до последней даты пакета
+        diff = requests.post(f"{BASE_URL}/plan/batch", json=[items[0], items[1], items[3]]).json()
+        assert diff["removed"] == [ids[("2041-03-05", "lunch")]]
+        assert diff["unchanged"] == 3
+
+        plan = requests.get(f"{BASE_URL}/plan/", params=week).json()
+        assert sorted(p["id"] for p in plan) == sorted(v for k, v in ids.items() if k != ("2041-03-05", "lunch"))
+    finally:
+        requests.delete(f"{BASE_URL}/plan/", params=week)
@@ -0,0 +1,69 @@
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+@pytest.fixture
+def week_plan():
+    """Two recipes planned many times over one far-future week."""
+    product = requests.post(f"{BASE_URL}/products/", json={
+        "name": f"CompactProd_{uuid.uuid4().hex[:6]}",
+        "price": 5, "amount": 1000, "unit": "g", "calories": 150, "proteins": 10
+    }).json()
+    recipes = [requests.post(f"{BASE_URL}/recipes/", json={
+        "title": f"CompactRecipe_{i}", "portions": 2,
+        "ingredients": [{"product_id": product["id"], "quantity": 300 + 100 * i}]
+    }).json() for i in range(2)]
+
+    entries = []
+    for day in range(7):
+        for slot in range(4):
+            r = requests.post(f"{BASE_URL}/plan/", json={
+                "day_of_week": "Понедельник", "meal_type": "lunch",
+                "recipe_id": recipes[slot % 2]["id"], "portions": 1,
+                "date": f"2034-02-{day + 1:02d}"
+            })
+            entries.append(r.json()["id"])
+
+    yield {"start_date": "2034-02-01", "end_date": "2034-02-07"}, recipes, entries
+
+    for pid in entries:
+        requests.delete(f"{BASE_URL}/plan/{pid}")
+    for r in recipes:
+        requests.delete(f"{BASE_URL}/recipes/{r['id']}")
+    requests.delete(f"{BASE_URL}/products/{product['id']}")
+
+def test_compact_plan_matches_full_plan(week_plan):
+    params, recipes, entries = week_plan
+    full = requests.get(f"{BASE_URL}/plan/", params=params)
+    compact = requests.get(f"{BASE_URL}/plan/", params=dict(params, compact="true"))
+    assert compact.status_code == 200, compact.text
+    data = compact.json()
+
+    assert [e["id"] for e in data["entries"]] == [e["id"] for e in full.json()]
+    assert set(data["recipes"]) == {str(r["id"]) for r in recipes}
+
+    for item in full.json():
+        side = data["recipes"][str(item["recipe_id"])]
+        for key in ["total_calories", "total_cost", "calories_per_portion", "portions", "title"]:
+            assert side[key] == item["recipe"][key]
+        assert "ingredients" not in side
+
+    assert len(compact.content) * 3 < len(full.content), "Compact payload must be much smaller"
+
+def test_compact_plan_query_count_is_small(week_plan):
+    params, _, _ = week_plan
+    resp = requests.get(f"{BASE_URL}/plan/", params=dict(params, compact="true"))
+    # Записи + рецепты, без подгрузки состава и продуктов
+    assert int(resp.headers["X-Query-Count"]) <= 2
+
+def test_compact_plan_supports_pagination(week_plan):
+    params, _, entries = week_plan
+    resp = requests.get(f"{BASE_URL}/plan/", params=dict(params, compact="true", limit=10))
+    data = resp.json()
+    assert len(data["entries"]) == 10
+    assert resp.headers["X-Total-Count"] == str(len(entries))
+    assert resp.headers.get("X-Next-Cursor")
+    assert {str(e["recipe_id"]) for e in data["entries"]} == set(data["recipes"])
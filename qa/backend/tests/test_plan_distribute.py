@@ -0,0 +1,82 @@
+import pytest
+import requests
+import os
+import datetime
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+TODAY = datetime.date.today()
+NEXT_MONDAY = TODAY + datetime.timedelta(days=7 - TODAY.weekday())
+LAST_MONDAY = NEXT_MONDAY - datetime.timedelta(days=14)
+WEEK = {"start_date": NEXT_MONDAY.isoformat(), "end_date": (NEXT_MONDAY + datetime.timedelta(days=6)).isoformat()}
+
+@pytest.fixture
+def distribution():
+    recipes = {}
+    for title, category, portions in [
+        ("DistOatmeal", "breakfast", 4), ("DistPancakes", "breakfast", 4),
+        ("DistSoup", "soup", 8), ("DistStew", "main", 6), ("DistHidden", "main", 6),
+    ]:
+        recipes[title] = requests.post(f"{BASE_URL}/recipes/", json={
+            "title": title, "portions": portions, "category": category, "ingredients": []
+        }).json()
+    member = requests.post(f"{BASE_URL}/admin/family", json={"name": "DistEater", "color": "blue"}).json()
+    history = [requests.post(f"{BASE_URL}/plan/", json={
+        "day_of_week": "Понедельник", "meal_type": "breakfast", "recipe_id": recipes["DistPancakes"]["id"],
+        "portions": 1, "family_member_id": member["id"], "date": (LAST_MONDAY + datetime.timedelta(days=d)).isoformat()
+    }).json() for d in range(2)]
+    yield {"recipes": recipes, "member": member}
+
+    requests.delete(f"{BASE_URL}/plan/", params=WEEK)
+    for item in history:
+        requests.delete(f"{BASE_URL}/plan/{item['id']}")
+    requests.delete(f"{BASE_URL}/admin/family/{member['id']}")
+    for recipe in recipes.values():
+        requests.delete(f"{BASE_URL}/recipes/{recipe['id']}")
+
+def distribute(recipes, seed):
+    return requests.post(f"{BASE_URL}/plan/distribute", json={
+        "hidden_recipe_ids": [recipes["DistHidden"]["id"]], "portions": {str(recipes["DistSoup"]["id"]): 12},
+        "seed": seed
+    })
+
+def test_distribute_writes_next_week(distribution):
+    recipes, member = distribution["recipes"], distribution["member"]
+    resp = distribute(recipes, 7)
+    assert resp.status_code == 200
+    diff = resp.json()
+    assert diff["seed"] == 7
+    assert diff["added"]
+
+    plan = requests.get(f"{BASE_URL}/plan/", params={**WEEK, "compact": "true"}).json()["entries"]
+    assert len(plan) == len(diff["added"]) + diff["unchanged"]
+    assert {e["id"] for e in diff["added"]} <= {e["id"] for e in plan}
+    assert recipes["DistHidden"]["id"] not in {e["recipe_id"] for e in plan}
+
+    mine = [e for e in plan if e["family_member_id"] == member["id"]]
+    breakfasts = sorted((e for e in mine if e["meal_type"] == "breakfast"), key=lambda e: e["date"])
+    assert len(breakfasts) == 7
+    # Прошлонедельные завтраки повторяются первыми
+    assert [e["recipe_id"] for e in breakfasts[:2]] == [recipes["DistPancakes"]["id"]] * 2
+    assert len([e for e in mine if e["meal_type"] in ("lunch", "dinner")]) == 14
+    assert all(e["portions"] == 1 for e in mine)
+
+def test_distribute_returns_only_the_diff(distribution):
+    recipes = distribution["recipes"]
+    first = distribute(recipes, 11).json()
+    total = len(first["added"]) + first["unchanged"]
+
+    resp = distribute(recipes, 11)
+    assert resp.status_code == 200
+    again = resp.json()
+    assert again["added"] == [] and again["removed"] == []
+    assert again["unchanged"] == total
+    assert int(resp.headers["X-Query-Count"]) <= 8
+
+    # Одно блюдо убрано вручную - возвращается только оно
+    removed = first["added"][0]
+    requests.delete(f"{BASE_URL}/plan/{removed['id']}")
+    diff = distribute(recipes, 11).json()
+    assert diff["removed"] == []
+    assert [(e["date"], e["meal_type"], e["recipe_id"]) for e in diff["added"]] == \
+        [(removed["date"], removed["meal_type"], removed["recipe_id"])]
@@ -0,0 +1,88 @@
+import pytest
+import requests
+import os
+import re
+import uuid
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+@pytest.fixture
+def search_products():
+    """Products with a unique marker word so results don't depend on other data."""
+    marker = f"srch{uuid.uuid4().hex[:6]}"
+    names = [
+        f"Молоко {marker} 3.2%",
+        f"МОЛОКО {marker} овсяное",
+        f"Сливки {marker} молочные",
+        f"Ёжевика {marker}",
+        f"Сыр {marker} Гауда",
+    ]
+    created = []
+    for name in names:
+        r = requests.post(f"{BASE_URL}/products/", json={
+            "name": name, "price": 1, "amount": 1000, "unit": "g", "calories": 50
+        })
+        assert r.status_code == 200
+        created.append(r.json())
+
+    yield marker, created
+
+    for p in created:
+        requests.delete(f"{BASE_URL}/products/{p['id']}")
+
+def search(q, limit=20):
+    resp = requests.get(f"{BASE_URL}/products/search", params={"q": q, "limit": limit})
+    assert resp.status_code == 200, resp.text
+    return [p["name"] for p in resp.json()]
+
+def test_search_cyrillic_case_and_prefix(search_products):
+    marker, _ = search_products
+    # Регистр кириллицы не важен, последнее слово ищется как префикс
+    found = search(f"{marker} мол")
+    assert f"Молоко {marker} 3.2%" in found
+    assert f"МОЛОКО {marker} овсяное" in found
+    assert f"Сливки {marker} молочные" in found
+    assert not any("Сыр" in n for n in found)
+
+    # ё и е не различаются
+    assert search(f"{marker} ежев") == [f"Ёжевика {marker}"]
+
+def test_search_ranking_and_limit(search_products):
+    marker, _ = search_products
+    found = search(f"{marker} молоко")
+    assert set(found[:2]) == {f"Молоко {marker} 3.2%", f"МОЛОКО {marker} овсяное"}
+    assert len(search(marker, limit=2)) == 2
+
+def test_search_tolerates_typos(search_products):
+    marker, _ = search_products
+    found = search(f"{marker[:-1]}x гауда")[:1] + search(f"{marker} гаудо")
+    assert f"Сыр {marker} Гауда" in found
+
+def test_search_index_follows_updates(search_products):
+    marker, created = search_products
+    product = created[-1]
+    payload = {k: product[k] for k in ["price", "unit", "amount", "calories"]}
+    payload["name"] = f"Творог {marker}"
+    assert requests.put(f"{BASE_URL}/products/{product['id']}", json=payload).status_code == 200
+
+    assert search(f"{marker} твор") == [f"Творог {marker}"]
+    assert f"Сыр {marker} Гауда" not in search(f"{marker} гауда")
+
+    requests.delete(f"{BASE_URL}/products/{created[0]['id']}")
+    assert f"Молоко {marker} 3.2%" not in search(f"{marker} молоко")
+
+def test_listing_name_filter_is_case_insensitive(search_products):
+    marker, _ = search_products
+    names = [p["name"] for p in requests.get(f"{BASE_URL}/products/", params={"name": f"молоко {marker}"}).json()]
+    assert sorted(names) == sorted([f"Молоко {marker} 3.2%", f"МОЛОКО {marker} овсяное"])
+
+def test_listing_name_filter_short_term_matches_word_starts(search_products):
+    marker, _ = search_products
+    resp = requests.get(f"{BASE_URL}/products/", params={"name": "ЁЖ"})
+    assert resp.status_code == 200
+    assert f"Ёжевика {marker}" in [p["name"] for p in resp.json()]
+
+    names = [p["name"] for p in requests.get(f"{BASE_URL}/products/", params={"name": "мо"}).json()]
+    assert f"Сливки {marker} молочные" in names
+    assert f"Сыр {marker} Гауда" not in names
+    assert all(any(w.startswith("мо") for w in re.findall(r"\w+", n.lower())) for n in names), names
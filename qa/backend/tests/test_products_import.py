@@ -0,0 +1,290 @@
+import pytest
+import requests
+import os
+import json
+import uuid
+from urllib.parse import urlsplit
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+# Feed size for the import benchmark; raise to 20000 to reproduce the production feed
+IMPORT_ROWS = int(os.getenv("QA_IMPORT_ROWS", "2000"))
+# Нижняя граница скорости импорта, строк/с - на порядок ниже обычной, ловит только деградацию
+MIN_ROWS_PER_SECOND = float(os.getenv("QA_MIN_IMPORT_RATE", "1000"))
+
+def make_feed(prefix, count, price=1.0):
+    return [{
+        "name": f"{prefix}_{i}",
+        "price": price,
+        "amount": 1000,
+        "unit": "g",
+        "calories": 100 + i % 50,
+        "proteins": 5,
+        "fats": 3,
+        "carbs": 10
+    } for i in range(count)]
+
+# Путь фида на заглушке: бэкенд запущен с PRODUCT_FEED_URL=http://<QA host>:8099/feed (README.md)
+FEED_PATH = "/feed"
+
+def feed_url():
+    return requests.get(f"{BASE_URL}/admin/products/feed-url").json()["url"]
+
+@pytest.fixture
+def feed(stub_server):
+    """The stub server, if the backend imports its product feed from it."""
+    if not stub_server.serves(feed_url(), FEED_PATH):
+        pytest.skip(f"the backend must be started with PRODUCT_FEED_URL pointing at {stub_server.url(FEED_PATH)}")
+    return stub_server
+
+def run_import(**params):
+    return requests.post(f"{BASE_URL}/products/import", params=params)
+
+def cleanup_products(prefix):
+    items = requests.get(f"{BASE_URL}/products/", params={"name": prefix}).json()
+    for p in items:
+        if p["name"].startswith(prefix):
+            requests.delete(f"{BASE_URL}/products/{p['id']}")
+
+@pytest.fixture
+def feed_prefix():
+    prefix = f"ImportBench_{uuid.uuid4().hex[:6]}"
+    yield prefix
+    cleanup_products(prefix)
+
+def serve_json(feed, data):
+    body = json.dumps(data).encode("utf-8")
+    feed.routes[("GET", FEED_PATH)] = lambda req: (200, {"Content-Type": "application/json"}, body)
+
+def test_bulk_import_counts_and_throughput(feed, feed_prefix):
+    rows = make_feed(feed_prefix, IMPORT_ROWS)
+    rows.append({"price": 1})  # no name -> skipped
+    serve_json(feed, rows)
+
+    resp = run_import()
+    assert resp.status_code == 200, resp.text
+    result = resp.json()
+    assert result["created"] == IMPORT_ROWS
+    assert result["updated"] == 0
+    assert result["skipped"] == 1
+    assert result["rows_per_second"] >= MIN_ROWS_PER_SECOND, result
+
+    # Second run: 10 price changes, everything else unchanged
+    for item in rows[:10]:
+        item["price"] = 2.0
+    serve_json(feed, rows)
+
+    resp = run_import()
+    assert resp.status_code == 200, resp.text
+    result = resp.json()
+    assert result["created"] == 0
+    assert result["updated"] == 10
+    assert result["skipped"] == IMPORT_ROWS - 10 + 1
+    # Неизмененные строки только сравниваются - быстрее вставки
+    assert result["rows_per_second"] >= 5 * MIN_ROWS_PER_SECOND, result
+
+    found = requests.get(f"{BASE_URL}/products/", params={"name": f"{feed_prefix}_0"}).json()
+    exact = [p for p in found if p["name"] == f"{feed_prefix}_0"]
+    assert len(exact) == 1, "Import must not duplicate products by name"
+    assert exact[0]["price"] == 2.0
+
+def test_import_updates_dependent_recipes(feed, feed_prefix):
+    rows = make_feed(feed_prefix, 3)
+    serve_json(feed, rows)
+    assert run_import().status_code == 200
+
+    product = next(p for p in requests.get(f"{BASE_URL}/products/", params={"name": feed_prefix}).json()
+                   if p["name"] == f"{feed_prefix}_0")
+    recipe = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": "ImportDependentRecipe", "portions": 1,
+        "ingredients": [{"product_id": product["id"], "quantity": 1000}]
+    }).json()
+    try:
+        assert abs(recipe["total_cost"] - 1.0) < 0.01
+
+        rows[0]["price"] = 3.0
+        serve_json(feed, rows)
+        assert run_import().json()["updated"] == 1
+
+        recipes = requests.get(f"{BASE_URL}/recipes/").json()
+        updated = next(r for r in recipes if r["id"] == recipe["id"])
+        assert abs(updated["total_cost"] - 3.0) < 0.01
+    finally:
+        requests.delete(f"{BASE_URL}/recipes/{recipe['id']}")
+
+# --- Streaming ingestion ---
+
+# Large generated feed: many rows over a small set of names (keeps cleanup cheap)
+STREAM_ROWS = int(os.getenv("QA_STREAM_ROWS", "30000"))
+STREAM_NAMES = 300
+
+def feed_row(prefix, i):
+    # Each pass over the names changes the price, so repeated names are real updates
+    return {"name": f"{prefix}_{i % STREAM_NAMES}", "price": float(i // STREAM_NAMES),
+            "amount": 1000, "unit": "g", "calories": 100}
+
+def stream_feed(prefix, rows, fmt, fail_after=None):
+    """Yields the feed in small chunks; with fail_after raises mid-stream (connection drop)."""
+    if fmt == "json":
+        yield b"["
+    for i in range(rows):
+        if fail_after is not None and i == fail_after:
+            raise ConnectionError("feed interrupted")
+        line = json.dumps(feed_row(prefix, i)).encode()
+        if fmt == "json":
+            yield (b"," if i else b"") + line
+        else:
+            yield line + b"\n"
+    if fmt == "json":
+        yield b"]"
+
+@pytest.mark.parametrize("fmt", ["json", "ndjson"])
+def test_streaming_import_large_feed(feed, feed_prefix, fmt):
+    feed.routes[("GET", FEED_PATH)] = lambda req: (
+        200, {"Content-Type": "application/json"}, stream_feed(feed_prefix, STREAM_ROWS, fmt))
+
+    resp = run_import(batch_size=1000)
+    assert resp.status_code == 200, resp.text
+    result = resp.json()
+    assert result["rows"] == STREAM_ROWS
+    assert result["resumed_from"] == 0
+    assert result["created"] == STREAM_NAMES
+    assert result["created"] + result["updated"] + result["skipped"] == STREAM_ROWS
+    assert result["rows_per_second"] >= 5 * MIN_ROWS_PER_SECOND, result
+
+    last = feed_row(feed_prefix, STREAM_ROWS - 1)
+    found = [p for p in requests.get(f"{BASE_URL}/products/", params={"name": last["name"]}).json()
+             if p["name"] == last["name"]]
+    assert len(found) == 1 and found[0]["price"] == last["price"]
+
+def test_interrupted_download_imports_nothing(feed, feed_prefix):
+    feed.routes[("GET", FEED_PATH)] = lambda req: (
+        200, {"Content-Type": "application/json"}, stream_feed(feed_prefix, 5000, "ndjson", fail_after=2500))
+
+    resp = run_import()
+    assert resp.status_code == 500, "Interrupted feed must fail"
+    assert requests.get(f"{BASE_URL}/products/", params={"name": feed_prefix}).json() == []
+
+def test_streaming_import_resumes_from_checkpoint(feed, feed_prefix):
+    rows, batch = 5000, 1000
+    state = {"calls": 0}
+
+    def reply(req):
+        state["calls"] += 1
+        body = b"".join(stream_feed(feed_prefix, rows, "ndjson"))
+        if state["calls"] == 1:
+            # Corrupted line in the middle: processing fails after two committed batches
+            lines = body.split(b"\n")
+            lines[2500] = b'{"name": '
+            body = b"\n".join(lines)
+        # Same feed version both times
+        return 200, {"Content-Type": "application/x-ndjson", "ETag": f'"{feed_prefix}"'}, body
+
+    feed.routes[("GET", FEED_PATH)] = reply
+    first = run_import(batch_size=batch)
+    assert first.status_code == 500, "Corrupted feed must fail"
+
+    second = run_import(batch_size=batch)
+    assert second.status_code == 200, second.text
+    result = second.json()
+    assert result["resumed_from"] == 2000
+    assert result["rows"] == rows
+    assert result["created"] + result["updated"] + result["skipped"] == rows - 2000
+
+# --- Conditional / incremental fetch ---
+
+def test_conditional_fetch_etag(feed, feed_prefix):
+    body = json.dumps(make_feed(feed_prefix, 5)).encode()
+
+    # Фид на заглушке общий для всех тестов - версия своя у каждого
+    etag = f'"{feed_prefix}"'
+
+    def reply(req):
+        if req.headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"Content-Type": "application/json", "ETag": etag}, body
+
+    feed.routes[("GET", FEED_PATH)] = reply
+    first = run_import().json()
+    assert first["created"] == 5 and first["not_modified"] is False
+
+    second = run_import().json()
+    assert second["not_modified"] is True
+    assert feed.requests[-1]["headers"].get("If-None-Match") == etag
+
+def test_unchanged_content_hash_is_noop(feed, feed_prefix):
+    # Source without validators: the content hash detects that nothing changed
+    serve_json(feed, make_feed(feed_prefix, 5))
+    first = run_import().json()
+    assert first["created"] == 5
+
+    second = run_import().json()
+    assert second["not_modified"] is True
+    assert second["created"] == second["updated"] == second["skipped"] == 0
+
+def test_delta_mode_uses_since(feed, feed_prefix):
+    full = make_feed(feed_prefix, 5)
+
+    def reply(req):
+        headers = {"Content-Type": "application/json", "X-Supports-Since": "true"}
+        if "since=" in req.query:
+            changed = dict(full[0], price=9.0)
+            return 200, headers, json.dumps([changed]).encode()
+        return 200, headers, json.dumps(full).encode()
+
+    feed.routes[("GET", FEED_PATH)] = reply
+    first = run_import().json()
+    assert first["created"] == 5 and first["delta"] is False
+
+    second = run_import().json()
+    assert second["delta"] is True
+    assert "since=" in feed.requests[-1]["query"]
+    assert second["updated"] == 1 and second["rows"] == 1
+
+def test_products_since_filter():
+    resp = requests.get(f"{BASE_URL}/products/", params={"since": "2999-01-01T00:00:00"})
+    assert resp.status_code == 200
+    assert resp.json() == []
+    assert resp.headers.get("X-Supports-Since") == "true"
+
+def test_imports_share_keep_alive_connections(single_process, feed, feed_prefix):
+    serve_json(feed, make_feed(feed_prefix, 5))
+    for _ in range(3):
+        assert run_import().status_code == 200
+
+    clients = {r["client"] for r in feed.requests if r["path"] == FEED_PATH}
+    assert len([r for r in feed.requests if r["path"] == FEED_PATH]) == 3
+    assert len(clients) == 1, "every import opened a new connection"
+
+    host = urlsplit(feed_url()).netloc
+    metrics = requests.get(f"{BASE_URL}/admin/http/metrics").json()["hosts"][host]
+    assert metrics["requests"] >= 3
+    assert metrics["statuses"]["200"] >= 1
+    assert metrics["latency_ms"]["p95"] is not None
+
+def import_after_one_failure(feed, feed_prefix):
+    body = json.dumps(make_feed(feed_prefix, 5)).encode()
+    replies = [(503, {}, b"busy"), (200, {"Content-Type": "application/json"}, body)]
+    feed.routes[("GET", FEED_PATH)] = lambda req: replies.pop(0) if len(replies) > 1 else replies[0]
+    return run_import()
+
+def test_unavailable_source_is_retried(feed, feed_prefix):
+    resp = import_after_one_failure(feed, feed_prefix)
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["created"] == 5
+    assert len([r for r in feed.requests if r["path"] == FEED_PATH]) == 2
+
+def test_retries_are_counted_in_host_metrics(single_process, feed, feed_prefix):
+    # Метрики у каждого процесса свои
+    assert import_after_one_failure(feed, feed_prefix).status_code == 200
+    host = urlsplit(feed_url()).netloc
+    assert requests.get(f"{BASE_URL}/admin/http/metrics").json()["hosts"][host]["retries"] >= 1
+
+def test_import_ignores_a_requested_source(feed, feed_prefix):
+    serve_json(feed, make_feed(feed_prefix, 2))
+    feed.routes[("GET", "/other")] = lambda req: (200, {"Content-Type": "application/json"}, b"[]")
+
+    resp = run_import(source_url=feed.url("/other"))
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["created"] == 2
+    assert {r["path"] for r in feed.requests} == {FEED_PATH}
@@ -0,0 +1,96 @@
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+# The backend reports the number of SQL statements per request in X-Query-Count.
+# Listings must use a fixed number of batched SELECTs, no matter how many rows they return.
+MAX_RECIPE_LIST_QUERIES = 5
+MAX_PLAN_LIST_QUERIES = 7
+
+def query_count(resp):
+    assert "X-Query-Count" in resp.headers, "Backend must expose X-Query-Count header"
+    return int(resp.headers["X-Query-Count"])
+
+@pytest.fixture
+def catalogue():
+    """Creates products and a helper to add recipes with several ingredients."""
+    suffix = uuid.uuid4().hex[:6]
+    products = []
+    for i in range(3):
+        r = requests.post(f"{BASE_URL}/products/", json={
+            "name": f"QueryCountProd_{suffix}_{i}",
+            "price": 2.0, "amount": 1000, "unit": "g", "calories": 100
+        })
+        assert r.status_code == 200
+        products.append(r.json())
+
+    recipes = []
+
+    def add_recipes(count):
+        for _ in range(count):
+            r = requests.post(f"{BASE_URL}/recipes/", json={
+                "title": f"QueryCountRecipe_{suffix}",
+                "portions": 2,
+                "category": "main",
+                "ingredients": [{"product_id": p["id"], "quantity": 100} for p in products]
+            })
+            assert r.status_code == 200
+            recipes.append(r.json())
+
+    yield {"add_recipes": add_recipes, "recipes": recipes}
+
+    for r in recipes:
+        requests.delete(f"{BASE_URL}/recipes/{r['id']}")
+    for p in products:
+        requests.delete(f"{BASE_URL}/products/{p['id']}")
+
+def test_recipe_listing_has_constant_query_count(catalogue):
+    catalogue["add_recipes"](2)
+    first = requests.get(f"{BASE_URL}/recipes/")
+    assert first.status_code == 200
+
+    catalogue["add_recipes"](6)
+    second = requests.get(f"{BASE_URL}/recipes/")
+    assert second.status_code == 200
+
+    assert query_count(second) == query_count(first), \
+        f"Recipe listing query count grows with rows: {query_count(first)} -> {query_count(second)}"
+    assert query_count(second) <= MAX_RECIPE_LIST_QUERIES
+
+    # Nested data is still there
+    ours = [r for r in second.json() if r["id"] == catalogue["recipes"][0]["id"]][0]
+    assert len(ours["ingredients"]) == 3
+    assert ours["ingredients"][0]["product"] is not None
+
+def test_plan_listing_has_constant_query_count(catalogue):
+    catalogue["add_recipes"](6)
+    target_date = "2031-03-03"
+    created = []
+
+    def add_entries(recipes):
+        for r in recipes:
+            res = requests.post(f"{BASE_URL}/plan/", json={
+                "day_of_week": "Понедельник", "meal_type": "lunch",
+                "recipe_id": r["id"], "portions": 1, "date": target_date
+            })
+            assert res.status_code == 200
+            created.append(res.json()["id"])
+
+    try:
+        add_entries(catalogue["recipes"][:2])
+        params = {"start_date": target_date, "end_date": target_date}
+        first = requests.get(f"{BASE_URL}/plan/", params=params)
+
+        add_entries(catalogue["recipes"][2:])
+        second = requests.get(f"{BASE_URL}/plan/", params=params)
+
+        assert query_count(second) == query_count(first), \
+            f"Plan listing query count grows with rows: {query_count(first)} -> {query_count(second)}"
+        assert query_count(second) <= MAX_PLAN_LIST_QUERIES
+        assert all(item["recipe"]["ingredients"] for item in second.json() if item["id"] in created)
+    finally:
+        for pid in created:
+            requests.delete(f"{BASE_URL}/plan/{pid}")
@@ -0,0 +1,39 @@
+import pytest
+import requests
+import os
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+# Горячий запрос -> индекс (или равноценные индексы), которым он должен читать таблицу
+EXPECTED = {
+    "plan_range": "ix_weekly_plan_date_id",
+    "clear_plan": "ix_weekly_plan_date_id",
+    "shopping_list": "ix_recipe_ingredients_recipe_id",
+    "autofill_occupancy": "ix_weekly_plan_slot",
+    # Сужается только равенством по date: оба индекса одинаково хороши, и SQLite
+    # выбирает по порядку их создания, а create_all создает индексы в случайном порядке
+    "member_day": ("ix_weekly_plan_slot", "ix_weekly_plan_date_id"),
+    "slot": "ix_weekly_plan_slot",
+    "plan_by_recipe": "ix_weekly_plan_recipe_id",
+    "recipes_using_products": "ix_recipe_ingredients_product_id",
+    "recipe_ingredients": "ix_recipe_ingredients_recipe_id",
+}
+
+@pytest.fixture(scope="module")
+def plans():
+    resp = requests.get(f"{BASE_URL}/admin/db/query-plans")
+    assert resp.status_code == 200
+    return resp.json()
+
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+def test_hot_query_uses_index(plans, name):
+    report = plans[name]
+    assert report["full_scans"] == [], report["plan"]
+    expected = EXPECTED[name]
+    expected = {expected} if isinstance(expected, str) else set(expected)
+    assert expected & set(report["indexes"]), report["plan"]
+
+def test_plan_range_is_read_in_index_order(plans):
+    # Постраничный вывод (date, id) не должен сортировать во временном B-дереве
+    assert not any("TEMP B-TREE" in line for line in plans["plan_range"]["plan"])
+    assert any(line.startswith("SEARCH weekly_plan") for line in plans["shopping_list"]["plan"])
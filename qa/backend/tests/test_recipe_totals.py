@@ -0,0 +1,84 @@
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+@pytest.fixture
+def recipe_with_product():
+    """Recipe with 500g of a product: 100 kcal/100g, 10 euro per 1000g."""
+    product = requests.post(f"{BASE_URL}/products/", json={
+        "name": f"TotalsProd_{uuid.uuid4().hex[:6]}",
+        "price": 10, "amount": 1000, "unit": "g",
+        "calories": 100, "proteins": 10, "fats": 5, "carbs": 20
+    }).json()
+    recipe = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": "TotalsRecipe", "portions": 2, "category": "main",
+        "ingredients": [{"product_id": product["id"], "quantity": 500}]
+    }).json()
+
+    yield product, recipe
+
+    requests.delete(f"{BASE_URL}/recipes/{recipe['id']}")
+    requests.delete(f"{BASE_URL}/products/{product['id']}")
+
+def find_recipe(recipe_id):
+    recipes = requests.get(f"{BASE_URL}/recipes/").json()
+    return next(r for r in recipes if r["id"] == recipe_id)
+
+def test_totals_on_create(recipe_with_product):
+    _, recipe = recipe_with_product
+    assert recipe["total_calories"] == 500
+    assert recipe["total_proteins"] == 50
+    assert abs(recipe["total_cost"] - 5.0) < 0.01
+    assert recipe["calories_per_100g"] == 100
+    assert recipe["calories_per_portion"] == 250
+    assert recipe["weight_per_portion"] == 250
+
+def test_totals_follow_product_update(recipe_with_product):
+    product, recipe = recipe_with_product
+    payload = {k: product[k] for k in ["name", "price", "unit", "amount", "calories", "proteins", "fats", "carbs"]}
+    payload.update({"calories": 200, "price": 20})
+
+    resp = requests.put(f"{BASE_URL}/products/{product['id']}", json=payload)
+    assert resp.status_code == 200
+
+    updated = find_recipe(recipe["id"])
+    assert updated["total_calories"] == 1000
+    assert abs(updated["total_cost"] - 10.0) < 0.01
+    assert updated["calories_per_portion"] == 500
+
+def test_totals_follow_ingredient_change(recipe_with_product):
+    product, recipe = recipe_with_product
+    resp = requests.put(f"{BASE_URL}/recipes/{recipe['id']}", json={
+        "title": recipe["title"], "portions": 2, "category": "main",
+        "ingredients": [{"product_id": product["id"], "quantity": 250}]
+    })
+    assert resp.status_code == 200
+    assert resp.json()["total_calories"] == 250
+
+    assert find_recipe(recipe["id"])["total_calories"] == 250
+
+def test_product_recipe_index_and_targeted_update(recipe_with_product):
+    product, recipe = recipe_with_product
+    other_product = requests.post(f"{BASE_URL}/products/", json={
+        "name": f"TotalsOther_{uuid.uuid4().hex[:6]}", "price": 1, "amount": 100, "unit": "g", "calories": 300
+    }).json()
+    other_recipe = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": "TotalsOtherRecipe", "portions": 1,
+        "ingredients": [{"product_id": other_product["id"], "quantity": 100}]
+    }).json()
+
+    try:
+        # Reverse index: product -> recipes using it
+        assert requests.get(f"{BASE_URL}/products/{product['id']}/recipes").json() == [recipe["id"]]
+        assert requests.get(f"{BASE_URL}/products/{other_product['id']}/recipes").json() == [other_recipe["id"]]
+
+        # Deleting a product refreshes only the recipes that used it
+        requests.delete(f"{BASE_URL}/products/{other_product['id']}")
+        assert find_recipe(other_recipe["id"])["total_calories"] == 0
+        assert find_recipe(recipe["id"])["total_calories"] == 500
+    finally:
+        requests.delete(f"{BASE_URL}/recipes/{other_recipe['id']}")
+        requests.delete(f"{BASE_URL}/products/{other_product['id']}")
@@ -0,0 +1,43 @@
+import pytest
+import requests
+import os
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+def set_token(token):
+    assert requests.post(f"{BASE_URL}/admin/telegram/token", json={"token": token}).status_code == 200
+
+def get_token():
+    resp = requests.get(f"{BASE_URL}/admin/telegram/token")
+    return resp.json()["token"], int(resp.headers["X-Query-Count"])
+
+@pytest.fixture
+def token_restored():
+    original, _ = get_token()
+    yield
+    set_token(original)
+
+def test_bot_token_is_cached_until_changed(single_process, token_restored):
+    set_token("qa-cache-1")
+    assert get_token()[0] == "qa-cache-1"
+    assert get_token() == ("qa-cache-1", 0)
+
+    set_token("qa-cache-2")
+    assert get_token()[0] == "qa-cache-2"
+    assert get_token() == ("qa-cache-2", 0)
+
+def test_settings_import_refreshes_the_cache(token_restored):
+    set_token("qa-before-import")
+    assert requests.get(f"{BASE_URL}/admin/settings/export").status_code == 200
+    set_token("qa-after-export")
+    assert get_token()[0] == "qa-after-export"
+
+    assert requests.post(f"{BASE_URL}/admin/settings/import").status_code == 200
+    assert get_token()[0] == "qa-before-import"
+
+def test_login_does_not_reread_the_config_file():
+    before = requests.get(f"{BASE_URL}/admin/settings/cache").json()["config"]["loads"]
+    for _ in range(20):
+        assert requests.post(f"{BASE_URL}/admin/verify", json={"password": "qa-wrong-password"}).status_code == 401
+    after = requests.get(f"{BASE_URL}/admin/settings/cache").json()["config"]["loads"]
+    assert after - before <= 1
@@ -81,3 +81,68 @@ def test_shopping_list_aggregation(shopping_fixture):
         
     expected_cost = 10.0 # 1 pack * 10.0
     assert abs(target_item["estimated_cost"] - expected_cost) < 0.01
+
+@pytest.fixture
+def month_plan():
+    """Two recipes sharing a product, planned for 4 members over a far-future month."""
+    suffix = "".join(random.choices(string.ascii_letters, k=5))
+    flour = requests.post(f"{BASE_URL}/products/", json={
+        "name": f"ShopMonthFlour_{suffix}", "price": 2.0, "amount": 1000, "unit": "g", "calories": 350
+    }).json()
+    milk = requests.post(f"{BASE_URL}/products/", json={
+        "name": f"ShopMonthMilk_{suffix}", "price": 1.5, "amount": 0, "unit": "l", "calories": 60
+    }).json()
+    pancakes = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": "ShopMonthPancakes", "portions": 4,
+        "ingredients": [{"product_id": flour["id"], "quantity": 200}, {"product_id": milk["id"], "quantity": 0.5}]
+    }).json()
+    bread = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": "ShopMonthBread", "portions": 2,
+        "ingredients": [{"product_id": flour["id"], "quantity": 500}]
+    }).json()
+
+    entries = []
+
+    def add_days(first_day, days):
+        for day in range(first_day, first_day + days):
+            for member in range(4):
+                recipe = pancakes if member % 2 else bread
+                r = requests.post(f"{BASE_URL}/plan/", json={
+                    "day_of_week": "Monday", "meal_type": "breakfast", "recipe_id": recipe["id"],
+                    "portions": 1, "date": f"2037-04-{day:02d}"
+                })
+                entries.append(r.json()["id"])
+
+    yield {"flour": flour, "milk": milk, "add_days": add_days}
+
+    for pid in entries:
+        requests.delete(f"{BASE_URL}/plan/{pid}")
+    for r in (pancakes, bread):
+        requests.delete(f"{BASE_URL}/recipes/{r['id']}")
+    for p in (flour, milk):
+        requests.delete(f"{BASE_URL}/products/{p['id']}")
+
+def test_shopping_list_month_query_count_is_constant(single_process, month_plan):
+    params = {"start_date": "2037-04-01", "end_date": "2037-04-30"}
+
+    month_plan["add_days"](1, 3)
+    first = requests.get(f"{BASE_URL}/shopping-list/", params=params)
+    month_plan["add_days"](4, 27)
+    second = requests.get(f"{BASE_URL}/shopping-list/", params=params)
+
+    # Сгруппированный запрос потребностей + один поиск взаимозаменяемых продуктов
+    assert first.headers["X-Query-Count"] == second.headers["X-Query-Count"] == "2"
+
+    items = {i["id"]: i for i in second.json()}
+    # 30 дней: в день 2 порции хлеба (500г на 2 порции) и 2 порции блинов (200г на 4 порции)
+    flour = items[month_plan["flour"]["id"]]
+    assert abs(flour["total_quantity"] - 30 * (2 * 250 + 2 * 50)) < 0.01
+    assert abs(flour["packs_needed"] - 18.0) < 0.01
+    assert abs(flour["estimated_cost"] - 36.0) < 0.01
+
+    # amount = 0 считается за упаковку 1
+    milk = items[month_plan["milk"]["id"]]
+    assert abs(milk["total_quantity"] - 30 * 2 * 0.125) < 0.001
+    assert abs(milk["estimated_cost"] - 7.5 * 1.5) < 0.01
+    assert milk["packs_to_buy"] == 8
+    assert abs(milk["purchase_cost"] - 8 * 1.5) < 0.01
@@ -0,0 +1,110 @@
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+RANGE = {"start_date": "2038-06-07", "end_date": "2038-06-13"}
+INSIDE, OUTSIDE = "2038-06-09", "2038-06-20"
+
+@pytest.fixture
+def cached_plan():
+    product = requests.post(f"{BASE_URL}/products/", json={
+        "name": f"CacheProd_{uuid.uuid4().hex[:6]}", "price": 4.0, "amount": 1000, "unit": "g", "calories": 100
+    }).json()
+    recipe = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": "CacheRecipe", "portions": 1,
+        "ingredients": [{"product_id": product["id"], "quantity": 500}]
+    }).json()
+    entries = []
+
+    def plan(date):
+        r = requests.post(f"{BASE_URL}/plan/", json={
+            "day_of_week": "Среда", "meal_type": "lunch", "recipe_id": recipe["id"], "portions": 1, "date": date
+        })
+        entries.append(r.json()["id"])
+        return r.json()
+
+    plan(INSIDE)
+    yield {"product": product, "recipe": recipe, "plan": plan, "entries": entries}
+
+    for pid in entries:
+        requests.delete(f"{BASE_URL}/plan/{pid}")
+    requests.delete(f"{BASE_URL}/recipes/{recipe['id']}")
+    requests.delete(f"{BASE_URL}/products/{product['id']}")
+
+def shopping_list():
+    resp = requests.get(f"{BASE_URL}/shopping-list/", params=RANGE)
+    assert resp.status_code == 200
+    return resp.headers["X-Cache"], resp.json()
+
+def item_for(items, product):
+    return next(i for i in items if i["id"] == product["id"])
+
+def test_repeated_request_is_served_from_cache(single_process, cached_plan):
+    before = requests.get(f"{BASE_URL}/shopping-list/cache").json()
+    assert shopping_list()[0] == "MISS"
+    status, items = shopping_list()
+    assert status == "HIT"
+    assert item_for(items, cached_plan["product"])["total_quantity"] == 500
+
+    after = requests.get(f"{BASE_URL}/shopping-list/cache").json()
+    assert after["hits"] >= before["hits"] + 1
+    assert after["misses"] >= before["misses"] + 1
+    assert after["size"] <= after["max_size"]
+
+def test_plan_changes_invalidate_only_their_range(single_process, cached_plan):
+    shopping_list()
+
+    cached_plan["plan"](OUTSIDE)
+    assert shopping_list()[0] == "HIT", "Change outside the range must not invalidate"
+
+    entry = cached_plan["plan"](INSIDE)
+    status, items = shopping_list()
+    assert status == "MISS"
+    assert item_for(items, cached_plan["product"])["total_quantity"] == 1000
+
+    requests.patch(f"{BASE_URL}/plan/{entry['id']}", json={"portions": 2})
+    status, items = shopping_list()
+    assert status == "MISS"
+    assert item_for(items, cached_plan["product"])["total_quantity"] == 1500
+
+    requests.delete(f"{BASE_URL}/plan/{entry['id']}")
+    status, items = shopping_list()
+    assert status == "MISS"
+    assert item_for(items, cached_plan["product"])["total_quantity"] == 500
+
+def test_product_and_recipe_changes_invalidate(cached_plan):
+    product, recipe = cached_plan["product"], cached_plan["recipe"]
+    shopping_list()
+
+    payload = {k: product[k] for k in ["name", "unit", "amount", "calories"]}
+    payload["price"] = 8.0
+    requests.put(f"{BASE_URL}/products/{product['id']}", json=payload)
+    status, items = shopping_list()
+    assert status == "MISS"
+    assert abs(item_for(items, product)["estimated_cost"] - 4.0) < 0.01
+
+    requests.put(f"{BASE_URL}/recipes/{recipe['id']}", json={
+        "title": recipe["title"], "portions": 1,
+        "ingredients": [{"product_id": product["id"], "quantity": 250}]
+    })
+    status, items = shopping_list()
+    assert status == "MISS"
+    assert item_for(items, product)["total_quantity"] == 250
+
+def test_batch_and_clear_invalidate(cached_plan):
+    recipe = cached_plan["recipe"]
+    shopping_list()
+
+    saved = requests.post(f"{BASE_URL}/plan/batch", json=[{
+        "day_of_week": "Среда", "meal_type": "dinner", "recipe_id": recipe["id"], "portions": 1, "date": INSIDE
+    }]).json()
+    cached_plan["entries"].extend(e["id"] for e in saved["added"])
+    assert shopping_list()[0] == "MISS"
+
+    requests.delete(f"{BASE_URL}/plan/", params={"start_date": INSIDE, "end_date": INSIDE})
+    status, items = shopping_list()
+    assert status == "MISS"
+    assert not any(i["id"] == cached_plan["product"]["id"] for i in items)
@@ -0,0 +1,115 @@
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+WEEK = {"start_date": "2039-03-07", "end_date": "2039-03-13"}
+PREVIOUS_WEEK_DAY, DAY = "2039-03-03", "2039-03-08"
+
+@pytest.fixture
+def kitchen():
+    created = {"products": [], "recipes": [], "entries": []}
+
+    def product(name, unit, amount, price):
+        p = requests.post(f"{BASE_URL}/products/", json={
+            "name": name, "unit": unit, "amount": amount, "price": price, "calories": 100
+        }).json()
+        created["products"].append(p["id"])
+        return p
+
+    def recipe(*ingredients):
+        r = requests.post(f"{BASE_URL}/recipes/", json={
+            "title": "OptRecipe", "portions": 1,
+            "ingredients": [{"product_id": p["id"], "quantity": q} for p, q in ingredients]
+        }).json()
+        created["recipes"].append(r["id"])
+        return r
+
+    def plan(recipe, date, portions=1):
+        e = requests.post(f"{BASE_URL}/plan/", json={
+            "day_of_week": "Вторник", "meal_type": "dinner", "recipe_id": recipe["id"],
+            "portions": portions, "date": date
+        }).json()
+        created["entries"].append(e["id"])
+        return e
+
+    yield {"product": product, "recipe": recipe, "plan": plan}
+
+    for eid in created["entries"]:
+        requests.delete(f"{BASE_URL}/plan/{eid}")
+    for rid in created["recipes"]:
+        requests.delete(f"{BASE_URL}/recipes/{rid}")
+    for pid in created["products"]:
+        requests.delete(f"{BASE_URL}/products/{pid}")
+
+def shopping_list():
+    resp = requests.get(f"{BASE_URL}/shopping-list/", params=WEEK)
+    assert resp.status_code == 200
+    return resp.headers["X-Cache"], resp.json()
+
+def line_for(items, product):
+    return next(i for i in items if product["id"] in i["product_ids"])
+
+def bought(line):
+    return {p["product_id"]: p["packs"] for p in line["purchases"]}
+
+def test_whole_packs_cheapest_mix_of_substitutes(kitchen):
+    name = f"OptRice_{uuid.uuid4().hex[:6]}"
+    big = kitchen["product"](name, "g", 1000, 3.0)
+    small = kitchen["product"](name.lower(), "g", 250, 1.0)
+    half_kg = kitchen["product"](name + " ", "kg", 0.5, 1.6)
+    kitchen["plan"](kitchen["recipe"]((big, 1100)), DAY)
+
+    _, items = shopping_list()
+    line = line_for(items, big)
+    # 1000 + 250 = €4.00 дешевле, чем 2 x 1000, 3 x 500 или 5 x 250
+    assert bought(line) == {big["id"]: 1, small["id"]: 1}
+    assert line["packs_to_buy"] == 2
+    assert abs(line["purchase_cost"] - 4.0) < 0.01
+    assert abs(line["estimated_cost"] - 3.3) < 0.01
+
+    # Второй продукт с тем же названием в другой единице - та же строка
+    kitchen["plan"](kitchen["recipe"]((half_kg, 0.3)), DAY)
+    _, items = shopping_list()
+    line = line_for(items, big)
+    assert line["product_ids"] == [big["id"], half_kg["id"]]
+    assert abs(line["total_quantity"] - 1400) < 0.01
+    assert line["unit"] == "g"
+    assert bought(line) == {big["id"]: 1, half_kg["id"]: 1}
+    assert abs(line["leftover"] - 100) < 0.01
+    assert sum(1 for i in items if half_kg["id"] in i["product_ids"]) == 1
+
+def test_previous_week_surplus_is_carried_over(kitchen):
+    oil = kitchen["product"](f"OptOil_{uuid.uuid4().hex[:6]}", "ml", 1000, 5.0)
+    salad = kitchen["recipe"]((oil, 300))
+    kitchen["plan"](salad, DAY, portions=2)
+
+    _, items = shopping_list()
+    line = line_for(items, oil)
+    assert line["packs_to_buy"] == 1
+    assert line["carried_over"] == 0
+
+    # На прошлой неделе куплена целая упаковка, потрачено 300 мл - 700 мл переходят
+    kitchen["plan"](salad, PREVIOUS_WEEK_DAY)
+    status, items = shopping_list()
+    assert status == "MISS"
+    line = line_for(items, oil)
+    assert abs(line["total_quantity"] - 600) < 0.01
+    assert abs(line["carried_over"] - 600) < 0.01
+    assert line["packs_to_buy"] == 0
+    assert line["purchase_cost"] == 0
+    assert abs(line["leftover"] - 100) < 0.01
+
+def test_new_substitute_invalidates_cached_list(single_process, kitchen):
+    name = f"OptFlour_{uuid.uuid4().hex[:6]}"
+    flour = kitchen["product"](name, "g", 1000, 4.0)
+    kitchen["plan"](kitchen["recipe"]((flour, 900)), DAY)
+    shopping_list()
+    assert shopping_list()[0] == "HIT"
+
+    cheap = kitchen["product"](name, "kg", 1, 2.5)
+    status, items = shopping_list()
+    assert status == "MISS"
+    assert bought(line_for(items, flour)) == {cheap["id"]: 1}
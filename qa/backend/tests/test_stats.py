@@ -0,0 +1,143 @@
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+MONDAY, TUESDAY = "2035-03-05", "2035-03-06"
+WEEK = {"start_date": MONDAY, "end_date": "2035-03-11"}
+
+@pytest.fixture
+def stats_setup():
+    """Member + recipe of 2 portions: 500 kcal, 50 g proteins, 5.0 cost in total."""
+    suffix = uuid.uuid4().hex[:6]
+    member = requests.post(f"{BASE_URL}/admin/family", json={
+        "name": f"StatsMember_{suffix}", "color": "blue", "max_calories": 1800
+    }).json()
+    product = requests.post(f"{BASE_URL}/products/", json={
+        "name": f"StatsProd_{suffix}", "price": 10, "amount": 1000, "unit": "g",
+        "calories": 100, "proteins": 10, "fats": 5, "carbs": 20
+    }).json()
+    recipe = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": f"StatsRecipe_{suffix}", "portions": 2,
+        "ingredients": [{"product_id": product["id"], "quantity": 500}]
+    }).json()
+    entries = []
+
+    def plan(date, portions, member_id=None):
+        r = requests.post(f"{BASE_URL}/plan/", json={
+            "day_of_week": "Понедельник", "meal_type": "lunch", "recipe_id": recipe["id"],
+            "portions": portions, "family_member_id": member_id, "date": date
+        })
+        assert r.status_code == 200
+        entries.append(r.json()["id"])
+        return r.json()
+
+    yield {"member": member, "product": product, "recipe": recipe, "plan": plan}
+
+    for pid in entries:
+        requests.delete(f"{BASE_URL}/plan/{pid}")
+    requests.delete(f"{BASE_URL}/recipes/{recipe['id']}")
+    requests.delete(f"{BASE_URL}/products/{product['id']}")
+    requests.delete(f"{BASE_URL}/admin/family/{member['id']}")
+
+def get_stats():
+    resp = requests.get(f"{BASE_URL}/stats/", params=WEEK)
+    assert resp.status_code == 200, resp.text
+    return resp
+
+def day(group, date):
+    return next(d for d in group["days"] if d["date"] == date)
+
+def member_group(data, member_id):
+    return next(g for g in data["members"] if g["member"]["id"] == member_id)
+
+def test_stats_per_member_day_and_week(stats_setup):
+    member = stats_setup["member"]
+    stats_setup["plan"](MONDAY, 1, member["id"])
+    stats_setup["plan"](TUESDAY, 2)
+
+    data = get_stats().json()
+    mine = member_group(data, member["id"])
+    assert mine["member"]["max_calories"] == 1800
+    assert day(mine, MONDAY)["calories"] == 250
+    assert day(mine, MONDAY)["proteins"] == 25
+    assert day(mine, MONDAY)["day_of_week"] == "Понедельник"
+    assert day(mine, TUESDAY)["items_count"] == 0
+    assert mine["total"]["calories"] == 250
+
+    # "all" включает записи без участника
+    assert day(data["all"], TUESDAY)["calories"] == 500
+    assert abs(day(data["all"], TUESDAY)["cost"] - 5.0) < 0.01
+    assert len(data["all"]["days"]) == 7
+    assert data["all"]["weeks"][0]["week_start"] == MONDAY
+
+def test_stats_follow_plan_changes(stats_setup):
+    member = stats_setup["member"]
+    entry = stats_setup["plan"](MONDAY, 1, member["id"])
+
+    requests.patch(f"{BASE_URL}/plan/{entry['id']}", json={"portions": 2, "date": TUESDAY})
+    mine = member_group(get_stats().json(), member["id"])
+    assert day(mine, MONDAY)["calories"] == 0
+    assert day(mine, TUESDAY)["calories"] == 500
+
+    requests.delete(f"{BASE_URL}/plan/{entry['id']}")
+    mine = member_group(get_stats().json(), member["id"])
+    assert mine["total"]["calories"] == 0 and mine["total"]["items_count"] == 0
+
+def test_stats_follow_product_changes(stats_setup):
+    member, product = stats_setup["member"], stats_setup["product"]
+    stats_setup["plan"](MONDAY, 1, member["id"])
+
+    payload = {k: product[k] for k in ["name", "price", "unit", "amount", "calories", "proteins", "fats", "carbs"]}
+    payload["calories"] = 200
+    assert requests.put(f"{BASE_URL}/products/{product['id']}", json=payload).status_code == 200
+
+    mine = member_group(get_stats().json(), member["id"])
+    assert day(mine, MONDAY)["calories"] == 500
+
+def test_recipe_import_refreshes_stats_and_shopping_list(stats_setup):
+    member, product, recipe = stats_setup["member"], stats_setup["product"], stats_setup["recipe"]
+    stats_setup["plan"](MONDAY, 1, member["id"])
+
+    def quantity():
+        items = requests.get(f"{BASE_URL}/shopping-list/", params=WEEK).json()
+        return next(i for i in items if i["id"] == product["id"])["total_quantity"]
+
+    # В файле экспорта - 2 порции; в базе делаем 1, кэши заполняются
+    assert requests.get(f"{BASE_URL}/recipes/export").status_code == 200
+    requests.put(f"{BASE_URL}/recipes/{recipe['id']}", json={
+        "title": recipe["title"], "portions": 1,
+        "ingredients": [{"product_id": product["id"], "quantity": 500}]
+    })
+    assert day(member_group(get_stats().json(), member["id"]), MONDAY)["calories"] == 500
+    assert quantity() == 500
+
+    existing = {r["id"] for r in requests.get(f"{BASE_URL}/recipes/").json()}
+    try:
+        assert requests.post(f"{BASE_URL}/recipes/import").json()["updated"] >= 1
+        assert day(member_group(get_stats().json(), member["id"]), MONDAY)["calories"] == 250
+        assert quantity() == 250
+    finally:
+        # Импорт восстанавливает и рецепты, удаленные другими тестами после экспорта
+        for r in requests.get(f"{BASE_URL}/recipes/").json():
+            if r["id"] not in existing:
+                requests.delete(f"{BASE_URL}/recipes/{r['id']}")
+
+def test_stats_is_one_small_request(stats_setup):
+    for _ in range(10):
+        stats_setup["plan"](MONDAY, 1, stats_setup["member"]["id"])
+    resp = get_stats()
+    # Свертка + участники, независимо от объема истории плана
+    assert int(resp.headers["X-Query-Count"]) <= 2
+
+def test_stats_rejects_bad_range():
+    resp = requests.get(f"{BASE_URL}/stats/", params={"start_date": "2035-03-11", "end_date": "2035-03-05"})
+    assert resp.status_code == 400
+
+def test_stats_limits(stats_setup):
+    member = stats_setup["member"]
+    data = get_stats().json()
+    assert member_group(data, member["id"])["limits"]["calories"] == 1800
+    assert data["all"]["limits"]["calories"] >= 1800
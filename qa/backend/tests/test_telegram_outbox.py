@@ -0,0 +1,196 @@
+import pytest
+import requests
+import os
+import json
+import time
+import threading
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+TOKEN = "qa-token"
+SEND_PATH = f"/bot{TOKEN}/sendMessage"
+
+def telegram_reply(status=200, body=None):
+    body = body or {"ok": status == 200, "result": {"message_id": 1}}
+    return status, {"Content-Type": "application/json"}, json.dumps(body).encode()
+
+@pytest.fixture
+def bot_api(stub_server):
+    """Bot API stand-in on the stub server, if the backend sends there (TELEGRAM_API_URL)."""
+    api_url = requests.get(f"{BASE_URL}/admin/telegram/api-url").json()["url"]
+    if not stub_server.serves(api_url, "/"):
+        pytest.skip(f"the backend must be started with TELEGRAM_API_URL={stub_server.url('')}")
+    requests.post(f"{BASE_URL}/admin/telegram/token", json={"token": TOKEN})
+    recipe = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": "OutboxSoup", "portions": 2, "category": "soup", "ingredients": []
+    }).json()
+    stub_server.recipe = recipe
+    yield stub_server
+
+    requests.post(f"{BASE_URL}/admin/telegram/token", json={"token": ""})
+    requests.delete(f"{BASE_URL}/recipes/{recipe['id']}")
+
+def send(bot_api, chat_id):
+    return requests.post(f"{BASE_URL}/recipes/{bot_api.recipe['id']}/send", json={"chat_id": chat_id})
+
+def wait_for(outbox_id, statuses=("sent", "dead"), timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        message = next(m for m in requests.get(f"{BASE_URL}/admin/telegram/outbox").json() if m["id"] == outbox_id)
+        if message["status"] in statuses:
+            return message
+        time.sleep(0.1)
+    pytest.fail(f"message {outbox_id} is still {message['status']}")
+
+def sent_to(bot_api, chat_id):
+    return [r for r in bot_api.requests if r["path"] == SEND_PATH and json.loads(r["body"])["chat_id"] == chat_id]
+
+def test_send_is_queued_and_delivered(bot_api):
+    bot_api.routes[("POST", SEND_PATH)] = lambda req: telegram_reply()
+    resp = send(bot_api, "qa-ok")
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["status"] == "queued"
+
+    message = wait_for(body["outbox_id"])
+    assert message["status"] == "sent"
+    assert message["attempts"] == 1
+    assert message["sent_at"]
+    [request] = sent_to(bot_api, "qa-ok")
+    assert "OutboxSoup" in json.loads(request["body"])["text"]
+
+def test_send_without_token_is_rejected(bot_api):
+    requests.post(f"{BASE_URL}/admin/telegram/token", json={"token": ""})
+    assert send(bot_api, "qa-no-token").status_code == 400
+
+def test_endpoint_does_not_wait_for_a_hanging_bot_api(bot_api):
+    release = threading.Event()
+
+    def hang(req):
+        release.wait(10)
+        return telegram_reply()
+
+    bot_api.routes[("POST", SEND_PATH)] = hang
+    try:
+        started = time.time()
+        resp = send(bot_api, "qa-hang")
+        assert resp.status_code == 200
+        assert time.time() - started < 1
+        assert wait_for(resp.json()["outbox_id"], ("sending",))["status"] == "sending"
+    finally:
+        release.set()
+    assert wait_for(resp.json()["outbox_id"])["status"] == "sent"
+
+def test_server_errors_are_retried_with_backoff(bot_api):
+    replies = [telegram_reply(500), telegram_reply(429, {"ok": False, "parameters": {"retry_after": 1}}), telegram_reply()]
+    bot_api.routes[("POST", SEND_PATH)] = lambda req: replies.pop(0)
+
+    message = wait_for(send(bot_api, "qa-retry").json()["outbox_id"])
+    assert message["status"] == "sent"
+    assert message["attempts"] == 3
+    times = [r["time"] for r in sent_to(bot_api, "qa-retry")]
+    assert len(times) == 3
+    # 429 - не раньше retry_after
+    assert times[2] - times[1] >= 0.9
+
+def test_permanent_errors_are_dead_lettered_and_can_be_retried(bot_api):
+    bot_api.routes[("POST", SEND_PATH)] = lambda req: telegram_reply(400, {"ok": False, "description": "chat not found"})
+    outbox_id = send(bot_api, "qa-dead").json()["outbox_id"]
+
+    message = wait_for(outbox_id)
+    assert message["status"] == "dead"
+    assert message["attempts"] == 1
+    assert "chat not found" in message["last_error"]
+    dead = requests.get(f"{BASE_URL}/admin/telegram/outbox", params={"status": "dead"}).json()
+    assert outbox_id in {m["id"] for m in dead}
+
+    bot_api.routes[("POST", SEND_PATH)] = lambda req: telegram_reply()
+    resp = requests.post(f"{BASE_URL}/admin/telegram/outbox/{outbox_id}/retry")
+    assert resp.status_code == 200
+    assert wait_for(outbox_id)["status"] == "sent"
+    assert requests.post(f"{BASE_URL}/admin/telegram/outbox/{outbox_id}/retry").status_code == 400
+
+def test_sends_have_bounded_concurrency(bot_api):
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0}
+
+    def slow(req):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.3)
+        with lock:
+            state["active"] -= 1
+        return telegram_reply()
+
+    bot_api.routes[("POST", SEND_PATH)] = slow
+    ids = [send(bot_api, f"qa-many-{i}").json()["outbox_id"] for i in range(10)]
+    assert all(wait_for(i)["status"] == "sent" for i in ids)
+    assert 1 < state["peak"] <= 8
+    stats = requests.get(f"{BASE_URL}/admin/telegram/outbox/stats").json()
+    assert stats["queue"]["sent"] >= 10
+
+@pytest.fixture
+def recipients():
+    users = [requests.post(f"{BASE_URL}/admin/telegram/users", json={"name": f"QA {i}", "chat_id": f"qa-bc-{i}"}).json()
+             for i in range(200)]
+    yield users
+    for user in users:
+        requests.delete(f"{BASE_URL}/admin/telegram/users/{user['id']}")
+
+def wait_for_broadcast(broadcast_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = requests.get(f"{BASE_URL}/admin/telegram/broadcasts/{broadcast_id}").json()
+        if status["done"]:
+            return status
+        time.sleep(0.2)
+    pytest.fail(f"broadcast {broadcast_id} is not done: {status['counts']}")
+
+def test_broadcast_to_everyone_respects_the_global_rate(bot_api, recipients):
+    bot_api.routes[("POST", SEND_PATH)] = lambda req: telegram_reply()
+    started = time.time()
+    resp = requests.post(f"{BASE_URL}/admin/telegram/broadcast", json={"text": "QA broadcast"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["recipients"] == 200
+
+    status = wait_for_broadcast(body["broadcast_id"])
+    elapsed = time.time() - started
+    assert status["counts"]["sent"] == 200
+    assert {r["chat_id"] for r in status["recipients"]} == {u["chat_id"] for u in recipients}
+    assert all(r["status"] == "sent" and r["name"] for r in status["recipients"])
+    # Не больше 30 сообщений в секунду: 200 получателей - за секунды
+    assert 6 < elapsed < 15
+
+    times = sorted(r["time"] for r in bot_api.requests if r["path"] == SEND_PATH)
+    assert len(times) == 200
+    assert max(sum(1 for t in times[i:] if t - start < 1) for i, start in enumerate(times)) <= 30
+
+def test_broadcast_to_a_subset_with_per_recipient_status(bot_api, recipients):
+    def reply(req):
+        if json.loads(req.body)["chat_id"] == "qa-bc-1":
+            return telegram_reply(403, {"ok": False, "description": "bot was blocked by the user"})
+        return telegram_reply()
+
+    bot_api.routes[("POST", SEND_PATH)] = reply
+    chat_ids = ["qa-bc-0", "qa-bc-1", "qa-bc-2"]
+    resp = requests.post(f"{BASE_URL}/admin/telegram/broadcast", json={"text": "QA subset", "chat_ids": chat_ids})
+    assert resp.json()["recipients"] == 3
+
+    status = wait_for_broadcast(resp.json()["broadcast_id"])
+    assert status["counts"]["sent"] == 2 and status["counts"]["dead"] == 1
+    by_chat = {r["chat_id"]: r for r in status["recipients"]}
+    assert by_chat["qa-bc-1"]["status"] == "dead"
+    assert "blocked" in by_chat["qa-bc-1"]["last_error"]
+    assert {json.loads(r["body"])["chat_id"] for r in bot_api.requests if r["path"] == SEND_PATH} <= set(chat_ids)
+
+    resp = requests.post(f"{BASE_URL}/admin/telegram/broadcast", json={"text": "QA", "chat_ids": ["qa-unknown"]})
+    assert resp.status_code == 400
+    assert requests.get(f"{BASE_URL}/admin/telegram/broadcasts/unknown").status_code == 404
+
+def test_messages_to_one_chat_are_paced(bot_api):
+    bot_api.routes[("POST", SEND_PATH)] = lambda req: telegram_reply()
+    ids = [send(bot_api, "qa-paced").json()["outbox_id"] for _ in range(3)]
+    assert all(wait_for(i)["status"] == "sent" for i in ids)
+    times = sorted(r["time"] for r in sent_to(bot_api, "qa-paced"))
+    assert all(b - a >= 0.9 for a, b in zip(times, times[1:]))
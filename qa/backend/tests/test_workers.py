@@ -0,0 +1,97 @@
+import datetime
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+
+# Каждый запрос - новое соединение, так что они расходятся по процессам сервера
+ROUNDS = 30
+RANGE = {"start_date": "2039-09-05", "end_date": "2039-09-11"}
+INSIDE = "2039-09-07"
+
+def every_worker(request):
+    """Runs `request` ROUNDS times; returns the set of distinct results."""
+    return {request() for _ in range(ROUNDS)}
+
+def test_requests_are_spread_over_workers(multi_process):
+    pids = every_worker(lambda: requests.get(f"{BASE_URL}/admin/server").json()["pid"])
+    assert len(pids) > 1
+    info = requests.get(f"{BASE_URL}/admin/server").json()
+    assert info["cache_sync"]["enabled"]
+
+@pytest.fixture
+def token_restored():
+    original = requests.get(f"{BASE_URL}/admin/telegram/token").json()["token"]
+    yield
+    requests.post(f"{BASE_URL}/admin/telegram/token", json={"token": original})
+
+def test_settings_change_reaches_every_worker(multi_process, token_restored):
+    def token():
+        return requests.get(f"{BASE_URL}/admin/telegram/token").json()["token"]
+
+    for value in ("qa-workers-1", "qa-workers-2"):
+        # Закэшировано во всех процессах - и изменение видно во всех
+        assert requests.post(f"{BASE_URL}/admin/telegram/token", json={"token": value}).status_code == 200
+        assert every_worker(token) == {value}
+
+@pytest.fixture
+def cached_plan():
+    product = requests.post(f"{BASE_URL}/products/", json={
+        "name": f"WorkersProd_{uuid.uuid4().hex[:6]}", "price": 4.0, "amount": 1000, "unit": "g", "calories": 100
+    }).json()
+    recipe = requests.post(f"{BASE_URL}/recipes/", json={
+        "title": "WorkersRecipe", "portions": 1,
+        "ingredients": [{"product_id": product["id"], "quantity": 500}]
+    }).json()
+    entry = requests.post(f"{BASE_URL}/plan/", json={
+        "day_of_week": "Среда", "meal_type": "lunch", "recipe_id": recipe["id"], "portions": 1, "date": INSIDE
+    }).json()
+    yield {"product": product, "recipe": recipe, "entry": entry}
+
+    requests.delete(f"{BASE_URL}/plan/{entry['id']}")
+    requests.delete(f"{BASE_URL}/recipes/{recipe['id']}")
+    requests.delete(f"{BASE_URL}/products/{product['id']}")
+
+def test_shopping_list_changes_reach_every_worker(multi_process, cached_plan):
+    product = cached_plan["product"]
+
+    def line():
+        items = requests.get(f"{BASE_URL}/shopping-list/", params=RANGE).json()
+        item = next(i for i in items if i["id"] == product["id"])
+        return item["total_quantity"], round(item["estimated_cost"], 2)
+
+    assert every_worker(line) == {(500, 2.0)}
+
+    requests.patch(f"{BASE_URL}/plan/{cached_plan['entry']['id']}", json={"portions": 2})
+    assert every_worker(line) == {(1000, 4.0)}
+
+    payload = {k: product[k] for k in ["name", "unit", "amount", "calories"]}
+    requests.put(f"{BASE_URL}/products/{product['id']}", json={**payload, "price": 8.0})
+    assert every_worker(line) == {(1000, 8.0)}
+
+def test_past_meal_is_taken_from_the_pantry_in_every_worker(multi_process, cached_plan):
+    product = cached_plan["product"]
+
+    def stock():
+        items = requests.get(f"{BASE_URL}/pantry/").json()
+        return next((i["quantity"] for i in items if i["product_id"] == product["id"]), 0)
+
+    requests.put(f"{BASE_URL}/pantry/{product['id']}", json={"quantity": 1000})
+    # Все процессы уже проверили прошедшие блюда сегодня
+    every_worker(lambda: requests.post(f"{BASE_URL}/pantry/consume").json()["consumed"])
+    assert every_worker(stock) == {1000}
+
+    yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+    entry = requests.post(f"{BASE_URL}/plan/", json={
+        "day_of_week": "Среда", "meal_type": "lunch", "recipe_id": cached_plan["recipe"]["id"],
+        "portions": 1, "date": yesterday
+    }).json()
+    try:
+        # Отметка сброшена и в процессе, который получит запрос на списание
+        assert requests.post(f"{BASE_URL}/pantry/consume").json()["consumed"] == 1
+        assert every_worker(stock) == {500}
+    finally:
+        requests.delete(f"{BASE_URL}/plan/{entry['id']}")
+        requests.delete(f"{BASE_URL}/pantry/{product['id']}")
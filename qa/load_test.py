@@ -0,0 +1,153 @@
+"""
+Load test of the read-heavy API mix (plan, recipes, products, shopping lists).
+
+Against a running server:
+    python load_test.py --url http://localhost:8000 --seed
+
+Throughput by worker count - starts gunicorn from ../backend for each count
+(the backend's database must be writable, see database.py):
+    python load_test.py --workers 1,2,4 --seed
+
+With CPU-bound handlers requests/s should grow close to linearly with the
+number of workers up to the number of cores; with one process it stays flat
+however many clients there are.
+"""
+import argparse
+import datetime
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import requests
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+START = datetime.date(2040, 1, 1)
+DAYS = 28
+
+def seed(url):
+    """Products, recipes and a month of plan in 2040 - away from real data."""
+    products = [requests.post(f"{url}/products/", json={
+        "name": f"LoadProduct {i}", "price": 50 + i, "amount": 1000, "unit": "g",
+        "calories": 100 + i % 300, "proteins": 5, "fats": 3, "carbs": 20
+    }).json() for i in range(100)]
+    recipes = [requests.post(f"{url}/recipes/", json={
+        "title": f"LoadRecipe {i}", "portions": 4, "category": "main",
+        "ingredients": [{"product_id": p["id"], "quantity": 150} for p in random.sample(products, 6)]
+    }).json() for i in range(40)]
+    entries = [{
+        "day_of_week": "Понедельник", "meal_type": meal, "recipe_id": random.choice(recipes)["id"],
+        "portions": 2, "date": (START + datetime.timedelta(days=d)).isoformat()
+    } for d in range(DAYS) for meal in ("breakfast", "lunch", "dinner")]
+    requests.post(f"{url}/plan/batch", json=entries).raise_for_status()
+    print(f"seeded {len(products)} products, {len(recipes)} recipes, {len(entries)} plan entries")
+
+def week(offset):
+    start = START + datetime.timedelta(days=offset)
+    return {"start_date": start.isoformat(), "end_date": (start + datetime.timedelta(days=6)).isoformat()}
+
+REQUESTS = [
+    lambda: ("/plan/", week(random.randrange(DAYS - 6))),
+    lambda: ("/recipes/", {"limit": 50}),
+    lambda: ("/products/", {"search": "LoadProduct", "limit": 50}),
+    lambda: ("/shopping-list/", week(random.randrange(DAYS - 6))),
+]
+
+def run(url, clients, duration):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            path, params = random.choice(REQUESTS)()
+            started = time.perf_counter()
+            try:
+                ok = session.get(f"{url}{path}", params=params, timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                (latencies if ok else errors).append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000 if latencies else None,
+        "p95": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None,
+        "errors": len(errors),
+    }
+
+def report(label, result):
+    print(f"{label:>12}: {result['rps']:8.1f} req/s   p50 {result['p50']:7.1f} ms   "
+          f"p95 {result['p95']:7.1f} ms   errors {result['errors']}")
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{url}/", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    sys.exit(f"server at {url} did not start")
+
+def spawn(workers, port):
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "BIND": f"127.0.0.1:{port}"}
+    server = subprocess.Popen(
+        ["gunicorn", "main:app", "-c", "gunicorn.conf.py", "--access-logfile", "/dev/null"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    wait_until_up(f"http://127.0.0.1:{port}")
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="server to test (without --workers)")
+    parser.add_argument("--workers", help="comma-separated worker counts: start gunicorn for each")
+    parser.add_argument("--port", type=int, default=8899, help="port for servers started with --workers")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=15, help="seconds per run")
+    parser.add_argument("--seed", action="store_true", help="create test data first")
+    args = parser.parse_args()
+
+    if not args.workers:
+        wait_until_up(args.url)
+        if args.seed:
+            seed(args.url)
+        run(args.url, args.clients, 2)  # прогрев
+        report("server", run(args.url, args.clients, args.duration))
+        return
+
+    url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    for i, workers in enumerate(int(w) for w in args.workers.split(",")):
+        server = spawn(workers, args.port)
+        try:
+            if args.seed and i == 0:
+                seed(url)
+            run(url, args.clients, 2)
+            results[workers] = run(url, args.clients, args.duration)
+            report(f"{workers} workers", results[workers])
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+
+    base = next(iter(results.values()))["rps"]
+    print(f"cores: {os.cpu_count()}")
+    for workers, result in results.items():
+        print(f"{workers:>3} workers: x{result['rps'] / base:.2f}")
+
+if __name__ == "__main__":
+    main()